@@ -1 +1 @@
-__all__ = ['test_css']
+__all__ = ['benchmarks', 'test_css']
@@ -0,0 +1 @@
+__all__ = ['bench_tokenizer', 'corpus']
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks `preprocessing` and `CSSTokenizer.tokenize_stream`, with and
+without positions, on the stylesheets in `corpus`, and compares the results
+against a baseline.
+
+Run it from the top of the repository:
+
+    python -m Quasar.Testing.benchmarks.bench_tokenizer --output new.json
+    python -m Quasar.Testing.benchmarks.bench_tokenizer --baseline new.json
+
+The second run exits with status 1 if any benchmark got slower, or used more
+memory, than the baseline by more than the tolerance.
+
+Every benchmark runs in a fresh process, so that the peak memory of one does
+not hide that of the next.  For each it reports the best time over the
+repeats, tokens and megabytes (of UTF-8 input) per second, how much the peak
+resident memory grew, and how many objects each token left alive.
+
+With `--parallel PROCESSES` it instead times `tokenize_parallel` against
+the serial `tokenize_stream` and `tokenize_columns` on each stylesheet:
+
+    python -m Quasar.Testing.benchmarks.bench_tokenizer --parallel 4
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import multiprocessing
+import platform
+import sys
+import timeit
+
+from Quasar.Testing.benchmarks import corpus
+from Quasar.parser.tokens.css_tokens import (CSSTokenizer, preprocessing,
+                                             tokenize_parallel)
+
+try:
+    import resource
+except ImportError:   # Not available on Windows
+    resource = None
+
+
+format_version = 1
+stages = ('preprocessing', 'tokenize', 'positions')
+min_seconds = 0.05
+
+
+def _peak_memory_kb():
+    """The peak resident memory of this process so far, in kilobytes, or None
+    if it cannot be found out.
+    """
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':   # Bytes rather than kilobytes
+        peak //= 1024
+    return peak
+
+
+def _tokenize_all(inputs, positions=False):
+    results = []
+    for input_string in inputs:
+        tokenizer = CSSTokenizer(input_string, positions)
+        tokenizer.tokenize_stream()
+        results.append(tokenizer.tokens)
+    return results
+
+
+def _tokenize_all_with_positions(inputs):
+    return _tokenize_all(inputs, True)
+
+
+def _preprocess_all(inputs):
+    return [preprocessing(input_string) for input_string in inputs]
+
+
+_runs = {'preprocessing': _preprocess_all, 'tokenize': _tokenize_all,
+         'positions': _tokenize_all_with_positions}
+
+
+def _measure(args):
+    """Runs one benchmark.  Meant to run in a process of its own.
+
+    Parameters
+    ----------
+    args : tuple
+        The name of the corpus, the stage, the scale and how many times to
+        repeat the run.
+
+    Returns
+    -------
+    dict
+        The measurements.
+    """
+
+    name, stage, scale, repeat = args
+    inputs = dict(corpus.corpora)[name](scale)
+    if isinstance(inputs, basestring):
+        inputs = [inputs]
+    size = sum(len(input_string) for input_string in inputs)
+    run = _runs[stage]
+
+    # The first run is the one whose memory is measured: later runs stay
+    # within the peak it set.
+    gc.collect()
+    peak_before = _peak_memory_kb()
+    objects_before = len(gc.get_objects())
+    results = run(inputs)
+    objects = len(gc.get_objects()) - objects_before
+    peak_after = _peak_memory_kb()
+    del results
+    tokens = sum(len(result) for result in _tokenize_all(inputs))
+
+    # Short runs are repeated enough to take a measurable amount of time.
+    number = 1
+    while True:
+        elapsed = timeit.timeit(lambda: run(inputs), number=number)
+        if elapsed >= min_seconds:
+            break
+        number *= 2
+    seconds = min(timeit.repeat(lambda: run(inputs), repeat=repeat,
+                                number=number)) / number
+    measurements = {
+        'seconds': seconds,
+        'input_bytes': size,
+        'tokens': tokens,
+        'tokens_per_second': tokens / seconds,
+        'mb_per_second': size / seconds / 1e6,
+        'peak_memory_kb': (None if peak_before is None
+                           else peak_after - peak_before),
+        'objects_per_token': objects / float(tokens or 1),
+    }
+    return measurements
+
+
+def run_benchmarks(names=None, scale=1, repeat=5):
+    """Runs the benchmarks.
+
+    Parameters
+    ----------
+    names : list of str
+        The corpora to run, or None for all of them.
+    scale : int
+        How large to make the generated inputs.
+    repeat : int
+        How many times to time each benchmark; the best time is kept.
+
+    Returns
+    -------
+    dict
+        The results, ready to be written out as JSON.
+    """
+
+    results = {}
+    for name, _ in corpus.corpora:
+        if names and name not in names:
+            continue
+        results[name] = {}
+        for stage in stages:
+            pool = multiprocessing.Pool(1)
+            try:
+                results[name][stage] = pool.apply(
+                    _measure, ((name, stage, scale, repeat),))
+            finally:
+                pool.terminate()
+                pool.join()
+    return {'format': format_version,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': scale,
+            'results': results}
+
+
+def run_parallel(names=None, scale=1, repeat=5, processes=None,
+                 parts_per_process=4):
+    """Times `tokenize_parallel` against the serial tokenizer.
+
+    Unlike the other benchmarks these run in this process, since the pool
+    workers could not start pools of their own.  Corpora made of many small
+    stylesheets are skipped.
+
+    Parameters
+    ----------
+    names : list of str
+        The corpora to run, or None for all of them.
+    scale : int
+        How large to make the generated inputs.
+    repeat : int
+        How many times to time each run; the best time is kept.
+    processes : int
+        How many worker processes to use.  Defaults to the number of CPUs.
+    parts_per_process : int
+        How many parts to split each stylesheet into per process.
+
+    Returns
+    -------
+    dict
+        The best times in seconds of `tokenize_stream`, `tokenize_columns`
+        and `tokenize_parallel`, and the speedup of the last over the first,
+        for each corpus.
+    """
+
+    processes = processes or multiprocessing.cpu_count()
+    results = {}
+    for name, make in corpus.corpora:
+        if names and name not in names:
+            continue
+        source = make(scale)
+        if not isinstance(source, basestring):
+            continue
+        chunk_size = max(len(source) // (processes * parts_per_process), 1)
+        runs = {
+            'stream': lambda: CSSTokenizer(source).tokenize_stream(),
+            'columns': lambda: CSSTokenizer(source).tokenize_columns(),
+            'parallel': lambda: tokenize_parallel(source, processes,
+                                                  chunk_size),
+        }
+        measured = {}
+        for run, function in runs.items():
+            measured[run] = min(timeit.repeat(function, repeat=repeat,
+                                              number=1))
+        measured['speedup'] = measured['stream'] / measured['parallel']
+        results[name] = measured
+    return {'processes': processes,
+            'cpus': multiprocessing.cpu_count(),
+            'scale': scale,
+            'results': results}
+
+
+def report_parallel(results):
+    """Formats the results of `run_parallel` as a table."""
+
+    lines = ['{} processes on {} CPUs'.format(results['processes'],
+                                               results['cpus']),
+             '{:<20} {:>10} {:>10} {:>10} {:>8}'.format(
+                 'corpus', 'stream', 'columns', 'parallel', 'speedup')]
+    for name, measured in sorted(results['results'].items()):
+        lines.append('{:<20} {:>10.4f} {:>10.4f} {:>10.4f} {:>7.2f}x'.format(
+            name, measured['stream'], measured['columns'],
+            measured['parallel'], measured['speedup']))
+    return '\n'.join(lines)
+
+
+def compare(baseline, current, tolerance=0.1):
+    """Finds the benchmarks that got worse than the baseline.
+
+    Parameters
+    ----------
+    baseline, current : dict
+        Results from `run_benchmarks`.
+    tolerance : float
+        How much worse, as a fraction of the baseline, a result may get.
+        Peak memory is also allowed to grow by up to a megabyte, as resident
+        memory grows a page or more at a time.
+
+    Returns
+    -------
+    list of str
+        A description of every regression.
+
+    Raises
+    ------
+    ValueError
+        If the results were taken at different scales, or written by an
+        incompatible version of this script.
+    """
+
+    if baseline.get('format') != current.get('format'):
+        raise ValueError('The results are in different formats')
+    if baseline['scale'] != current['scale']:
+        raise ValueError('The results were taken at different scales')
+    regressions = []
+    for name, stages_run in sorted(current['results'].items()):
+        for stage, now in sorted(stages_run.items()):
+            before = baseline['results'].get(name, {}).get(stage)
+            if before is None:
+                continue
+            label = '{}/{}'.format(name, stage)
+            if now['mb_per_second'] < before['mb_per_second'] / (
+                    1 + tolerance):
+                regressions.append('{}: {:.2f} MB/s, down from {:.2f}'.format(
+                    label, now['mb_per_second'], before['mb_per_second']))
+            if (now['peak_memory_kb'] is not None and
+                    before['peak_memory_kb'] is not None and
+                    now['peak_memory_kb'] > before['peak_memory_kb'] * (
+                        1 + tolerance) + 1024):
+                regressions.append('{}: peak memory {} kB, up from {}'.format(
+                    label, now['peak_memory_kb'], before['peak_memory_kb']))
+            if now['objects_per_token'] > before['objects_per_token'] * (
+                    1 + tolerance) + 0.01:
+                regressions.append(
+                    '{}: {:.3f} objects per token, up from {:.3f}'.format(
+                        label, now['objects_per_token'],
+                        before['objects_per_token']))
+    return regressions
+
+
+def report(results):
+    """Formats results as a table."""
+
+    lines = ['{:<20} {:<14} {:>10} {:>12} {:>8} {:>10} {:>9}'.format(
+        'corpus', 'stage', 'seconds', 'tokens/s', 'MB/s', 'peak kB',
+        'obj/token')]
+    for name, stages_run in sorted(results['results'].items()):
+        for stage, measured in sorted(stages_run.items()):
+            peak = measured['peak_memory_kb']
+            lines.append(
+                '{:<20} {:<14} {:>10.4f} {:>12.0f} {:>8.2f} {:>10} '
+                '{:>9.3f}'.format(
+                    name, stage, measured['seconds'],
+                    measured['tokens_per_second'], measured['mb_per_second'],
+                    '-' if peak is None else peak,
+                    measured['objects_per_token']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('corpora', nargs='*', metavar='corpus',
+                        help='the corpora to run (default: all of them)')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='how large to make the generated inputs')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='how many times to time each benchmark')
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--baseline',
+                        help='compare the results against this file')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='how much worse than the baseline a result may '
+                             'get, as a fraction (default: 0.1)')
+    parser.add_argument('--parallel', type=int, metavar='PROCESSES',
+                        help='time tokenize_parallel with this many '
+                             'processes instead')
+    args = parser.parse_args(argv)
+
+    unknown = set(args.corpora) - set(name for name, _ in corpus.corpora)
+    if unknown:
+        parser.error('unknown corpus: {}'.format(', '.join(sorted(unknown))))
+    if args.parallel is not None:
+        results = run_parallel(args.corpora, args.scale, args.repeat,
+                               args.parallel)
+        print(report_parallel(results))
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+        return 0
+    results = run_benchmarks(args.corpora, args.scale, args.repeat)
+    print(report(results))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            try:
+                regressions = compare(json.load(baseline), results,
+                                      args.tolerance)
+            except ValueError as error:
+                parser.error('cannot compare against {}: {}'.format(
+                    args.baseline, error))
+        if regressions:
+            print('\nRegressions against {}:'.format(args.baseline))
+            for regression in regressions:
+                print('  ' + regression)
+            return 1
+        print('\nNo regressions against {}.'.format(args.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Stylesheets to benchmark the CSS tokenizer on.
+
+The synthetic ones are generated from a fixed seed, so every run, on every
+machine, tokenizes the same input.  Each generator takes a `scale`: 1 gives an
+input that tokenizes in a fraction of a second.
+"""
+
+import os
+import random
+
+
+_seed = 20150101
+_pages = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'test_pages')
+
+_properties = ['color', 'background', 'margin', 'padding', 'border',
+               'font-size', 'font-family', 'line-height', 'width', 'height',
+               'display', 'position', 'top', 'left', 'z-index', 'opacity',
+               'text-align', 'box-shadow', 'transition', 'transform']
+_keywords = ['none', 'auto', 'block', 'inline-block', 'relative', 'absolute',
+             'center', 'bold', 'inherit', 'solid', 'transparent', 'hidden']
+_units = ['px', 'em', 'rem', '%', 'vh', 'ms', 'deg']
+
+
+def _value(rng):
+    choice = rng.random()
+    if choice < 0.4:
+        return '{}{}'.format(rng.randint(0, 1200), rng.choice(_units))
+    elif choice < 0.6:
+        return '#{:06x}'.format(rng.randint(0, 0xFFFFFF))
+    elif choice < 0.8:
+        return rng.choice(_keywords)
+    return 'rgba({},{},{},.{})'.format(rng.randint(0, 255),
+                                       rng.randint(0, 255),
+                                       rng.randint(0, 255), rng.randint(1, 9))
+
+
+def _selector(rng):
+    parts = []
+    for _ in xrange(rng.randint(1, 3)):
+        kind = rng.random()
+        if kind < 0.5:
+            parts.append('.c{}'.format(rng.randint(0, 500)))
+        elif kind < 0.7:
+            parts.append('#i{}'.format(rng.randint(0, 100)))
+        elif kind < 0.9:
+            parts.append(rng.choice(['div', 'a', 'span', 'li', 'ul', 'p']))
+        else:
+            parts.append('a:hover')
+    return ' '.join(parts)
+
+
+def _rule(rng, minified):
+    declarations = ['{}:{}'.format(rng.choice(_properties), _value(rng))
+                    for _ in xrange(rng.randint(1, 6))]
+    if minified:
+        return '{}{{{}}}'.format(_selector(rng), ';'.join(declarations))
+    return '{} {{\n    {};\n}}\n'.format(_selector(rng),
+                                         ';\n    '.join(declarations))
+
+
+def tiny_inline_styles(scale=1):
+    """Many `style` attribute values, each a declaration or two.
+
+    Returns
+    -------
+    list of str
+    """
+
+    rng = random.Random(_seed)
+    return ['{}:{}'.format(rng.choice(_properties), _value(rng)) +
+            (';{}:{}'.format(rng.choice(_properties), _value(rng))
+             if rng.random() < 0.5 else '')
+            for _ in xrange(2000 * scale)]
+
+
+def minified_framework(scale=1):
+    """A large minified stylesheet, like a CSS framework's distribution."""
+
+    rng = random.Random(_seed)
+    return ''.join(_rule(rng, True) for _ in xrange(4000 * scale))
+
+
+def comment_heavy(scale=1):
+    """A formatted stylesheet with a long comment before every rule."""
+
+    rng = random.Random(_seed)
+    rules = []
+    for index in xrange(1500 * scale):
+        rules.append('/*\n * Rule {}: {}\n */\n'.format(
+            index, ' '.join(rng.choice(_keywords) for _ in xrange(20))))
+        rules.append(_rule(rng, False))
+    return ''.join(rules)
+
+
+def number_heavy(scale=1):
+    """Declarations made of long lists of numbers, percentages and
+    dimensions, as in transforms, gradients and animations.
+    """
+
+    rng = random.Random(_seed)
+    rules = []
+    for index in xrange(1000 * scale):
+        numbers = ' '.join(
+            '{}{:.3f}{}'.format(rng.choice(['', '-', '+']),
+                                rng.uniform(0, 1000), rng.choice(_units))
+            for _ in xrange(16))
+        rules.append('.n{}{{transform:matrix3d({});margin:{}}}'.format(
+            index, numbers.replace(' ', ','), numbers))
+    return '\n'.join(rules)
+
+
+def escape_heavy(scale=1):
+    """Selectors and strings full of escapes, as generated by CSS modules and
+    icon fonts.
+    """
+
+    rng = random.Random(_seed)
+    rules = []
+    for index in xrange(1500 * scale):
+        rules.append('.icon-\\3{}\\:hover\\/x{}::before{{content:"\\f{:03x}'
+                     '\\"\\\\"}}'.format(rng.randint(0, 9), index,
+                                         rng.randint(0, 0xFFF)))
+    return '\n'.join(rules)
+
+
+def real_world(scale=1):
+    """The stylesheets of the saved pages in `Quasar/Testing/test_pages`."""
+
+    sheets = []
+    for name in sorted(os.listdir(_pages)):
+        if name.endswith('.css'):
+            with open(os.path.join(_pages, name), 'rb') as sheet:
+                sheets.append(sheet.read())
+    return '\n'.join(sheets) * (20 * scale)
+
+
+corpora = [
+    ('tiny_inline_styles', tiny_inline_styles),
+    ('minified_framework', minified_framework),
+    ('comment_heavy', comment_heavy),
+    ('number_heavy', number_heavy),
+    ('escape_heavy', escape_heavy),
+    ('real_world', real_world),
+]
@@ -1 +1,3 @@
-__all__ = ['test_css_tokenizer', 'test_tokenize_document']
\ No newline at end of file
+__all__ = ['test_css_ast', 'test_css_cache', 'test_css_profile',
+           'test_css_selectors', 'test_css_serialization',
+           'test_css_tokenizer', 'test_tokenize_document']
\ No newline at end of file
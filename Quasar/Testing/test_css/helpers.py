@@ -0,0 +1,20 @@
+# -*- coding: UTF-8 -*-
+"""Helpers shared by the CSS tests."""
+import os
+
+
+_pages = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'test_pages')
+
+
+def signature(tokens):
+    """The type and attributes of every token, for comparing token streams."""
+
+    return [(type(token), vars(token)) for token in tokens]
+
+
+def read_page(name):
+    """The contents of a saved page in `Quasar/Testing/test_pages`."""
+
+    with open(os.path.join(_pages, name), 'rb') as page:
+        return page.read()
@@ -0,0 +1,60 @@
+# -*- coding: UTF-8 -*-
+import copy
+
+from nose.tools import assert_raises
+
+from Quasar.Testing.benchmarks.bench_tokenizer import compare, format_version
+
+
+class TestCompare(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.baseline = {
+            'format': format_version,
+            'scale': 1,
+            'results': {'real_world': {'tokenize': {
+                'mb_per_second': 10.0,
+                'peak_memory_kb': 4096,
+                'objects_per_token': 1.0,
+            }}},
+        }
+
+    def _current(self, **measured):
+        current = copy.deepcopy(self.baseline)
+        current['results']['real_world']['tokenize'].update(measured)
+        return current
+
+    def test_within_tolerance(self):
+        current = self._current(mb_per_second=9.5, peak_memory_kb=4500,
+                                objects_per_token=1.05)
+        assert compare(self.baseline, current) == []
+
+    def test_regressions(self):
+        current = self._current(mb_per_second=5.0, peak_memory_kb=8192,
+                                objects_per_token=2.0)
+        regressions = compare(self.baseline, current)
+        assert len(regressions) == 3
+        assert regressions[0] == \
+            'real_world/tokenize: 5.00 MB/s, down from 10.00'
+
+    def test_tolerance(self):
+        current = self._current(mb_per_second=5.0)
+        assert compare(self.baseline, current, tolerance=1.5) == []
+
+    def test_new_benchmarks_are_not_compared(self):
+        current = self._current()
+        current['results']['comment_heavy'] = {'tokenize': {
+            'mb_per_second': 0.1,
+            'peak_memory_kb': None,
+            'objects_per_token': 9.0,
+        }}
+        assert compare(self.baseline, current) == []
+
+    def test_incompatible_results(self):
+        current = self._current()
+        current['scale'] = 2
+        assert_raises(ValueError, compare, self.baseline, current)
+        current = self._current()
+        current['format'] = format_version + 1
+        assert_raises(ValueError, compare, self.baseline, current)
@@ -0,0 +1,213 @@
+# -*- coding: UTF-8 -*-
+from nose.tools import assert_raises
+
+from Quasar.parser.ast.css_ast import AtRule, Declaration, Function, \
+    QualifiedRule, SimpleBlock, _match_blocks, iter_stylesheet, \
+    parse_component_value, parse_component_value_list, parse_declaration, \
+    parse_declaration_list, parse_rule, parse_rule_list, parse_stylesheet
+from Quasar.parser.tokens.css_tokens import CDOToken, CSSTokenizer, \
+    DimensionToken, HashToken, IdentToken, StringToken, WhitespaceToken
+
+
+def _values(values):
+    return [value.value for value in values]
+
+
+def _declaration(declaration):
+    return declaration.name, repr(declaration.value), declaration.important
+
+
+class TestStylesheet(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.css = u"""<!-- @charset "utf-8";
+#gbar,#guser {
+    font-size : 13px;
+    padding-top : 1px ! IMPORTANT;
+    background: url(a.png) rgba(0, 0, 0, .5);
+}
+@media screen and (max-width: 10px) { p { margin: 0 } }
+p { ; 12: bad; no-colon; color: red }
+unterminated"""
+        cls.stylesheet = parse_stylesheet(cls.css)
+        cls.rules = cls.stylesheet.rules
+
+    def test_rules(self):
+        assert [type(rule) for rule in self.rules] == \
+            [AtRule, QualifiedRule, AtRule, QualifiedRule]
+
+    def test_at_rule_without_block(self):
+        rule = self.rules[0]
+        assert rule.name == u'charset'
+        assert rule.block is None
+        assert isinstance(rule.prelude[1], StringToken)
+        assert rule.rules == []
+
+    def test_prelude(self):
+        prelude = self.rules[1].prelude
+        assert isinstance(prelude[0], HashToken)
+        assert _values(prelude[:3]) == [u'gbar', u',', u'guser']
+        assert isinstance(prelude[-1], WhitespaceToken)
+
+    def test_declarations(self):
+        declarations = self.rules[1].declarations
+        assert [declaration.name for declaration in declarations] == \
+            [u'font-size', u'padding-top', u'background']
+        assert isinstance(declarations[0].value[0], DimensionToken)
+        assert len(declarations[0].value) == 1
+        assert not declarations[0].important
+
+    def test_important(self):
+        declaration = self.rules[1].declarations[1]
+        assert declaration.important
+        assert len(declaration.value) == 1
+        assert declaration.value[0].unit == u'px'
+
+    def test_function(self):
+        function = self.rules[1].declarations[2].value[2]
+        assert isinstance(function, Function)
+        assert function.name == u'rgba'
+        assert [value.value for value in function.arguments
+                if not isinstance(value, WhitespaceToken)] == \
+            [0, u',', 0, u',', 0, u',', 0.5]
+
+    def test_nested_rules(self):
+        media = self.rules[2]
+        assert isinstance(media.prelude[-2], SimpleBlock)
+        assert media.prelude[-2].token.value == u'('
+        assert media.rules[0].declarations[0].name == u'margin'
+
+    def test_recovery(self):
+        declarations = self.rules[3].declarations
+        assert [declaration.name for declaration in declarations] == \
+            [u'color']
+
+    def test_same_as_lazy(self):
+        lazy = parse_stylesheet(self.css, lazy=True).rules
+        assert [type(rule) for rule in lazy] == \
+            [type(rule) for rule in self.rules]
+        assert map(_declaration, lazy[1].declarations) == \
+            map(_declaration, self.rules[1].declarations)
+
+
+class TestLazy(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.css = u'a { b: c(d { ) }); e: [f}] } @media x { g { h: i } } j {}'
+
+    def test_blocks_unparsed(self):
+        rules = parse_stylesheet(self.css, lazy=True).rules
+        assert len(rules) == 3
+        assert not rules[0].block.parsed
+        assert not rules[1].block.parsed
+
+    def test_brackets_matched(self):
+        rule = parse_stylesheet(self.css, lazy=True).rules[0]
+        assert [declaration.name for declaration in rule.declarations] == \
+            [u'b', u'e']
+        assert rule.declarations is rule.declarations
+        block = rule.declarations[1].value[0]
+        assert block.token.value == u'['
+        assert _values(block.value) == [u'f', u'}']
+
+    def test_nested_blocks_lazy(self):
+        media = parse_stylesheet(self.css, lazy=True).rules[1]
+        assert not media.rules[0].block.parsed
+        assert media.rules[0].declarations[0].name == u'h'
+
+    def test_value(self):
+        rule = parse_stylesheet(self.css, lazy=True).rules[2]
+        assert rule.block.value == []
+        assert rule.block.parsed
+
+    def test_token_ranges(self):
+        tokenizer = CSSTokenizer(self.css)
+        tokenizer.tokenize_stream()
+        tokens = list(tokenizer.tokens)
+        rules = parse_stylesheet(tokens, lazy=True).rules
+        block = rules[0].block
+        assert tokens[block.start - 1].value == u'{'
+        assert tokens[block.end].value == u'}'
+        assert block.tokens == tokens[block.start:block.end]
+        inner = rules[1].rules[0].block
+        assert rules[1].block.start < inner.start < inner.end < \
+            rules[1].block.end
+        assert parse_stylesheet(self.css).rules[0].block.start is None
+
+    @staticmethod
+    def test_unclosed():
+        rule = parse_stylesheet(u'a { b: c; d { e', lazy=True).rules[0]
+        assert [declaration.name for declaration in rule.declarations] == \
+            [u'b']
+
+    @staticmethod
+    def test_match_blocks():
+        tokenizer = CSSTokenizer(u'{(})}{f(})}[{]{')
+        tokenizer.tokenize_stream()
+        assert _match_blocks(list(tokenizer.tokens)) == \
+            {0: 4, 5: 9, 11: 14, 13: 14}
+
+
+class TestStreaming(object):
+
+    @staticmethod
+    def test_rules_handed_out_as_parsed():
+        tokenizer = CSSTokenizer(u'a { b: c } d { e: f }')
+        rules = iter_stylesheet(tokenizer)
+        first = next(rules)
+        assert first.prelude[0].value == u'a'
+        assert tokenizer._pos < tokenizer._length
+        assert next(rules).prelude[0].value == u'd'
+
+    @staticmethod
+    def test_tokens():
+        tokenizer = CSSTokenizer(u'a { b: c }')
+        tokenizer.tokenize_stream()
+        rule = parse_stylesheet(tokenizer.tokens).rules[0]
+        assert rule.declarations[0].name == u'b'
+
+
+class TestEntryPoints(object):
+
+    @staticmethod
+    def test_rule_list():
+        rules = parse_rule_list(u' <!-- a {} ')
+        assert len(rules) == 1
+        assert isinstance(rules[0].prelude[0], CDOToken)
+
+    @staticmethod
+    def test_rule():
+        assert isinstance(parse_rule(u' @import "a.css" ; '), AtRule)
+        assert isinstance(parse_rule(u'a { }'), QualifiedRule)
+        for css in (u'  ', u'a', u'a {} b {}'):
+            assert_raises(ValueError, parse_rule, css)
+
+    @staticmethod
+    def test_declaration():
+        declaration = parse_declaration(u' color : blue !important ')
+        assert isinstance(declaration, Declaration)
+        assert declaration.name == u'color'
+        assert declaration.important
+        assert isinstance(declaration.value[0], IdentToken)
+        assert_raises(ValueError, parse_declaration, u'12: blue')
+        assert_raises(ValueError, parse_declaration, u'color blue')
+
+    @staticmethod
+    def test_declaration_list():
+        declarations = parse_declaration_list(u'color: red; @page {}; x: y')
+        assert [type(declaration) for declaration in declarations] == \
+            [Declaration, AtRule, Declaration]
+
+    @staticmethod
+    def test_component_value():
+        assert isinstance(parse_component_value(u' f(1) '), Function)
+        assert_raises(ValueError, parse_component_value, u'a b')
+        assert_raises(ValueError, parse_component_value, u' ')
+
+    @staticmethod
+    def test_component_value_list():
+        values = parse_component_value_list(u'a [b] (c')
+        assert isinstance(values[2], SimpleBlock)
+        assert _values(values[4].value) == [u'c']
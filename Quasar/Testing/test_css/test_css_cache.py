@@ -0,0 +1,134 @@
+# -*- coding: UTF-8 -*-
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_raises
+
+from Quasar.parser.tokens import css_serialization
+from Quasar.parser.tokens.css_cache import TokenCache
+from Quasar.parser.tokens.css_tokens import CSSTokenizer
+from Quasar.Testing.test_css.helpers import signature
+
+
+class TestTokenCache(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.css = '#gbar,#guser { font-size : 13px; padding-top : 1px; }'
+        stream = CSSTokenizer(cls.css)
+        stream.tokenize_stream()
+        cls.expected = signature(stream.tokens)
+
+    def test_miss_then_hit(self):
+        cache = TokenCache()
+        assert signature(cache.tokenize(self.css)) == self.expected
+        assert (cache.hits, cache.misses) == (0, 1)
+        assert self.css in cache
+        assert signature(cache.tokenize(self.css)) == self.expected
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_hits_hand_out_new_deques(self):
+        cache = TokenCache()
+        first = cache.tokenize(self.css)
+        first.clear()
+        assert signature(cache.tokenize(self.css)) == self.expected
+
+    def test_unicode_shares_key_with_bytes(self):
+        cache = TokenCache()
+        cache.tokenize(u'a { content: "é" }')
+        cache.tokenize(u'a { content: "é" }'.encode('UTF-8'))
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_positions(self):
+        cache = TokenCache(positions=True)
+        tokens = cache.tokenize(self.css)
+        assert (tokens[1].start, tokens[1].end) == (5, 6)
+
+    @staticmethod
+    def test_least_recently_used_are_dropped():
+        cache = TokenCache()
+        cache.tokenize('a')
+        cache.max_bytes = cache.size * 2
+        cache.tokenize('b')
+        cache.tokenize('a')
+        cache.tokenize('c')
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+        assert cache.size <= cache.max_bytes
+
+    @staticmethod
+    def test_too_large_for_the_budget():
+        cache = TokenCache(max_bytes=0)
+        assert [token.value for token in cache.tokenize('a b')] == \
+            ['a', ' ', 'b']
+        assert len(cache) == 0
+        assert cache.size == 0
+
+    @staticmethod
+    def test_clear():
+        cache = TokenCache()
+        cache.tokenize('a')
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.size == 0
+
+
+class TestTokenCacheDirectory(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_survives_the_cache(self):
+        TokenCache(directory=self.directory).tokenize('a { b: c }')
+        cache = TokenCache(directory=self.directory)
+        tokens = cache.tokenize('a { b: c }')
+        assert (cache.hits, cache.misses) == (1, 0)
+        assert [token.value for token in tokens] == \
+            ['a', ' ', '{', ' ', 'b', ':', ' ', 'c', ' ', '}']
+
+    def test_positions_are_stored_separately(self):
+        TokenCache(directory=self.directory).tokenize('a')
+        cache = TokenCache(directory=self.directory, positions=True)
+        tokens = cache.tokenize('a')
+        assert cache.misses == 1
+        assert tokens[0].end == 1
+
+    def test_unreadable_entry_is_a_miss(self):
+        cache = TokenCache(directory=self.directory)
+        cache.tokenize('a')
+        for name in os.listdir(self.directory):
+            with open(os.path.join(self.directory, name), 'wb') as stored:
+                stored.write('not tokens')
+        cache = TokenCache(directory=self.directory)
+        assert [token.value for token in cache.tokenize('a')] == ['a']
+        assert cache.misses == 1
+
+    def _failing_dump(self, error):
+        def dump(tokens, stored):
+            stored.write('partial')
+            raise error
+        original = css_serialization.dump
+        css_serialization.dump = dump
+        try:
+            return TokenCache(directory=self.directory).tokenize('a')
+        finally:
+            css_serialization.dump = original
+
+    def test_failed_write_is_skipped(self):
+        tokens = self._failing_dump(IOError('disk full'))
+        assert [token.value for token in tokens] == ['a']
+        assert os.listdir(self.directory) == []
+
+    def test_failed_dump_leaves_no_file(self):
+        assert_raises(TypeError, self._failing_dump, TypeError('bad token'))
+        assert os.listdir(self.directory) == []
+
+    def test_creates_directory(self):
+        directory = os.path.join(self.directory, 'nested')
+        TokenCache(directory=directory).tokenize('a')
+        assert len(os.listdir(directory)) == 1
@@ -0,0 +1,83 @@
+# -*- coding: UTF-8 -*-
+import json
+from StringIO import StringIO
+
+from nose.tools import assert_raises
+
+from Quasar.parser.tokens.css_profile import TokenizerProfile, \
+    profile_tokenize
+from Quasar.parser.tokens.css_tokens import CSSTokenizer, \
+    ChunkedCSSTokenizer
+from Quasar.Testing.test_css.helpers import signature
+
+
+class TestProfile(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.css = (u'a.b { width: 1.5em; content: "x\\41"; '
+                   u'background: url(a.png) } /* c */ #d { margin: -2px }')
+
+    def test_same_tokens(self):
+        plain = CSSTokenizer(self.css)
+        plain.tokenize_stream()
+        profiled = CSSTokenizer(self.css)
+        profile = TokenizerProfile(profiled)
+        profiled.tokenize_stream()
+        assert signature(profiled.tokens) == signature(plain.tokens)
+        assert sum(profile.token_types.values()) == len(plain.tokens)
+
+    def test_counts(self):
+        profile = profile_tokenize(self.css)
+        assert profile.calls['consume_string_token'] == 1
+        assert profile.calls['consume_url_token'] == 1
+        assert profile.calls['consume_comment'] == 1
+        assert profile.calls['consume_numeric_token'] == 2
+        assert profile.calls['_consume_number'] == 2
+        assert profile.token_types['DimensionToken'] == 2
+        assert profile.token_lengths['DimensionToken'] == {4: 1, 8: 1}
+        assert profile.token_lengths['URLToken'] == {16: 1}
+
+    def test_nested_time(self):
+        profile = profile_tokenize(self.css)
+        for name in profile.calls:
+            assert 0 <= profile.own_time[name] <= profile.total_time[name]
+        assert profile.total_time['consume_numeric_token'] >= \
+            profile.total_time['_consume_number']
+
+    def test_detach(self):
+        tokenizer = CSSTokenizer(self.css)
+        attributes = set(vars(tokenizer))
+        profile = TokenizerProfile(tokenizer)
+        tokenizer.tokenize_stream()
+        profile.detach()
+        assert set(vars(tokenizer)) - attributes == set()
+        calls = dict(profile.calls)
+        tokenizer.stream = u'a b c'
+        tokenizer.tokenize_stream()
+        assert profile.calls == calls
+
+    def test_already_profiled(self):
+        tokenizer = CSSTokenizer(self.css)
+        TokenizerProfile(tokenizer)
+        assert_raises(ValueError, TokenizerProfile, tokenizer)
+
+    def test_chunked(self):
+        tokenizer = ChunkedCSSTokenizer(StringIO(self.css.encode('utf-8')),
+                                        chunk_size=7)
+        profile = TokenizerProfile(tokenizer)
+        tokens = list(tokenizer.iter_tokens())
+        assert profile.calls['consume_url_token'] >= 1
+        assert sum(profile.token_types.values()) >= len(tokens)
+
+    def test_export(self):
+        profile = profile_tokenize(self.css)
+        stored = StringIO()
+        profile.dump(stored)
+        exported = json.loads(stored.getvalue())
+        assert exported['consumers']['consume_hash_token']['calls'] == 1
+        assert exported['token_types']['HashToken'] == 1
+        assert exported['token_lengths']['HashToken'] == {'2': 1}
+        report = profile.report()
+        assert 'consume_hash_token' in report
+        assert 'HashToken' in report
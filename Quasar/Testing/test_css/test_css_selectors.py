@@ -0,0 +1,202 @@
+# -*- coding: UTF-8 -*-
+from nose.tools import assert_raises
+
+from Quasar.gui.rendering.css.css_selectors import AncestorFilter, \
+    Element, RuleIndex, parse_selector_list
+from Quasar.parser.ast.css_ast import parse_stylesheet
+
+
+def _document():
+    html = Element(u'HTML')
+    body = Element(u'body', parent=html)
+    menu = Element(u'ul', {u'id': u'nav', u'class': u'menu main'}, body)
+    items = [Element(u'li', {u'class': classes}, menu)
+             for classes in (u'item', u'item', u'item last')]
+    link = Element(u'a', {u'href': u'http://a.org', u'lang': u'en-US'},
+                   items[1])
+    return html, body, menu, items, link
+
+
+def _matches(selector, element):
+    return any(compiled.match(element)
+               for compiled in parse_selector_list(selector))
+
+
+class TestMatching(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.html, cls.body, cls.menu, cls.items, cls.link = _document()
+
+    def test_simple(self):
+        assert _matches(u'html', self.html)
+        assert _matches(u'UL#nav.menu.main', self.menu)
+        assert not _matches(u'ul.menu.other', self.menu)
+        assert _matches(u'*', self.link)
+
+    def test_combinators(self):
+        assert _matches(u'body a', self.link)
+        assert _matches(u'#nav > li > a', self.link)
+        assert not _matches(u'#nav > a', self.link)
+        assert _matches(u'li + li', self.items[1])
+        assert not _matches(u'li + li', self.items[0])
+        assert _matches(u'li:first-child ~ .last', self.items[2])
+        assert _matches(u'ul li a, p', self.link)
+
+    def test_attributes(self):
+        assert _matches(u'[href]', self.link)
+        assert _matches(u'[href="http://a.org"]', self.link)
+        assert _matches(u'[href^=http][href$=".org"][href*=a]', self.link)
+        assert _matches(u'[lang|=en]', self.link)
+        assert _matches(u'[class~=last]', self.items[2])
+        assert not _matches(u'[class~=las]', self.items[2])
+        assert not _matches(u'[href^=""]', self.link)
+
+    def test_attribute_shortcuts(self):
+        assert _matches(u'[id=nav]', self.menu)
+        assert _matches(u'[class~=main]', self.menu)
+        assert not _matches(u'[class~="menu main"], [class~=""]', self.menu)
+        assert _matches(u'[lang~=en-US][href]', self.link)
+
+    @staticmethod
+    def test_words_split_once():
+        element = Element(u'p', {u'rel': u'external  nofollow'})
+        words = element.words(u'rel')
+        assert words == frozenset([u'external', u'nofollow'])
+        assert element.words(u'rel') is words
+        assert element.words(u'class') is element.classes
+        assert element.words(u'missing') == frozenset()
+
+    def test_pseudo_classes(self):
+        assert _matches(u':root', self.html)
+        assert _matches(u'li:first-child', self.items[0])
+        assert _matches(u'li:last-of-type', self.items[2])
+        assert _matches(u'a:only-child:empty:link', self.link)
+        assert _matches(u'li:not(.last)', self.items[1])
+        assert not _matches(u'li:not(.last)', self.items[2])
+        assert not _matches(u'a:hover', self.link)
+
+    @staticmethod
+    def test_specificity():
+        assert [selector.specificity for selector in parse_selector_list(
+            u'#a .b c, a:not(#x)::before, *, li:first-child')] == \
+            [(1, 1, 1), (1, 0, 2), (0, 0, 0), (0, 1, 1)]
+
+    @staticmethod
+    def test_invalid():
+        for selector in (u'', u'a >', u'a > > b', u'.', u'#1', u'[x=]',
+                         u'[x=y z]', u'a::before b', u':not(a b)', u'a, ',
+                         u'a "b"', u'*|a', u'p:nth-child(2)', u':unknown'):
+            assert_raises(ValueError, parse_selector_list, selector)
+
+
+class TestRuleIndex(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.html, cls.body, cls.menu, cls.items, cls.link = _document()
+        stylesheet = parse_stylesheet(u"""
+            li { n: 1 }
+            ul > li.item { n: 2 }
+            #nav .item a[href^=http] { n: 3 }
+            li + li { n: 4 }
+            li:first-child, .last { n: 5 }
+            * { n: 6 }
+            p:nth-child(2) { n: 7 }
+            a::before { n: 8 }
+            @media print { li { n: 9 } }
+        """, lazy=True)
+        cls.index = RuleIndex.from_stylesheet(stylesheet)
+
+    def _numbers(self, element, pseudo_element=None):
+        return [rule.declarations[0].value[0].value
+                for rule in self.index.match(element, pseudo_element)]
+
+    def test_indexed(self):
+        assert len(self.index) == 8
+        assert set(self.index.tags) == set([u'li', u'a'])
+        assert set(self.index.classes) == set([u'item', u'last'])
+        assert len(self.index.universal) == 1
+
+    def test_cascade_order(self):
+        assert self._numbers(self.items[0]) == [6, 1, 5, 2]
+        assert self._numbers(self.items[2]) == [6, 1, 4, 5, 2]
+        assert self._numbers(self.link) == [6, 3]
+
+    def test_pseudo_element(self):
+        assert self._numbers(self.link, u'before') == [8]
+
+    def test_candidates(self):
+        candidates = self.index.candidates(self.menu)
+        assert [entry[3].declarations[0].value[0].value
+                for entry in candidates] == [6]
+
+    @staticmethod
+    def test_buckets_keep_work_down():
+        index = RuleIndex()
+        for number in range(1000):
+            for selector in parse_selector_list(u'.c{0}, #i{0}'.format(
+                    number)):
+                index.add(selector, number)
+        element = Element(u'div', {u'class': u'c1 c2', u'id': u'i3'})
+        assert len(index.candidates(element)) == 3
+        assert index.match(element) == [1, 2, 3]
+
+    @staticmethod
+    def test_attribute_buckets():
+        index = RuleIndex()
+        for number, selector in enumerate(parse_selector_list(
+                u'[href], [lang|=en], [id=i], [class~=c], [x]:first-child')):
+            index.add(selector, number)
+        assert set(index.attributes) == set([u'href', u'lang', u'x'])
+        assert set(index.ids) == set([u'i'])
+        assert set(index.classes) == set([u'c'])
+        element = Element(u'a', {u'href': u'/', u'class': u'c'})
+        assert len(index.candidates(element)) == 2
+        assert index.match(element) == [0, 3]
+
+
+class TestAncestorFilter(object):
+
+    @staticmethod
+    def test_ancestor_hashes():
+        direct, siblings, single = parse_selector_list(
+            u'#nav > .item a, b + .item a, a')
+        assert direct.ancestor_hashes
+        assert siblings.ancestor_hashes == \
+            parse_selector_list(u'.item a')[0].ancestor_hashes
+        assert single.ancestor_hashes == ()
+
+    @staticmethod
+    def test_push_pop():
+        html, body, menu, items, link = _document()
+        selector = parse_selector_list(u'#nav .last a')[0]
+        ancestors = AncestorFilter()
+        assert not ancestors.might_match(selector)
+        for element in (menu, items[2]):
+            ancestors.push(element)
+        assert ancestors.might_match(selector)
+        ancestors.pop(items[2])
+        assert not ancestors.might_match(selector)
+        ancestors.pop(menu)
+        assert not any(ancestors.counts)
+
+    @staticmethod
+    def test_match_tree():
+        index = RuleIndex()
+        for number, selector in enumerate(parse_selector_list(
+                u'body li, #nav a, .missing a, p a, li + li, html > body, '
+                u'*, ul .last')):
+            index.add(selector, number)
+        html = _document()[0]
+        assert [(element, rules) for element, rules in index.match_tree(
+            html)] == [(element, index.match(element))
+                       for element in html.iter()]
+
+    @staticmethod
+    def test_match_subtree():
+        index = RuleIndex()
+        index.add(parse_selector_list(u'body #nav li')[0], 1)
+        menu = _document()[2]
+        assert [rules for _, rules in index.match_tree(menu)] == \
+            [[], [1], [1], [], [1]]
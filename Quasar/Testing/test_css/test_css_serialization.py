@@ -0,0 +1,121 @@
+# -*- coding: UTF-8 -*-
+import os
+import shutil
+import tempfile
+
+from Quasar.parser.tokens.css_serialization import dumps, dump, loads, load, \
+    block_size
+from Quasar.parser.tokens.css_tokens import CSSTokenizer, LiteralToken, \
+    WhitespaceToken
+from Quasar.Testing.test_css.helpers import signature
+
+
+def _tokens(css, positions=False):
+    stream = CSSTokenizer(css, positions)
+    if positions:
+        return list(stream.iter_tokens())
+    stream.tokenize_stream()
+    return list(stream.tokens)
+
+
+class TestRoundTrip(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.css = (u'@media screen { #gbar,#guser { font-size : 13px; '
+                   u'width: 50%; margin: -1.5e3em 0; content: "é"; '
+                   u'background: url(a.png) } } <!-- a|=b ~= 12345678901234 '
+                   u'99999999999999999999999% U+0-7F -->')
+
+    def test_without_positions(self):
+        tokens = _tokens(self.css)
+        reader = loads(dumps(tokens))
+        assert not reader.positions
+        assert len(reader) == len(tokens)
+        assert signature(reader) == signature(tokens)
+
+    def test_with_positions(self):
+        tokens = _tokens(self.css, True)
+        reader = loads(dumps(tokens))
+        assert reader.positions
+        assert signature(reader) == signature(tokens)
+
+    def test_columns(self):
+        stream = CSSTokenizer(self.css)
+        columns = stream.tokenize_columns()
+        reader = loads(dumps(columns))
+        assert signature(reader) == signature(_tokens(self.css, True))
+
+    def test_indexing(self):
+        tokens = _tokens(self.css * 10, True)
+        reader = loads(dumps(tokens))
+        assert len(tokens) > block_size * 2
+        for index in (0, block_size - 1, block_size, len(tokens) - 1, -1):
+            assert vars(reader[index]) == vars(tokens[index])
+        assert signature(reader[block_size - 3:block_size * 2 + 5]) == \
+            signature(tokens[block_size - 3:block_size * 2 + 5])
+        assert signature(reader[::7]) == signature(tokens[::7])
+
+    def test_index_out_of_range(self):
+        reader = loads(dumps(_tokens(self.css)))
+        try:
+            reader[len(reader)]
+        except IndexError:
+            pass
+        else:
+            assert False, 'expected an IndexError'
+
+    @staticmethod
+    def test_shared_tokens_stay_shared():
+        tokens = list(loads(dumps(_tokens('a b{'))))
+        assert tokens[1] is _tokens(' ')[0]
+        assert type(tokens[1]) is WhitespaceToken
+        assert tokens[3] is CSSTokenizer._literals[u'{']
+
+    @staticmethod
+    def test_empty():
+        assert list(loads(dumps([]))) == []
+
+
+class TestBadData(object):
+
+    @staticmethod
+    def test_not_tokens():
+        for data in ('', 'not serialized tokens at all, just a long string'):
+            try:
+                loads(data)
+            except ValueError:
+                pass
+            else:
+                assert False, 'expected a ValueError'
+
+    @staticmethod
+    def test_unknown_version():
+        data = bytearray(dumps(_tokens('a')))
+        data[4] = 99
+        try:
+            loads(str(data))
+        except ValueError as error:
+            assert '99' in str(error)
+        else:
+            assert False, 'expected a ValueError'
+
+
+class TestFile(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_dump_and_load(self):
+        tokens = _tokens('a { b: c 1px }', True)
+        path = os.path.join(self.directory, 'a.tokens')
+        with open(path, 'wb') as stored:
+            dump(tokens, stored)
+        with open(path, 'rb') as stored:
+            reader = load(stored)
+        with reader:
+            assert signature(reader) == signature(tokens)
+            assert isinstance(reader[-1], LiteralToken)
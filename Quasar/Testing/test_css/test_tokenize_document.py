@@ -1,7 +1,17 @@
+# -*- coding: UTF-8 -*-
+import io
+import mmap
+import os
+import tempfile
+
 from nose.tools import assert_raises
 
+from Quasar.parser.tokens import css_tokens
 from Quasar.parser.tokens.css_tokens import CSSTokenizer, HashToken, \
-    WhitespaceToken, LiteralToken, DimensionToken, IdentToken, DelimToken
+    WhitespaceToken, LiteralToken, DimensionToken, IdentToken, DelimToken, \
+    AtKeywordToken, ChunkedCSSTokenizer, StringToken, NumberToken, \
+    PercentageToken, TokenColumns, tokenize_parallel, tokenize_many
+from Quasar.Testing.test_css.helpers import read_page, signature
 
 
 class TestSmallCSS1(object):
@@ -123,3 +133,494 @@ class TestSmallCSS1(object):
 
     def test_no_more_tokens(self):
         assert_raises(IndexError, self.tokens.__getitem__, 24)
+
+
+class TestIterTokens(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.css = """@charset "utf-8";
+@import url(a.css);
+#gbar,#guser {
+    font-size : 13px;
+}"""
+
+    def test_same_tokens_as_tokenize_stream(self):
+        eager = CSSTokenizer(self.css)
+        eager.tokenize_stream()
+        lazy = list(CSSTokenizer(self.css).iter_tokens())
+        assert len(lazy) == len(eager.tokens)
+        for lazy_token, eager_token in zip(lazy, eager.tokens):
+            assert type(lazy_token) is type(eager_token)
+            assert lazy_token.value == eager_token.value
+
+    def test_tokens_are_not_kept(self):
+        stream = CSSTokenizer(self.css)
+        for _ in stream.iter_tokens():
+            assert len(stream.tokens) == 0
+
+    def test_stopping_early_leaves_input_unconsumed(self):
+        stream = CSSTokenizer(self.css)
+        tokens = stream.iter_tokens()
+        first = next(tokens)
+        assert isinstance(first, AtKeywordToken)
+        assert first.value == 'charset'
+        assert ''.join(stream.stream).startswith(' "utf-8";')
+
+    def test_resumes_where_it_stopped(self):
+        stream = CSSTokenizer(self.css)
+        head = next(stream.iter_tokens())
+        rest = list(stream.iter_tokens())
+        assert head.value == 'charset'
+        assert isinstance(rest[0], WhitespaceToken)
+        assert rest[-1].value == '}'
+
+
+class TestTokenColumns(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.css = read_page('google_homepage2.css')
+        stream = CSSTokenizer(cls.css)
+        stream.tokenize_stream()
+        cls.expected = [vars(token) for token in stream.tokens]
+        cls.expected_types = [type(token) for token in stream.tokens]
+        cls.columns = CSSTokenizer(cls.css).tokenize_columns()
+
+    def test_same_tokens_as_tokenize_stream(self):
+        assert len(self.columns) == len(self.expected)
+        assert [type(token) for token in self.columns] == self.expected_types
+        assert [vars(token) for token in self.columns] == self.expected
+
+    def test_offsets_cover_the_source(self):
+        columns = self.columns
+        for index in range(len(columns)):
+            assert columns.starts[index] < columns.ends[index]
+            if index:
+                assert columns.starts[index] >= columns.ends[index - 1]
+        assert columns.ends[-1] <= len(columns.source)
+
+    def test_strings_are_stored_once(self):
+        table = self.columns.string_table
+        assert len(table) == len(set(table))
+
+    @staticmethod
+    def test_numeric_columns():
+        columns = CSSTokenizer('10px 50% 1.5 a').tokenize_columns()
+        assert columns.kinds[columns.types[0]] == (DimensionToken, 'integer')
+        assert columns.numbers[0] == 10
+        assert columns.string_table[columns.units[0]] == 'px'
+        assert columns.kinds[columns.types[2]] == (PercentageToken, 'number')
+        assert columns.numbers[2] == 50
+        assert columns.kinds[columns.types[4]] == (NumberToken, 'number')
+        assert columns.numbers[4] == 1.5
+        assert columns.numbers[6] == 0
+        assert columns.units[6] == 0
+
+    @staticmethod
+    def test_indexing():
+        columns = CSSTokenizer('#a{b:c}').tokenize_columns()
+        assert isinstance(columns[0], HashToken)
+        assert columns[0].type_flag == 'id'
+        assert columns[-1].value == '}'
+        assert [token.value for token in columns[1:3]] == ['{', 'b']
+        assert_raises(IndexError, lambda: columns[len(columns)])
+
+    @staticmethod
+    def test_queued_tokens_are_left_alone():
+        stream = CSSTokenizer('a b')
+        stream._consume_token()
+        columns = stream.tokenize_columns()
+        assert len(stream.tokens) == 1
+        assert stream.tokens[0].value == 'a'
+        assert [token.value for token in columns] == [' ', 'b']
+        assert list(columns.starts) == [1, 2]
+
+    @staticmethod
+    def test_empty():
+        columns = CSSTokenizer('').tokenize_columns()
+        assert isinstance(columns, TokenColumns)
+        assert len(columns) == 0
+        assert list(columns) == []
+
+
+class TestPositions(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.css = "a {\r\n  color: red;\r\n}\n/* x */ b{}"
+        cls.stream = CSSTokenizer(cls.css, positions=True)
+        cls.stream.tokenize_stream()
+        cls.offsets = zip(cls.stream.starts, cls.stream.ends)
+
+    @staticmethod
+    def _offsets(tokens):
+        return [(token.start, token.end) for token in tokens]
+
+    def test_offsets_slice_the_source(self):
+        source = u''.join(CSSTokenizer(self.css).stream)
+        assert len(self.offsets) == len(self.stream.tokens)
+        assert [source[start:end] for start, end in self.offsets] == [
+            'a', ' ', '{', '\n  ', 'color', ':', ' ', 'red', ';', '\n', '}',
+            '\n', ' ', 'b', '{', '}']
+
+    def test_line_column(self):
+        positions = [self.stream.line_column(start)
+                     for start, _ in self.offsets]
+        assert positions[0] == (1, 1)
+        assert positions[4] == (2, 3)
+        assert positions[10] == (3, 1)
+        assert positions[13] == (4, 9)
+
+    def test_shared_tokens_are_untouched(self):
+        stream = CSSTokenizer('a b')
+        stream.tokenize_stream()
+        assert stream.starts is None
+        assert self.stream.tokens[1] is stream.tokens[1]
+        assert not hasattr(self.stream.tokens[1], 'start')
+
+    def test_iter_tokens(self):
+        tokens = list(CSSTokenizer(self.css, positions=True).iter_tokens())
+        assert self._offsets(tokens) == self.offsets
+        assert tokens[1] is not self.stream.tokens[1]
+
+    def test_comments_are_not_tokens(self):
+        for css in ('/**/', 'a/* b */"/*"url(/*)/*/c/**//', '/* a'):
+            stream = CSSTokenizer(css, positions=True)
+            stream.tokenize_stream()
+            assert zip(stream.starts, stream.ends) == self._offsets(
+                CSSTokenizer(css, positions=True).iter_tokens())
+
+    def test_chunked(self):
+        chunks = [self.css[i:i + 2] for i in range(0, len(self.css), 2)]
+        stream = ChunkedCSSTokenizer(chunks, positions=True)
+        tokens = list(stream.iter_tokens())
+        assert self._offsets(tokens) == self.offsets
+        assert stream.line_column(tokens[13].start) == (4, 9)
+        stream = ChunkedCSSTokenizer(chunks, positions=True)
+        stream.tokenize_stream()
+        assert zip(stream.starts, stream.ends) == self.offsets
+        assert stream.tokens[1] is self.stream.tokens[1]
+
+    @staticmethod
+    def test_chunked_long_comment():
+        chunks = ['a/*', ' long ', 'comment ', '*/b\nc']
+        stream = ChunkedCSSTokenizer(chunks, positions=True)
+        tokens = list(stream.iter_tokens())
+        assert [(token.value, token.start) for token in tokens] == [
+            ('a', 0), ('b', 19), (' ', 20), ('c', 21)]
+        assert stream.line_column(tokens[-1].start) == (2, 1)
+
+
+class TestApplyEdit(object):
+
+    css = """#gbar,#guser {
+    font-size : 13px;
+    padding-top : 1px !important;
+}
+/* comment */
+a { color: red; }"""
+
+    @staticmethod
+    def _signature(stream):
+        assert len(stream.tokens) == len(stream.starts) == len(stream.ends)
+        return [(type(token), token.value, start, end) for token, start, end
+                in zip(stream.tokens, stream.starts, stream.ends)]
+
+    def _check(self, start, end, replacement):
+        stream = CSSTokenizer(self.css, positions=True)
+        stream.tokenize_stream()
+        edited = self.css[:start] + replacement + self.css[end:]
+        expected = CSSTokenizer(edited, positions=True)
+        expected.tokenize_stream()
+        result = stream.apply_edit(start, end, replacement)
+        assert self._signature(stream) == self._signature(expected)
+        return result
+
+    def test_replace_inside_token(self):
+        start = self.css.index('13px') + 1
+        first, removed, added = self._check(start, start + 1, '5')
+        assert removed == added
+        assert removed < 5
+
+    def test_insert_shifts_later_tokens(self):
+        start = self.css.index('red')
+        self._check(start, start + 3, 'blue')
+
+    def test_merge_with_previous_token(self):
+        start = self.css.index(' !important')
+        self._check(start, start + 1, '')
+
+    def test_open_comment(self):
+        start = self.css.index('padding')
+        first, removed, added = self._check(start, start, '/*')
+        assert first > 0
+        assert removed > added
+
+    def test_close_comment(self):
+        start = self.css.index('*/')
+        self._check(start, start + 2, '')
+
+    def test_append(self):
+        self._check(len(self.css), len(self.css), ' b{}')
+
+    def test_replace_everything(self):
+        self._check(0, len(self.css), 'x')
+
+    @staticmethod
+    def test_needs_positions():
+        stream = CSSTokenizer('a')
+        assert_raises(ValueError, stream.apply_edit, 0, 1, 'b')
+
+    @staticmethod
+    def test_range_checked():
+        stream = CSSTokenizer('a', positions=True)
+        assert_raises(IndexError, stream.apply_edit, 0, 2, 'b')
+
+
+class TestTokenizeParallel(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.css = read_page('google_homepage2.css')
+        stream = CSSTokenizer(cls.css, positions=True)
+        cls.expected = signature(stream.iter_tokens())
+
+    @staticmethod
+    def _signature(columns):
+        return signature(columns.token(index, True)
+                         for index in xrange(len(columns)))
+
+    def test_same_tokens_as_tokenize_columns(self):
+        columns = tokenize_parallel(self.css, processes=2, chunk_size=512)
+        assert isinstance(columns, TokenColumns)
+        assert self._signature(columns) == self.expected
+
+    def test_same_tokens_as_tokenize_stream(self):
+        stream = CSSTokenizer(self.css)
+        stream.tokenize_stream()
+        tokens = list(tokenize_parallel(self.css, processes=2,
+                                        chunk_size=512))
+        assert tokens == list(stream.tokens)
+        assert tokens[1] is stream.tokens[1]
+
+    def test_braces_in_strings_comments_and_urls(self):
+        css = 'a{b:"}";}/* } */c{d:url(}) e}f{g:url(x;})h}i"}\nj}k'
+        stream = CSSTokenizer(css, positions=True)
+        columns = tokenize_parallel(css, processes=2, chunk_size=1)
+        assert self._signature(columns) == signature(stream.iter_tokens())
+
+    @staticmethod
+    def test_small_input():
+        tokens = tokenize_parallel('a{}')
+        assert [token.value for token in tokens] == ['a', '{', '}']
+        assert len(tokenize_parallel('')) == 0
+
+
+class TestTokenizeMany(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.inputs = ['color: red', 'margin: 0 auto', '', 'width: 50%',
+                      'background: url(a.png)', '#a{b:c}'] * 10
+        cls.expected = []
+        for css in cls.inputs:
+            stream = CSSTokenizer(css, positions=True)
+            cls.expected.append(signature(stream.iter_tokens()))
+
+    def test_ordered(self):
+        results = tokenize_many(self.inputs, processes=2, chunk_size=7,
+                                positions=True)
+        assert [signature(tokens) for tokens in results] == self.expected
+
+    def test_as_completed(self):
+        results = tokenize_many(iter(self.inputs), processes=2, chunk_size=7,
+                                ordered=False, positions=True)
+        assert sorted((index, signature(tokens))
+                      for index, tokens in results) == \
+            list(enumerate(self.expected))
+
+    def test_in_process(self):
+        results = list(tokenize_many(self.inputs, processes=1))
+        assert len(results) == len(self.inputs)
+        assert [token.value for token in results[0]] == ['color', ':', ' ',
+                                                         'red']
+
+    def test_in_process_generators_in_turns(self):
+        with_positions = tokenize_many(self.inputs, processes=1,
+                                       positions=True)
+        without = tokenize_many(self.inputs, processes=1)
+        for expected, css in zip(self.expected, self.inputs):
+            assert signature(next(with_positions)) == expected
+            stream = CSSTokenizer(css)
+            stream.tokenize_stream()
+            assert list(next(without)) == list(stream.tokens)
+
+    @staticmethod
+    def test_shared_tokens_survive_the_pool():
+        tokens = next(tokenize_many(['a b'], processes=2))
+        stream = CSSTokenizer('a b')
+        stream.tokenize_stream()
+        assert tokens[1] is stream.tokens[1]
+
+
+class TestInternedNames(object):
+
+    @staticmethod
+    def _tokens(css, names=None):
+        stream = CSSTokenizer(css, names=names)
+        stream.tokenize_stream()
+        return stream.tokens
+
+    def test_repeated_names_are_shared(self):
+        tokens = self._tokens(u'.a\\62 c { x: 1q } .ab\\63 { x: 2q }')
+        idents = [token.value for token in tokens
+                  if isinstance(token, IdentToken)]
+        units = [token.unit for token in tokens
+                 if isinstance(token, DimensionToken)]
+        assert idents[0] == idents[2] == u'abc'
+        assert idents[0] is idents[2]
+        assert idents[1] is idents[3]
+        assert units[0] is units[1]
+
+    def test_vocabulary_is_shared_between_tokenizers(self):
+        first = self._tokens(u'a { color: red; margin: 1px }')
+        second = self._tokens(u'p{margin:2px;color:red}')
+        assert first[4].value is second[6].value
+        assert first[7].value is second[8].value
+        assert first[10].value is second[2].value
+        assert first[13].unit is second[4].unit
+
+    def test_shared_table(self):
+        names = {}
+        first = self._tokens(u'@custom-rule foo()', names)
+        second = self._tokens(u'@custom-rule{foo(', names)
+        assert first[0].value is second[0].value
+        assert first[2].value is second[2].value
+        assert names[u'foo'] is first[2].value
+
+    @staticmethod
+    def test_chunked_tokenizer():
+        names = {}
+        stream = ChunkedCSSTokenizer([u'foo { b', u'ar: 1em } fo', u'o {}'],
+                                     names=names)
+        stream.tokenize_stream()
+        idents = [token for token in stream.tokens
+                  if isinstance(token, IdentToken)]
+        assert idents[0].value is idents[2].value is names[u'foo']
+
+    def test_only_unusual_names_are_kept(self):
+        names = {}
+        self._tokens(u'#c1 { color: red } #c2 { foo: 1px }', names)
+        assert names == {u'foo': u'foo'}
+
+    def test_hash_names_in_vocabulary_are_shared(self):
+        first = self._tokens(u'#red')
+        second = self._tokens(u'a { color: red }')
+        assert first[0].value is second[7].value
+
+    @staticmethod
+    def test_reused_tokenizer_forgets_names():
+        tokens = list(tokenize_many([u'.foo{}', u'.bar{}'], processes=1))
+        assert tokens[0][1].value == u'foo'
+        tokenizer = CSSTokenizer(u'')
+        css_tokens._reuse_tokenizer(tokenizer, u'.foo{}')
+        css_tokens._reuse_tokenizer(tokenizer, u'.bar{}')
+        assert tokenizer.names == {u'bar': u'bar'}
+
+
+class TestChunkedTokenizer(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.css = read_page('google_homepage2.css')
+        stream = CSSTokenizer(cls.css)
+        stream.tokenize_stream()
+        cls.expected = [(type(token), token.value) for token in stream.tokens]
+
+    @staticmethod
+    def _tokens(source, chunk_size=65536):
+        return [(type(token), token.value) for token in
+                ChunkedCSSTokenizer(source, chunk_size).iter_tokens()]
+
+    def test_file_object(self):
+        assert self._tokens(io.BytesIO(self.css), 7) == self.expected
+
+    def test_mmap(self):
+        handle, path = tempfile.mkstemp()
+        try:
+            os.write(handle, self.css)
+            mapped = mmap.mmap(handle, 0, access=mmap.ACCESS_READ)
+            try:
+                assert self._tokens(mapped, 64) == self.expected
+            finally:
+                mapped.close()
+        finally:
+            os.close(handle)
+            os.remove(path)
+
+    def test_single_code_point_chunks(self):
+        chunks = [self.css[i:i + 1] for i in range(len(self.css))]
+        assert self._tokens(chunks) == self.expected
+
+    def test_tokenize_stream(self):
+        stream = ChunkedCSSTokenizer(io.BytesIO(self.css), 5)
+        stream.tokenize_stream()
+        assert not stream.stream
+        assert [(type(token), token.value)
+                for token in stream.tokens] == self.expected
+
+    @staticmethod
+    def test_split_carriage_return_line_feed():
+        tokens = list(ChunkedCSSTokenizer(['a\r', '\nb']).iter_tokens())
+        assert [token.value for token in tokens] == ['a', ' ', 'b']
+
+    @staticmethod
+    def test_split_utf8_sequence():
+        encoded = u'a\u00e9b'.encode('UTF-8')
+        tokens = list(ChunkedCSSTokenizer([encoded[:2], encoded[2:]])
+                      .iter_tokens())
+        assert len(tokens) == 1
+        assert tokens[0].value == u'a\u00e9b'
+
+    @staticmethod
+    def test_split_comment():
+        tokens = list(ChunkedCSSTokenizer(['a/* x *', '/b']).iter_tokens())
+        assert [token.value for token in tokens] == ['a', 'b']
+
+    @staticmethod
+    def test_comment_opening_is_not_its_close():
+        tokens = list(ChunkedCSSTokenizer(['a/*', '/b']).iter_tokens())
+        assert [token.value for token in tokens] == ['a']
+
+    @staticmethod
+    def test_split_string():
+        tokens = list(ChunkedCSSTokenizer(['"ab', 'cd"']).iter_tokens())
+        assert isinstance(tokens[0], StringToken)
+        assert tokens[0].value == 'abcd'
+
+    @staticmethod
+    def test_split_number():
+        tokens = list(ChunkedCSSTokenizer(['1.', '5e', '+3']).iter_tokens())
+        assert len(tokens) == 1
+        assert isinstance(tokens[0], NumberToken)
+        assert tokens[0].string == '1.5e+3'
+
+    @staticmethod
+    def test_token_spanning_many_chunks():
+        class Counting(ChunkedCSSTokenizer):
+            attempts = 0
+
+            def consume_url_token(self):
+                Counting.attempts += 1
+                return ChunkedCSSTokenizer.consume_url_token(self)
+
+        chunks = ['a url('] + ['x' * 16] * 4096 + [') b']
+        tokens = list(Counting(chunks).iter_tokens())
+        assert [len(token.value) for token in tokens] == [1, 1, 65536, 1, 1]
+        assert Counting.attempts < 20
+
+    @staticmethod
+    def test_apply_edit_unsupported():
+        stream = ChunkedCSSTokenizer(['a'], positions=True)
+        assert_raises(ValueError, stream.apply_edit, 0, 1, 'b')
@@ -1,9 +1,39 @@
 __author__ = 'Dan Obermiller'
 
-__all__ = ['parser']
+__all__ = ['log_to_file', 'parser']
 
+import logging
 import os
 
 
 parse_log_file = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), "parse_log_file.log")
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+
+def log_to_file(filename=parse_log_file, level=logging.INFO):
+    """Writes Quasar's diagnostics, such as parse errors, to a file.
+
+    Nothing is logged anywhere until this, or some other handler on the
+    `Quasar` logger, asks for it.
+
+    Parameters
+    ----------
+    filename : str
+        The file to append to.  It is only opened once something is logged.
+    level : int
+        The least severe level to log.
+
+    Returns
+    -------
+    logging.FileHandler
+        The handler, so it can be removed again with
+        `logging.getLogger('Quasar').removeHandler`.
+    """
+
+    handler = logging.FileHandler(filename, delay=True)
+    logger = logging.getLogger(__name__)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return handler
@@ -1 +1,3 @@
 __author__ = 'Dan'
+
+__all__ = ['css_selectors']
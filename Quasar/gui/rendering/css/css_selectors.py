@@ -0,0 +1,988 @@
+# -*- coding: utf-8 -*-
+# Implemented as per http://dev.w3.org/csswg/selectors-4/
+
+"""
+Selectors: parsing them from the prelude of a style rule, compiling them into
+match functions, and finding the rules that match an element.
+
+Compiled selectors match from right to left, as browsers do: the rightmost
+compound selector is tested against the element first, and only if it matches
+are the combinators followed to its ancestors or siblings.  `RuleIndex` puts
+each selector in a bucket keyed by the id, a class or the tag of its rightmost
+compound selector, so the selectors tried against an element are only those
+that could possibly match it.
+
+`RuleIndex.match_tree` goes further for a whole tree: it keeps an
+`AncestorFilter` of the ids, classes and tags above the current element, and
+skips the selectors that need an ancestor the filter says is not there,
+without walking up the tree at all.
+"""
+
+from array import array
+
+from Quasar.parser.ast.css_ast import Function, QualifiedRule, \
+    SimpleBlock, parse_component_value_list
+from Quasar.parser.tokens.css_tokens import DashMatchToken, DelimToken, \
+    HashToken, IdentToken, IncludeMatchToken, LiteralToken, \
+    PrefixMatchToken, StringToken, SubstringMatchToken, SuffixMatchToken, \
+    WhitespaceToken
+
+
+# Pseudo-elements that may be written with a single colon, as in CSS 2.
+_legacy_pseudo_elements = frozenset([u'before', u'after', u'first-line',
+                                     u'first-letter'])
+_combinators = frozenset([u'>', u'+', u'~'])
+# The ancestor filter has 2 ** _filter_bits counters.
+_filter_bits = 12
+_filter_mask = (1 << _filter_bits) - 1
+# Mixed into the hash of a name, so that an id, a class and a tag with the
+# same name set different counters.
+_id_salt = 0x5bd1e995
+_class_salt = 0x27d4eb2f
+# How expensive each attribute test is, so that the cheap ones go first.
+_attribute_costs = {None: 0, u'=': 1, u'^=': 2, u'$=': 2, u'|=': 3,
+                    u'~=': 4, u'*=': 5}
+_attribute_operators = {
+    DelimToken: u'=',
+    IncludeMatchToken: u'~=',
+    DashMatchToken: u'|=',
+    PrefixMatchToken: u'^=',
+    SuffixMatchToken: u'$=',
+    SubstringMatchToken: u'*=',
+}
+
+
+class Element(object):
+    """A document element, as far as selectors are concerned.
+
+    Selectors only use the attributes listed here, so anything else that has
+    them can be matched too.
+
+    Parameters
+    ----------
+    tag : unicode
+        The name of the element.  It is lowercased, as HTML tag names are not
+        case sensitive.
+    attributes : dict
+        The attributes of the element.
+    parent : Element
+        The element to append this one to, if any.
+
+    Attributes
+    ----------
+    tag : unicode
+        The lowercased name of the element.
+    attributes : dict
+        The attributes of the element.
+    id : unicode
+        The value of the `id` attribute, or None.
+    classes : frozenset
+        The whitespace-separated names in the `class` attribute.
+    parent : Element
+        The parent element, or None for the root.
+    children : list
+        The child elements, in document order.
+    index : int
+        The position of the element among its parent's children.
+
+    Notes
+    -----
+    The id, the classes and the words of other attributes are worked out from
+    the attributes once, so the attributes should not be changed afterwards.
+    """
+
+    __slots__ = ('tag', 'attributes', 'id', 'classes', 'parent', 'children',
+                 'index', '_words')
+
+    def __init__(self, tag, attributes=None, parent=None):
+        self.tag = tag.lower()
+        self.attributes = {} if attributes is None else dict(attributes)
+        self.id = self.attributes.get(u'id')
+        self.classes = frozenset(self.attributes.get(u'class', u'').split())
+        self.parent = None
+        self.children = []
+        self.index = 0
+        self._words = None
+        if parent is not None:
+            parent.append(self)
+
+    def append(self, child):
+        """Appends a child element.
+
+        Parameters
+        ----------
+        child : Element
+            The element to append.
+
+        Returns
+        -------
+        Element
+            The child.
+        """
+
+        child.parent = self
+        child.index = len(self.children)
+        self.children.append(child)
+        return child
+
+    def words(self, name):
+        """The whitespace-separated words of an attribute, as the `~=`
+        attribute selector sees them.  They are split once per element and
+        attribute, however many selectors test them.
+
+        Parameters
+        ----------
+        name : unicode
+            The name of the attribute.
+
+        Returns
+        -------
+        frozenset
+            The words; empty if the element does not have the attribute.
+        """
+
+        if name == u'class':
+            return self.classes
+        if self._words is None:
+            self._words = {}
+        words = self._words.get(name)
+        if words is None:
+            words = frozenset(self.attributes.get(name, u'').split())
+            self._words[name] = words
+        return words
+
+    def iter(self):
+        """Walks this element and its descendants in document order.
+
+        Yields
+        ------
+        Element
+        """
+
+        stack = [self]
+        while stack:
+            element = stack.pop()
+            yield element
+            stack.extend(reversed(element.children))
+
+    def __repr__(self):
+        return '<Element {}>'.format(self.tag.encode('utf-8'))
+
+
+class CompoundSelector(object):
+    """A sequence of simple selectors that all apply to the same element, such
+    as `a.external[href]:first-child`.
+
+    Attributes
+    ----------
+    tag : unicode
+        The lowercased type selector, or None for any element.
+    id : unicode
+        The id selector, or None.
+    classes : list of unicode
+        The class selectors.
+    attributes : list of tuple
+        The attribute selectors, as (name, operator, value); the operator and
+        value are None for a test of whether the attribute is present.
+    pseudo_classes : list
+        The pseudo-classes: the name of each, or for `:not()` a
+        ('not', CompoundSelector) pair.
+    """
+
+    __slots__ = ('tag', 'id', 'classes', 'attributes', 'pseudo_classes')
+
+    def __init__(self):
+        self.tag = None
+        self.id = None
+        self.classes = []
+        self.attributes = []
+        self.pseudo_classes = []
+
+    @property
+    def empty(self):
+        """Whether the compound has no simple selectors, not even `*`."""
+
+        return (self.tag is None and self.id is None and not self.classes and
+                not self.attributes and not self.pseudo_classes)
+
+    @property
+    def specificity(self):
+        """The (ids, classes, types) specificity of the compound."""
+
+        ids = 0 if self.id is None else 1
+        classes = len(self.classes) + len(self.attributes)
+        types = 0 if self.tag in (None, u'*') else 1
+        for pseudo_class in self.pseudo_classes:
+            if isinstance(pseudo_class, tuple):
+                inner = pseudo_class[1].specificity
+                ids += inner[0]
+                classes += inner[1]
+                types += inner[2]
+            else:
+                classes += 1
+        return ids, classes, types
+
+    def compile(self):
+        """Compiles the compound into a match function.
+
+        Returns
+        -------
+        callable
+            Takes an element and returns whether the compound matches it.
+        """
+
+        # The cheapest and most selective tests go first.
+        tests = []
+        if self.id is not None:
+            tests.append(_equals('id', self.id))
+        if len(self.classes) == 1:
+            tests.append(_has_class(self.classes[0]))
+        elif self.classes:
+            tests.append(_has_classes(frozenset(self.classes)))
+        if self.tag not in (None, u'*'):
+            tests.append(_equals('tag', self.tag))
+        for name, operator, value in sorted(
+                self.attributes,
+                key=lambda attribute: _attribute_costs[attribute[1]]):
+            tests.append(_compile_attribute(name, operator, value))
+        for pseudo_class in self.pseudo_classes:
+            if isinstance(pseudo_class, tuple):
+                tests.append(_negate(pseudo_class[1].compile()))
+            else:
+                tests.append(_pseudo_classes[pseudo_class])
+        if not tests:
+            return _match_any
+        if len(tests) == 1:
+            return tests[0]
+        tests = tuple(tests)
+
+        def match(element):
+            for test in tests:
+                if not test(element):
+                    return False
+            return True
+        return match
+
+
+class Selector(object):
+    """A complex selector, such as `ul > li.item a`, compiled for matching.
+
+    Parameters
+    ----------
+    parts : list of tuple
+        The compound selectors, left to right, each as a (combinator,
+        CompoundSelector) pair.  The combinator joins the compound to the one
+        before it: ' ' for a descendant, '>', '+' or '~'.  The first is None.
+    pseudo_element : unicode
+        The pseudo-element the selector ends with, such as 'before', or None.
+
+    Attributes
+    ----------
+    parts : list of tuple
+        The compound selectors and the combinators between them.
+    pseudo_element : unicode
+        The pseudo-element the selector ends with, or None.
+    specificity : tuple of int
+        The (ids, classes, types) specificity.
+    match : callable
+        Takes an element and returns whether the selector matches it.  For a
+        selector with a pseudo-element, whether the element is the one the
+        pseudo-element belongs to.
+    ancestor_hashes : tuple of int
+        The `AncestorFilter` counters for the ids, classes and tags that the
+        element's ancestors must have for the selector to match.
+    """
+
+    __slots__ = ('parts', 'pseudo_element', 'specificity', 'match',
+                 'ancestor_hashes')
+
+    def __init__(self, parts, pseudo_element=None):
+        self.parts = parts
+        self.pseudo_element = pseudo_element
+        ids = classes = types = 0
+        for _, compound in parts:
+            specificity = compound.specificity
+            ids += specificity[0]
+            classes += specificity[1]
+            types += specificity[2]
+        if pseudo_element is not None:
+            types += 1
+        self.specificity = ids, classes, types
+        match = parts[0][1].compile()
+        for combinator, compound in parts[1:]:
+            match = _combine[combinator](match, compound.compile())
+        self.match = match
+        # A compound followed by a descendant or child combinator matches an
+        # ancestor of the element; one followed by a sibling combinator
+        # matches a sibling, which need not be an ancestor.
+        hashes = set()
+        for position in xrange(len(parts) - 1):
+            if parts[position + 1][0] in (u' ', u'>'):
+                hashes.update(_compound_hashes(parts[position][1]))
+        self.ancestor_hashes = tuple(sorted(hashes))
+
+    @property
+    def key(self):
+        """The bucket of a `RuleIndex` the selector belongs in: ('id', name),
+        ('class', name), ('tag', name), ('attribute', name) or ('*', None),
+        from its rightmost compound selector.  `[id=...]` and `[class~=...]`
+        count as id and class selectors.
+        """
+
+        compound = self.parts[-1][1]
+        if compound.id is not None:
+            return 'id', compound.id
+        for name, operator, value in compound.attributes:
+            if name == u'id' and operator == u'=':
+                return 'id', value
+        if compound.classes:
+            return 'class', compound.classes[0]
+        for name, operator, value in compound.attributes:
+            if name == u'class' and operator == u'~=' and value and \
+                    len(value.split()) == 1:
+                return 'class', value
+        if compound.tag not in (None, u'*'):
+            return 'tag', compound.tag
+        if compound.attributes:
+            return 'attribute', compound.attributes[0][0]
+        return '*', None
+
+    def __repr__(self):
+        return '<Selector {} compounds {}>'.format(len(self.parts),
+                                                   self.specificity)
+
+
+def _filter_hashes(name, salt=0):
+    """The two `AncestorFilter` counters for a name."""
+
+    value = hash(name) ^ salt
+    return value & _filter_mask, (value >> _filter_bits) & _filter_mask
+
+
+def _compound_hashes(compound):
+    """The filter counters an element matching a compound selector sets."""
+
+    hashes = []
+    if compound.id is not None:
+        hashes.extend(_filter_hashes(compound.id, _id_salt))
+    for name in compound.classes:
+        hashes.extend(_filter_hashes(name, _class_salt))
+    if compound.tag not in (None, u'*'):
+        hashes.extend(_filter_hashes(compound.tag))
+    return hashes
+
+
+def _element_hashes(element):
+    """The filter counters an element sets."""
+
+    hashes = list(_filter_hashes(element.tag))
+    if element.id is not None:
+        hashes.extend(_filter_hashes(element.id, _id_salt))
+    for name in element.classes:
+        hashes.extend(_filter_hashes(name, _class_salt))
+    return hashes
+
+
+def _equals(attribute, value):
+    def test(element):
+        return getattr(element, attribute) == value
+    return test
+
+
+def _has_class(name):
+    def test(element):
+        return name in element.classes
+    return test
+
+
+def _has_classes(names):
+    def test(element):
+        return names <= element.classes
+    return test
+
+
+def _negate(match):
+    def test(element):
+        return not match(element)
+    return test
+
+
+def _match_any(element):
+    return True
+
+
+def _compile_attribute(name, operator, value):
+    """Compiles an attribute selector into a test.
+
+    Each operator becomes the cheapest check that gives the same answer: the
+    id and classes an element already has stand in for `[id=...]` and
+    `[class~=...]`, and `~=` looks the word up in the element's cached words
+    rather than splitting the attribute again.
+    """
+
+    if operator is None:
+        def test(element):
+            return name in element.attributes
+    elif operator == u'=':
+        if name == u'id':
+            return _equals('id', value)
+
+        def test(element):
+            return element.attributes.get(name) == value
+    elif operator == u'~=':
+        if not value or len(value.split()) != 1:
+            # A word with whitespace in it, or no word at all, never matches.
+            return _negate(_match_any)
+        if name == u'class':
+            return _has_class(value)
+
+        def test(element):
+            return value in element.words(name)
+    elif operator == u'|=':
+        prefix = value + u'-'
+
+        def test(element):
+            actual = element.attributes.get(name)
+            return actual is not None and (actual == value or
+                                           actual.startswith(prefix))
+    elif not value:
+        # An empty prefix, suffix or substring never matches.
+        return _negate(_match_any)
+    elif operator == u'^=':
+        def test(element):
+            return element.attributes.get(name, u'').startswith(value)
+    elif operator == u'$=':
+        def test(element):
+            return element.attributes.get(name, u'').endswith(value)
+    else:
+        def test(element):
+            return value in element.attributes.get(name, u'')
+    return test
+
+
+def _siblings_before(element):
+    parent = element.parent
+    if parent is None:
+        return []
+    return parent.children[:element.index]
+
+
+def _siblings_after(element):
+    parent = element.parent
+    if parent is None:
+        return []
+    return parent.children[element.index + 1:]
+
+
+_pseudo_classes = {
+    u'root': lambda element: element.parent is None,
+    u'empty': lambda element: not element.children,
+    u'first-child': lambda element: element.index == 0,
+    u'last-child': lambda element: not _siblings_after(element),
+    u'only-child': lambda element: (element.index == 0 and
+                                    not _siblings_after(element)),
+    u'first-of-type': lambda element: all(
+        sibling.tag != element.tag for sibling in _siblings_before(element)),
+    u'last-of-type': lambda element: all(
+        sibling.tag != element.tag for sibling in _siblings_after(element)),
+    u'only-of-type': lambda element: all(
+        sibling.tag != element.tag
+        for sibling in _siblings_before(element) + _siblings_after(element)),
+    u'link': lambda element: (element.tag in (u'a', u'area', u'link') and
+                              u'href' in element.attributes),
+    u'checked': lambda element: u'checked' in element.attributes,
+    u'disabled': lambda element: u'disabled' in element.attributes,
+}
+# Nothing is hovered, focused, visited or targeted in a document that is
+# only being styled.
+for _name in (u'visited', u'hover', u'active', u'focus', u'focus-within',
+              u'target'):
+    _pseudo_classes[_name] = _negate(_match_any)
+del _name
+
+
+def _descendant(left, right):
+    def match(element):
+        if not right(element):
+            return False
+        element = element.parent
+        while element is not None:
+            if left(element):
+                return True
+            element = element.parent
+        return False
+    return match
+
+
+def _child(left, right):
+    def match(element):
+        if not right(element):
+            return False
+        parent = element.parent
+        return parent is not None and left(parent)
+    return match
+
+
+def _next_sibling(left, right):
+    def match(element):
+        if not right(element) or not element.index:
+            return False
+        return left(element.parent.children[element.index - 1])
+    return match
+
+
+def _subsequent_sibling(left, right):
+    def match(element):
+        if not right(element):
+            return False
+        for sibling in _siblings_before(element):
+            if left(sibling):
+                return True
+        return False
+    return match
+
+
+_combine = {u' ': _descendant, u'>': _child, u'+': _next_sibling,
+            u'~': _subsequent_sibling}
+
+
+def _is_delim(value, code_point):
+    return value.__class__ is DelimToken and value.value == code_point
+
+
+def _is_literal(value, code_point):
+    return value.__class__ is LiteralToken and value.value == code_point
+
+
+def _parse_attribute(block):
+    """Parses the contents of an attribute selector's [] block."""
+
+    values = [value for value in block.value
+              if value.__class__ is not WhitespaceToken]
+    if not values or values[0].__class__ is not IdentToken:
+        raise ValueError('Expected an attribute name')
+    name = values[0].value
+    if len(values) == 1:
+        return name, None, None
+    operator = _attribute_operators.get(values[1].__class__)
+    if (len(values) != 3 or operator is None or
+            (operator == u'=' and values[1].value != u'=') or
+            values[2].__class__ not in (IdentToken, StringToken)):
+        raise ValueError('Invalid attribute selector')
+    return name, operator, values[2].value
+
+
+def _parse_compound(values, position, compound):
+    """Parses the simple selectors of a compound selector starting at
+    `position`, into `compound`.
+
+    Returns
+    -------
+    tuple
+        The position after the compound, and the pseudo-element it ended with
+        or None.
+    """
+
+    length = len(values)
+    while position < length:
+        value = values[position]
+        cls = value.__class__
+        if cls is IdentToken or _is_delim(value, u'*'):
+            if not compound.empty:
+                raise ValueError('A type selector must come first')
+            if cls is DelimToken and position + 1 < length and \
+                    _is_delim(values[position + 1], u'|'):
+                raise ValueError('Namespaces are not supported')
+            compound.tag = value.value.lower()
+        elif cls is HashToken:
+            if value.type_flag != 'id':
+                raise ValueError('Invalid id selector')
+            compound.id = value.value
+        elif _is_delim(value, u'.'):
+            position += 1
+            if position == length or values[position].__class__ \
+                    is not IdentToken:
+                raise ValueError('Expected a class name')
+            compound.classes.append(values[position].value)
+        elif cls is SimpleBlock and value.token.value == u'[':
+            compound.attributes.append(_parse_attribute(value))
+        elif _is_literal(value, u':'):
+            position += 1
+            element = position < length and _is_literal(values[position],
+                                                        u':')
+            if element:
+                position += 1
+            if position == length:
+                raise ValueError('Expected a pseudo-class or pseudo-element')
+            value = values[position]
+            if value.__class__ is IdentToken:
+                name = value.value.lower()
+                if element or name in _legacy_pseudo_elements:
+                    return position + 1, name
+                if name not in _pseudo_classes:
+                    raise ValueError('Unsupported pseudo-class :' + name)
+                compound.pseudo_classes.append(name)
+            elif value.__class__ is Function and \
+                    value.name.lower() == u'not' and not element:
+                inner = CompoundSelector()
+                arguments = [argument for argument in value.arguments
+                             if argument.__class__ is not WhitespaceToken]
+                end, pseudo_element = _parse_compound(arguments, 0, inner)
+                if inner.empty or end != len(arguments) or pseudo_element:
+                    raise ValueError('Invalid argument to :not()')
+                compound.pseudo_classes.append((u'not', inner))
+            else:
+                raise ValueError('Unsupported pseudo-class')
+        else:
+            return position, None
+        position += 1
+    return position, None
+
+
+def _parse_complex(values):
+    """Parses a complex selector from its component values."""
+
+    parts = []
+    combinator = None
+    position = 0
+    length = len(values)
+    while position < length:
+        value = values[position]
+        if value.__class__ is WhitespaceToken:
+            if parts and combinator is None:
+                combinator = u' '
+            position += 1
+            continue
+        if value.__class__ is DelimToken and value.value in _combinators:
+            if not parts or combinator not in (None, u' '):
+                raise ValueError('Misplaced combinator ' + value.value)
+            combinator = value.value
+            position += 1
+            continue
+        if parts and combinator is None:
+            raise ValueError('Unexpected {!r} in selector'.format(value))
+        compound = CompoundSelector()
+        position, pseudo_element = _parse_compound(values, position,
+                                                   compound)
+        if compound.empty and pseudo_element is None:
+            raise ValueError('Unexpected {!r} in selector'.format(value))
+        parts.append((combinator, compound))
+        combinator = None
+        if pseudo_element is not None:
+            if any(value.__class__ is not WhitespaceToken
+                   for value in values[position:]):
+                raise ValueError('A pseudo-element must come last')
+            return Selector(parts, pseudo_element)
+    if not parts or combinator not in (None, u' '):
+        raise ValueError('Incomplete selector')
+    return Selector(parts)
+
+
+def parse_selector_list(source):
+    """Parses a comma-separated list of selectors.
+
+    Parameters
+    ----------
+    source : str or list
+        The selectors, as CSS or as the component values of the prelude of a
+        style rule.
+
+    Returns
+    -------
+    list of Selector
+
+    Raises
+    ------
+    ValueError
+        If any of the selectors is invalid or unsupported; as in a browser, a
+        single bad selector invalidates the whole list.
+    """
+
+    if isinstance(source, basestring):
+        source = parse_component_value_list(source)
+    selectors = []
+    start = 0
+    for position, value in enumerate(source):
+        if _is_literal(value, u','):
+            selectors.append(_parse_complex(source[start:position]))
+            start = position + 1
+    selectors.append(_parse_complex(source[start:]))
+    return selectors
+
+
+class AncestorFilter(object):
+    """A counting Bloom filter of the ids, classes and tags of the ancestors
+    of an element.
+
+    During a depth-first walk, an element is pushed before its children are
+    visited and popped after, so the filter always holds exactly the
+    ancestors of the element being visited.  It can then tell that a
+    selector such as `.sidebar a` cannot match without walking up the tree:
+    if no ancestor has the class, one of its counters is zero.  It can be
+    wrong the other way, as two names may share counters, so a selector it
+    lets through must still be matched.
+
+    Attributes
+    ----------
+    counts : array
+        For each counter, how many of the ids, classes and tags pushed set it.
+    """
+
+    __slots__ = ('counts',)
+
+    def __init__(self):
+        self.counts = array('I', [0]) * (1 << _filter_bits)
+
+    def push(self, element):
+        """Adds an element, on the way down to its children.
+
+        Parameters
+        ----------
+        element : Element
+            The element.
+        """
+
+        counts = self.counts
+        for index in _element_hashes(element):
+            counts[index] += 1
+
+    def pop(self, element):
+        """Removes an element pushed earlier, on the way back up.
+
+        Parameters
+        ----------
+        element : Element
+            The element, which must not have changed since it was pushed.
+        """
+
+        counts = self.counts
+        for index in _element_hashes(element):
+            counts[index] -= 1
+
+    def might_match(self, selector):
+        """Whether the ancestors could satisfy a selector.
+
+        Parameters
+        ----------
+        selector : Selector
+            The selector.
+
+        Returns
+        -------
+        bool
+            False if the selector certainly needs an ancestor that is not
+            there.
+        """
+
+        counts = self.counts
+        for index in selector.ancestor_hashes:
+            if not counts[index]:
+                return False
+        return True
+
+
+class RuleIndex(object):
+    """Style rules, indexed by the rightmost compound selector of each of
+    their selectors.
+
+    An element is only tested against the selectors in the buckets for its
+    id, its classes, its tag and its attributes, and the universal bucket,
+    so the work per element depends on how many rules could match it rather
+    than on how many rules there are.
+
+    Attributes
+    ----------
+    ids, classes, tags : dict
+        Map a name to the entries whose rightmost compound selector has that
+        id, class (the first, if several) or tag.
+    attributes : dict
+        Maps an attribute name to the entries whose rightmost compound
+        selector has none of those, but tests that attribute (the first, if
+        several).  An element is only tested against the buckets for the
+        attributes it has.
+    universal : list
+        The entries whose rightmost compound selector has none of those.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.classes = {}
+        self.tags = {}
+        self.attributes = {}
+        self.universal = []
+        self._count = 0
+        self._buckets = {'id': self.ids, 'class': self.classes,
+                         'tag': self.tags, 'attribute': self.attributes}
+
+    @classmethod
+    def from_stylesheet(cls, stylesheet):
+        """Indexes the style rules of a stylesheet.  At-rules, and rules whose
+        selectors are invalid or unsupported, are skipped.
+
+        Parameters
+        ----------
+        stylesheet : Stylesheet
+            The parsed stylesheet.
+
+        Returns
+        -------
+        RuleIndex
+        """
+
+        index = cls()
+        for rule in stylesheet.rules:
+            if isinstance(rule, QualifiedRule):
+                index.add_rule(rule)
+        return index
+
+    def add_rule(self, rule):
+        """Indexes a style rule under each of its selectors.
+
+        Parameters
+        ----------
+        rule : QualifiedRule
+            The rule.
+
+        Returns
+        -------
+        bool
+            Whether the rule was indexed; it is not if its selectors are
+            invalid or unsupported.
+        """
+
+        try:
+            selectors = parse_selector_list(rule.prelude)
+        except ValueError:
+            return False
+        order = self._count
+        for selector in selectors:
+            self.add(selector, rule, order)
+        return True
+
+    def add(self, selector, rule, order=None):
+        """Indexes one selector.
+
+        Parameters
+        ----------
+        selector : Selector
+            The selector.
+        rule : object
+            What to hand back when the selector matches, usually the rule.
+        order : int
+            Where the rule comes in the stylesheet, to break ties in
+            specificity.  By default, after everything added so far.
+        """
+
+        if order is None:
+            order = self._count
+        entry = (selector.specificity, order, selector, rule)
+        self._count += 1
+        kind, name = selector.key
+        if kind == '*':
+            self.universal.append(entry)
+        else:
+            self._buckets[kind].setdefault(name, []).append(entry)
+
+    def candidates(self, element):
+        """The entries whose selectors could match an element.
+
+        Returns
+        -------
+        list of tuple
+            (specificity, order, selector, rule) entries.
+        """
+
+        candidates = list(self.universal)
+        if element.id is not None:
+            candidates.extend(self.ids.get(element.id, ()))
+        classes = self.classes
+        for name in element.classes:
+            candidates.extend(classes.get(name, ()))
+        candidates.extend(self.tags.get(element.tag, ()))
+        attributes = self.attributes
+        if attributes:
+            for name in element.attributes:
+                candidates.extend(attributes.get(name, ()))
+        return candidates
+
+    def match(self, element, pseudo_element=None, ancestors=None):
+        """Finds the rules that match an element.
+
+        Parameters
+        ----------
+        element : Element
+            The element.
+        pseudo_element : unicode
+            Find the rules for this pseudo-element of the element, such as
+            'before', rather than for the element itself.
+        ancestors : AncestorFilter
+            A filter holding exactly the ancestors of the element, to skip the
+            selectors that need an ancestor it does not have.
+
+        Returns
+        -------
+        list
+            The rules, in cascade order: by the specificity of the most
+            specific of their selectors that matches, then by the order they
+            were added.
+        """
+
+        best = {}
+        for entry in self.candidates(element):
+            selector = entry[2]
+            if selector.pseudo_element != pseudo_element:
+                continue
+            if ancestors is not None and selector.ancestor_hashes and \
+                    not ancestors.might_match(selector):
+                continue
+            if selector.match(element):
+                order = entry[1]
+                if order not in best or best[order][0] < entry[0]:
+                    best[order] = entry
+        return [entry[3] for entry in sorted(best.itervalues())]
+
+    def match_tree(self, root, pseudo_element=None):
+        """Finds the rules that match each element of a tree, keeping an
+        `AncestorFilter` up to date along the way.
+
+        Parameters
+        ----------
+        root : Element
+            The element to start from.  It need not be the root of the
+            document.
+        pseudo_element : unicode
+            Find the rules for this pseudo-element of each element rather
+            than for the element itself.
+
+        Yields
+        ------
+        tuple
+            (element, rules) for the root and each of its descendants, in
+            document order, with the rules as `match` returns them.  The tree
+            must not change during the walk.
+        """
+
+        ancestors = AncestorFilter()
+        parent = root.parent
+        while parent is not None:
+            ancestors.push(parent)
+            parent = parent.parent
+        # An element is on the stack twice: once to visit it, and once, with
+        # `leaving` set, to pop it from the filter after its descendants.
+        stack = [(root, False)]
+        while stack:
+            element, leaving = stack.pop()
+            if leaving:
+                ancestors.pop(element)
+                continue
+            yield element, self.match(element, pseudo_element, ancestors)
+            if element.children:
+                ancestors.push(element)
+                stack.append((element, True))
+                stack.extend((child, False)
+                             for child in reversed(element.children))
+
+    def __len__(self):
+        """How many selectors are indexed."""
+
+        return self._count
@@ -0,0 +1,947 @@
+# -*- coding: utf-8 -*-
+# Implemented as per http://dev.w3.org/csswg/css-syntax/#parsing
+
+"""
+5. Parsing
+
+The input to the parsing stage is a stream or list of tokens from the
+tokenization stage. The output depends on how the parser is invoked, as
+defined by the entry points listed later in this section. The parser output
+can consist of at-rules, qualified rules, and/or declarations.
+
+The parser's output is constructed according to the fundamental syntax of
+CSS, without regards for the validity of any specific item. Implementations
+may check the validity of items as they are returned by the various parser
+algorithms and treat the algorithm as returning nothing if the item was
+invalid according to the implementation's own grammar knowledge, or may
+construct a full tree as specified and "clean up" afterwards by removing any
+invalid items.
+
+The items that can appear in the tree are:
+
+    at-rule
+        An at-rule has a name, a prelude consisting of a list of component
+        values, and an optional block consisting of a simple {} block.
+
+    qualified rule
+        A qualified rule has a prelude consisting of a list of component
+        values, and a block consisting of a simple {} block.
+
+    declaration
+        A declaration has a name, a value consisting of a list of component
+        values, and an important flag which is initially unset.
+
+    component value
+        A component value is one of the preserved tokens, a function, or a
+        simple block.
+
+    preserved tokens
+        Any token produced by the tokenizer except for <function-token>s,
+        <{-token>s, <(-token>s, and <[-token>s.
+
+    function
+        A function has a name and a value consisting of a list of component
+        values.
+
+    simple block
+        A simple block has an associated token (either a <[-token>, <(-token>,
+        or <{-token>) and a value consisting of a list of component values.
+"""
+
+import functools
+
+from Quasar.parser.tokens.css_tokens import AtKeywordToken, CDCToken, \
+    CDOToken, CSSTokenizer, DelimToken, FunctionToken, IdentToken, \
+    LiteralToken, WhitespaceToken
+
+
+_mirrors = {u'{': u'}', u'[': u']', u'(': u')'}
+
+
+class Stylesheet(object):
+    """A parsed stylesheet.
+
+    Parameters
+    ----------
+    rules : list
+        The top-level `QualifiedRule`s and `AtRule`s, in order.
+    """
+
+    __slots__ = ('rules',)
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    def __repr__(self):
+        return '<Stylesheet {} rules>'.format(len(self.rules))
+
+
+class AtRule(object):
+    """An at-rule, such as `@media screen { ... }` or `@import "a.css";`.
+
+    Parameters
+    ----------
+    name : unicode
+        The name of the rule, without the @.
+    prelude : list
+        The component values between the name and the block.
+    block : SimpleBlock
+        The {} block, or None if the rule ended with a semicolon.
+
+    Attributes
+    ----------
+    rules
+    declarations
+    """
+
+    __slots__ = ('name', 'prelude', 'block', '_rules', '_declarations')
+
+    def __init__(self, name, prelude=None, block=None):
+        self.name = name
+        self.prelude = [] if prelude is None else prelude
+        self.block = block
+        self._rules = None
+        self._declarations = None
+
+    @property
+    def rules(self):
+        """The block parsed as a list of rules, as for `@media`.  Parsed the
+        first time it is asked for.
+        """
+
+        if self._rules is None:
+            if self.block is None:
+                self._rules = []
+            else:
+                self._rules = self.block._parser().consume_list_of_rules()
+        return self._rules
+
+    @property
+    def declarations(self):
+        """The block parsed as a list of declarations, as for `@font-face`.
+        Parsed the first time it is asked for.
+        """
+
+        if self._declarations is None:
+            if self.block is None:
+                self._declarations = []
+            else:
+                self._declarations = CSSParser(
+                    self.block._contents()).consume_list_of_declarations()
+        return self._declarations
+
+    def __repr__(self):
+        return '<AtRule @{} {!r}>'.format(self.name.encode('utf-8'),
+                                         self.prelude)
+
+
+class QualifiedRule(object):
+    """A qualified rule, such as a style rule `a > b { color: red }`.
+
+    Parameters
+    ----------
+    prelude : list
+        The component values before the block; for a style rule, the
+        selector.
+    block : SimpleBlock
+        The {} block.
+
+    Attributes
+    ----------
+    declarations
+    """
+
+    __slots__ = ('prelude', 'block', '_declarations')
+
+    def __init__(self, prelude, block):
+        self.prelude = prelude
+        self.block = block
+        self._declarations = None
+
+    @property
+    def declarations(self):
+        """The block parsed as a list of declarations (and any at-rules among
+        them).  Parsed the first time it is asked for.
+        """
+
+        if self._declarations is None:
+            self._declarations = CSSParser(
+                self.block._contents()).consume_list_of_declarations()
+        return self._declarations
+
+    def __repr__(self):
+        return '<QualifiedRule {!r}>'.format(self.prelude)
+
+
+class Declaration(object):
+    """A declaration, such as `color: red !important`.
+
+    Parameters
+    ----------
+    name : unicode
+        The name of the property.
+    value : list
+        The component values of the value, without the surrounding whitespace
+        or the `!important`.
+    important : bool
+        Whether the declaration was marked `!important`.
+    """
+
+    __slots__ = ('name', 'value', 'important')
+
+    def __init__(self, name, value, important=False):
+        self.name = name
+        self.value = value
+        self.important = important
+
+    def __repr__(self):
+        return '<Declaration {}: {!r}{}>'.format(
+            self.name.encode('utf-8'), self.value,
+            ' !important' if self.important else '')
+
+
+class Function(object):
+    """A function, such as `rgba(0, 0, 0, .5)`.
+
+    Parameters
+    ----------
+    name : unicode
+        The name of the function.
+    arguments : list
+        The component values between the parentheses.
+    """
+
+    __slots__ = ('name', 'arguments')
+
+    def __init__(self, name, arguments=None):
+        self.name = name
+        self.arguments = [] if arguments is None else arguments
+
+    def __repr__(self):
+        return '<Function {}({!r})>'.format(self.name.encode('utf-8'),
+                                            self.arguments)
+
+
+class SimpleBlock(object):
+    """A {}, [] or () block.
+
+    A block may be lazy: it is then only a range of the list of tokens the
+    stylesheet was parsed from, and the tokens are only parsed into component
+    values when `value` is first asked for.  Rules parse the declarations or
+    rules in their block straight from that range.
+
+    Parameters
+    ----------
+    token : LiteralToken
+        The token that opened the block.
+    value : list
+        The component values in the block.
+
+    Attributes
+    ----------
+    value
+    parsed
+    tokens
+    start, end : int
+        For a lazy block, the range of the tokens between the brackets in the
+        list of tokens the stylesheet was parsed from; None otherwise.
+    """
+
+    __slots__ = ('token', '_value', '_buffer', '_ends', 'start', 'end')
+
+    def __init__(self, token, value=None):
+        self.token = token
+        self._value = [] if value is None else value
+        self._buffer = self._ends = self.start = self.end = None
+
+    @classmethod
+    def _lazy(cls, token, buffer, ends, start, end):
+        """A block that is the range `start:end` of `buffer`, whose {} blocks
+        end where `ends` says.
+        """
+
+        block = cls.__new__(cls)
+        block.token = token
+        block._value = None
+        block._buffer = buffer
+        block._ends = ends
+        block.start = start
+        block.end = end
+        return block
+
+    @property
+    def value(self):
+        """The component values in the block."""
+
+        if self._value is None:
+            self._value = CSSParser(
+                self._contents()).consume_list_of_component_values()
+        return self._value
+
+    @property
+    def parsed(self):
+        """Whether the contents of the block have been parsed."""
+
+        return self._value is not None
+
+    @property
+    def tokens(self):
+        """The tokens in a lazy block, or None for a block that was parsed as
+        it was read.
+        """
+
+        if self._buffer is None:
+            return None
+        return self._buffer[self.start:self.end]
+
+    def _contents(self):
+        """The tokens in the block if it is lazy, else its component values."""
+
+        if self._buffer is None:
+            return self._value
+        return self._buffer[self.start:self.end]
+
+    def _parser(self):
+        """A parser over the contents of the block.  The blocks of the rules
+        in a lazy block are lazy as well.
+        """
+
+        if self._buffer is None:
+            return CSSParser(self._value)
+        return CSSParser._over_range(self._buffer, self._ends, self.start,
+                                     self.end)
+
+    def __repr__(self):
+        if self._value is None:
+            return '<SimpleBlock {}...{} unparsed>'.format(
+                self.token, _mirrors[self.token.value])
+        return '<SimpleBlock {}{!r}{}>'.format(
+            self.token, self._value, _mirrors[self.token.value])
+
+
+def _match_blocks(tokens):
+    """Finds where every {} block in a list of tokens ends, in one pass.
+
+    Blocks and functions nest as they do when they are consumed as component
+    values: a closing bracket only ends the innermost open block if it is the
+    one that block is waiting for, and is otherwise an ordinary token.
+
+    Parameters
+    ----------
+    tokens : list
+        The tokens.
+
+    Returns
+    -------
+    dict
+        Maps the index of every <{-token> to the index of the <}-token> that
+        closes it, or to the length of the list if nothing does.
+    """
+
+    ends = {}
+    expected = []   # (closing code point, index of the opening token)
+    closing = None
+    for index, token in enumerate(tokens):
+        cls = token.__class__
+        if cls is LiteralToken:
+            value = token.value
+            if value == closing:
+                if value == u'}':
+                    ends[expected[-1][1]] = index
+                expected.pop()
+                closing = expected[-1][0] if expected else None
+            elif value in _mirrors:
+                closing = _mirrors[value]
+                expected.append((closing, index))
+        elif cls is FunctionToken:
+            closing = u')'
+            expected.append((closing, index))
+    length = len(tokens)
+    for closing, index in expected:
+        if closing == u'}':
+            ends[index] = length
+    return ends
+
+
+class CSSParser(object):
+    """Parses a stream of tokens as per the W3C specifications[1]_.
+
+    Tokens are pulled from the stream only as they are needed, so a parser
+    fed by `CSSTokenizer.iter_tokens` works on the tokenizer's output as it is
+    produced, and `iter_rules` hands out each rule as soon as it is complete.
+
+    Parse errors are recovered from as the specification describes, by
+    dropping whatever could not be parsed.
+
+    .. [1] http://dev.w3.org/csswg/css-syntax/#parsing
+
+    Parameters
+    ----------
+    tokens : iterable
+        The tokens to parse.  Component values that have already been parsed
+        (`SimpleBlock`s and `Function`s) may appear among them.
+    lazy : bool
+        Whether the {} blocks of rules are left unparsed until they are used.
+        Most of the cost of parsing a stylesheet is in the declarations, so
+        this makes reading only the selectors or at-rules much cheaper.  A
+        lazy parser reads all the tokens into a list first and finds where
+        every {} block ends in one pass over it; a block is then a range of
+        that list, and parsing skips straight past it.
+
+    Attributes
+    ----------
+    lazy : bool
+        Whether the {} blocks of rules are left unparsed until they are used.
+    """
+
+    def __init__(self, tokens, lazy=False):
+        self.lazy = lazy
+        if lazy:
+            buffer = tokens if isinstance(tokens, list) else list(tokens)
+            self._set_range(buffer, _match_blocks(buffer), 0, len(buffer))
+        else:
+            self._next = functools.partial(next, iter(tokens), None)
+
+    @classmethod
+    def _over_range(cls, buffer, ends, start, end):
+        """A lazy parser over the range `start:end` of a list of tokens whose
+        {} blocks have already been matched.
+        """
+
+        parser = cls.__new__(cls)
+        parser.lazy = True
+        parser._set_range(buffer, ends, start, end)
+        return parser
+
+    def _set_range(self, buffer, ends, start, end):
+        self._buffer = buffer
+        self._ends = ends
+        self._pos = start
+        self._end = end
+
+    def _next(self):
+        """Consumes the next token of a lazy parser, which reads from a range
+        of a list.  Other parsers replace this with the iterator they read
+        from.
+
+        Returns
+        -------
+        CSSToken
+            The token, or None at the end of the range.
+        """
+
+        pos = self._pos
+        if pos < self._end:
+            self._pos = pos + 1
+            return self._buffer[pos]
+        return None
+
+    def iter_rules(self, top_level=False):
+        """Consumes a list of rules, handing out each one as it is parsed.
+
+        Parameters
+        ----------
+        top_level : bool
+            Whether this is the top level of a stylesheet, where <CDO-token>s
+            and <CDC-token>s are ignored.
+
+        Yields
+        ------
+        QualifiedRule, AtRule
+        """
+
+        next_token = self._next
+        while True:
+            token = next_token()
+            if token is None:
+                return
+            cls = token.__class__
+            if cls is WhitespaceToken:
+                continue
+            if top_level and (cls is CDOToken or cls is CDCToken):
+                continue
+            if cls is AtKeywordToken:
+                yield self.consume_at_rule(token)
+            else:
+                rule = self.consume_qualified_rule(token)
+                if rule is not None:
+                    yield rule
+
+    def consume_list_of_rules(self, top_level=False):
+        """Consumes a list of rules.
+
+        Parameters
+        ----------
+        top_level : bool
+            Whether this is the top level of a stylesheet.
+
+        Returns
+        -------
+        list
+        """
+
+        return list(self.iter_rules(top_level))
+
+    def consume_at_rule(self, at_keyword):
+        """Consumes an at-rule.
+
+        Parameters
+        ----------
+        at_keyword : AtKeywordToken
+            The token that starts the rule, already consumed.
+
+        Returns
+        -------
+        AtRule
+        """
+
+        rule = AtRule(at_keyword.value)
+        prelude = rule.prelude
+        next_token = self._next
+        while True:
+            token = next_token()
+            if token is None:   # Parse error
+                return rule
+            cls = token.__class__
+            if cls is LiteralToken:
+                if token.value == u';':
+                    return rule
+                if token.value == u'{':
+                    rule.block = self._consume_body(token)
+                    return rule
+            elif cls is SimpleBlock and token.token.value == u'{':
+                rule.block = token
+                return rule
+            prelude.append(self.consume_component_value(token))
+
+    def consume_qualified_rule(self, token):
+        """Consumes a qualified rule.
+
+        Parameters
+        ----------
+        token : CSSToken
+            The first token of the rule, already consumed.
+
+        Returns
+        -------
+        QualifiedRule
+            The rule, or None if the input ended before its block.
+        """
+
+        prelude = []
+        next_token = self._next
+        while token is not None:
+            cls = token.__class__
+            if cls is LiteralToken and token.value == u'{':
+                return QualifiedRule(prelude, self._consume_body(token))
+            if cls is SimpleBlock and token.token.value == u'{':
+                return QualifiedRule(prelude, token)
+            prelude.append(self.consume_component_value(token))
+            token = next_token()
+        return None   # Parse error
+
+    def iter_declarations(self):
+        """Consumes a list of declarations, handing out each one as it is
+        parsed.
+
+        Yields
+        ------
+        Declaration, AtRule
+        """
+
+        next_token = self._next
+        consume = self.consume_component_value
+        token = next_token()
+        while token is not None:
+            cls = token.__class__
+            if cls is WhitespaceToken or (cls is LiteralToken and
+                                          token.value == u';'):
+                token = next_token()
+                continue
+            if cls is AtKeywordToken:
+                yield self.consume_at_rule(token)
+                token = next_token()
+                continue
+            # Anything but an identifier is a parse error; it is consumed in
+            # the same way, up to the next semicolon, and thrown away.
+            is_declaration = cls is IdentToken
+            values = []
+            while token is not None and not (token.__class__ is LiteralToken
+                                             and token.value == u';'):
+                value = consume(token)
+                if is_declaration:
+                    values.append(value)
+                token = next_token()
+            if is_declaration:
+                declaration = self.consume_declaration(values)
+                if declaration is not None:
+                    yield declaration
+
+    def consume_list_of_declarations(self):
+        """Consumes a list of declarations.
+
+        Returns
+        -------
+        list
+        """
+
+        return list(self.iter_declarations())
+
+    @staticmethod
+    def consume_declaration(values):
+        """Consumes a declaration from the component values of one.
+
+        Parameters
+        ----------
+        values : list
+            The component values, starting with the <ident-token> naming the
+            property.
+
+        Returns
+        -------
+        Declaration
+            The declaration, or None if there is no colon after the name.
+        """
+
+        length = len(values)
+        index = 1
+        while index < length and values[index].__class__ is WhitespaceToken:
+            index += 1
+        if index == length or not (values[index].__class__ is LiteralToken and
+                                   values[index].value == u':'):
+            return None   # Parse error
+        start = index + 1
+        end = length
+        while start < end and values[start].__class__ is WhitespaceToken:
+            start += 1
+        while end > start and values[end - 1].__class__ is WhitespaceToken:
+            end -= 1
+        important = False
+        last = values[end - 1] if end > start else None
+        if (last.__class__ is IdentToken and
+                last.value.lower() == u'important'):
+            bang = end - 2
+            while bang >= start and values[bang].__class__ is WhitespaceToken:
+                bang -= 1
+            if (bang >= start and values[bang].__class__ is DelimToken and
+                    values[bang].value == u'!'):
+                important = True
+                end = bang
+                while end > start and \
+                        values[end - 1].__class__ is WhitespaceToken:
+                    end -= 1
+        return Declaration(values[0].value, values[start:end], important)
+
+    def consume_component_value(self, token):
+        """Consumes a component value.
+
+        Parameters
+        ----------
+        token : CSSToken
+            The first token of the value, already consumed.
+
+        Returns
+        -------
+        CSSToken, SimpleBlock, Function
+        """
+
+        cls = token.__class__
+        if cls is LiteralToken:
+            if token.value in _mirrors:
+                return self.consume_simple_block(token)
+        elif cls is FunctionToken:
+            return self.consume_function(token)
+        return token
+
+    def consume_list_of_component_values(self):
+        """Consumes component values until the input runs out.
+
+        Returns
+        -------
+        list
+        """
+
+        values = []
+        next_token = self._next
+        consume = self.consume_component_value
+        token = next_token()
+        while token is not None:
+            values.append(consume(token))
+            token = next_token()
+        return values
+
+    def consume_simple_block(self, opening):
+        """Consumes a simple block.
+
+        Parameters
+        ----------
+        opening : LiteralToken
+            The token that opens the block, already consumed.
+
+        Returns
+        -------
+        SimpleBlock
+        """
+
+        ending = _mirrors[opening.value]
+        value = []
+        next_token = self._next
+        consume = self.consume_component_value
+        token = next_token()
+        while token is not None and not (token.__class__ is LiteralToken and
+                                         token.value == ending):
+            value.append(consume(token))
+            token = next_token()
+        return SimpleBlock(opening, value)
+
+    def consume_function(self, function_token):
+        """Consumes a function.
+
+        Parameters
+        ----------
+        function_token : FunctionToken
+            The token that names the function, already consumed.
+
+        Returns
+        -------
+        Function
+        """
+
+        function = Function(function_token.value)
+        arguments = function.arguments
+        next_token = self._next
+        consume = self.consume_component_value
+        token = next_token()
+        while token is not None and not (token.__class__ is LiteralToken and
+                                         token.value == u')'):
+            arguments.append(consume(token))
+            token = next_token()
+        return function
+
+    def _consume_body(self, opening):
+        """Consumes the {} block of a rule.  A lazy parser skips straight to
+        the end of the block, and leaves its tokens unparsed.
+        """
+
+        if not self.lazy:
+            return self.consume_simple_block(opening)
+        start = self._pos
+        end = min(self._ends[start - 1], self._end)
+        self._pos = end + 1
+        return SimpleBlock._lazy(opening, self._buffer, self._ends, start, end)
+
+    def _skip_whitespace(self):
+        """Consumes whitespace, and returns the first token after it (or None
+        at the end of the input).
+        """
+
+        token = self._next()
+        while token is not None and token.__class__ is WhitespaceToken:
+            token = self._next()
+        return token
+
+
+def _token_stream(source, lazy=False):
+    """The tokens of a string, of the remaining input of a tokenizer, or of an
+    iterable of tokens.  A lazy parser needs them all up front, so a string is
+    tokenized in one go for it rather than on demand.
+    """
+
+    if isinstance(source, basestring):
+        tokenizer = CSSTokenizer(source)
+        if lazy:
+            tokenizer.tokenize_stream()
+            return list(tokenizer.tokens)
+        return tokenizer.iter_tokens()
+    if isinstance(source, CSSTokenizer):
+        return source.iter_tokens()
+    return source
+
+
+def iter_stylesheet(source, lazy=False):
+    """Parses a stylesheet, handing out each top-level rule as soon as it has
+    been parsed.
+
+    Parameters
+    ----------
+    source : str, CSSTokenizer or iterable
+        The CSS, a tokenizer to take the tokens from as they are produced, or
+        the tokens themselves.
+    lazy : bool
+        Whether to leave the blocks of rules unparsed until they are used.
+
+    Yields
+    ------
+    QualifiedRule, AtRule
+    """
+
+    return CSSParser(_token_stream(source, lazy),
+                     lazy).iter_rules(top_level=True)
+
+
+def parse_stylesheet(source, lazy=False):
+    """Parses a stylesheet.
+
+    Parameters
+    ----------
+    source : str, CSSTokenizer or iterable
+        The CSS, a tokenizer, or tokens.
+    lazy : bool
+        Whether to leave the blocks of rules unparsed until they are used.
+
+    Returns
+    -------
+    Stylesheet
+    """
+
+    return Stylesheet(list(iter_stylesheet(source, lazy)))
+
+
+def parse_rule_list(source, lazy=False):
+    """Parses a list of rules, such as the contents of an `@media` block.
+
+    Parameters
+    ----------
+    source : str, CSSTokenizer or iterable
+        The CSS, a tokenizer, or tokens.
+    lazy : bool
+        Whether to leave the blocks of rules unparsed until they are used.
+
+    Returns
+    -------
+    list
+    """
+
+    return CSSParser(_token_stream(source, lazy),
+                     lazy).consume_list_of_rules()
+
+
+def parse_rule(source, lazy=False):
+    """Parses a single rule.
+
+    Parameters
+    ----------
+    source : str, CSSTokenizer or iterable
+        The CSS, a tokenizer, or tokens.
+    lazy : bool
+        Whether to leave the block of the rule unparsed until it is used.
+
+    Returns
+    -------
+    QualifiedRule, AtRule
+
+    Raises
+    ------
+    ValueError
+        If the input is not exactly one rule.
+    """
+
+    parser = CSSParser(_token_stream(source, lazy), lazy)
+    token = parser._skip_whitespace()
+    if token is None:
+        raise ValueError('Expected a rule, found the end of the input')
+    if token.__class__ is AtKeywordToken:
+        rule = parser.consume_at_rule(token)
+    else:
+        rule = parser.consume_qualified_rule(token)
+        if rule is None:
+            raise ValueError('The input ended before the block of the rule')
+    if parser._skip_whitespace() is not None:
+        raise ValueError('Expected the end of the input after the rule')
+    return rule
+
+
+def parse_declaration(source):
+    """Parses a single declaration, such as `color: red`.
+
+    Parameters
+    ----------
+    source : str, CSSTokenizer or iterable
+        The CSS, a tokenizer, or tokens.
+
+    Returns
+    -------
+    Declaration
+
+    Raises
+    ------
+    ValueError
+        If the input is not a declaration.
+    """
+
+    parser = CSSParser(_token_stream(source))
+    token = parser._skip_whitespace()
+    if token is None or token.__class__ is not IdentToken:
+        raise ValueError('Expected the name of a property')
+    declaration = parser.consume_declaration(
+        [token] + parser.consume_list_of_component_values())
+    if declaration is None:
+        raise ValueError('Expected a colon after the name of the property')
+    return declaration
+
+
+def parse_declaration_list(source, lazy=False):
+    """Parses a list of declarations, such as the contents of a `style`
+    attribute.
+
+    Parameters
+    ----------
+    source : str, CSSTokenizer or iterable
+        The CSS, a tokenizer, or tokens.
+    lazy : bool
+        Whether to leave the blocks of any at-rules unparsed until they are
+        used.
+
+    Returns
+    -------
+    list
+    """
+
+    return CSSParser(_token_stream(source, lazy),
+                     lazy).consume_list_of_declarations()
+
+
+def parse_component_value(source):
+    """Parses a single component value.
+
+    Parameters
+    ----------
+    source : str, CSSTokenizer or iterable
+        The CSS, a tokenizer, or tokens.
+
+    Returns
+    -------
+    CSSToken, SimpleBlock, Function
+
+    Raises
+    ------
+    ValueError
+        If the input is not exactly one component value.
+    """
+
+    parser = CSSParser(_token_stream(source))
+    token = parser._skip_whitespace()
+    if token is None:
+        raise ValueError('Expected a component value, found the end of the '
+                         'input')
+    value = parser.consume_component_value(token)
+    if parser._skip_whitespace() is not None:
+        raise ValueError('Expected the end of the input after the component '
+                         'value')
+    return value
+
+
+def parse_component_value_list(source):
+    """Parses a list of component values.
+
+    Parameters
+    ----------
+    source : str, CSSTokenizer or iterable
+        The CSS, a tokenizer, or tokens.
+
+    Returns
+    -------
+    list
+    """
+
+    return CSSParser(_token_stream(source)).consume_list_of_component_values()
@@ -1 +1,2 @@
-__all__ = ['css_tokens', 'html_tokens', 'javascript_tokens']
+__all__ = ['css_cache', 'css_profile', 'css_serialization', 'css_tokens',
+           'html_tokens', 'javascript_tokens']
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+A cache in front of `CSSTokenizer` for stylesheets that are tokenized over and
+over, such as shared libraries and vendor bundles.
+
+Entries are keyed by a hash of the raw input bytes, so a hit skips both
+preprocessing and tokenization.  Recently used token streams are kept in
+memory up to a byte budget, and may also be written to a directory so that
+they outlive the process.
+"""
+
+from collections import OrderedDict, deque
+import errno
+import hashlib
+from operator import attrgetter
+import os
+import struct
+import sys
+import tempfile
+
+from Quasar.parser.tokens import css_serialization
+from Quasar.parser.tokens.css_tokens import CSSTokenizer
+
+
+_values = attrgetter('value')
+
+
+def _token_bytes(tokens):
+    """Estimates the memory held by a token stream.
+
+    Shared token instances are counted once.  Attributes other than `value`
+    are not counted, so this is a slight underestimate.
+    """
+
+    unique = set(tokens)
+    return (sys.getsizeof(tokens) + sum(map(sys.getsizeof, unique)) +
+            sum(map(sys.getsizeof, map(_values, unique))))
+
+
+class TokenCache(object):
+    """A least recently used cache of token streams.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Roughly how much memory the cached token streams may take up.  The
+        least recently used streams are dropped to stay under it.
+    directory : str
+        A directory to also store token streams in, or None to only keep them
+        in memory.  It is created if it does not exist.
+    positions : bool
+        Whether to record the `start` and `end` offset of every token.
+
+    Attributes
+    ----------
+    hits : int
+        How many token streams were found in memory or on disk.
+    misses : int
+        How many token streams had to be tokenized.
+    size : int
+        Roughly how much memory the cached token streams take up.
+
+    Notes
+    -----
+    Every hit hands out a new deque, but the token objects in it are shared
+    with the cache and any other hit, so they should not be modified.
+    """
+
+    # Bumped whenever the stored token streams change shape.
+    version = 2
+
+    def __init__(self, max_bytes=64 << 20, directory=None, positions=False):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.positions = positions
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        if directory is not None:
+            try:
+                os.makedirs(directory)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+
+    def key(self, input_string):
+        """The key of a stylesheet: a hash of its raw bytes.
+
+        Parameters
+        ----------
+        input_string : str or unicode
+            The CSS.  Unicode is hashed as UTF-8, so it shares its key with the
+            same stylesheet as bytes.
+
+        Returns
+        -------
+        str
+            The hexadecimal digest.
+        """
+
+        if isinstance(input_string, unicode):
+            input_string = input_string.encode('UTF-8')
+        return hashlib.sha1(input_string).hexdigest()
+
+    def tokenize(self, input_string):
+        """Tokenizes a stylesheet, or looks up its tokens if it has been seen
+        before.
+
+        Parameters
+        ----------
+        input_string : str or unicode
+            The CSS to tokenize.
+
+        Returns
+        -------
+        collections.deque
+            The tokens `CSSTokenizer(input_string).tokenize_stream()` would
+            collect in `tokens`.
+        """
+
+        key = self.key(input_string)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            entry = self._load(key)
+            if entry is None:
+                self.misses += 1
+                tokenizer = CSSTokenizer(input_string, self.positions)
+                if self.positions:
+                    tokens = deque(tokenizer.iter_tokens())
+                else:
+                    tokenizer.tokenize_stream()
+                    tokens = tokenizer.tokens
+                entry = tokens, _token_bytes(tokens)
+                self._store(key, entry[0])
+            else:
+                self.hits += 1
+            self.size += entry[1]
+        else:
+            self.hits += 1
+        self._entries[key] = entry
+        while self.size > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.size -= size
+        return deque(entry[0])
+
+    def __contains__(self, input_string):
+        return self.key(input_string) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Drops every token stream held in memory.  The directory, if any,
+        is left alone.
+        """
+
+        self._entries.clear()
+        self.size = 0
+
+    def _path(self, key):
+        suffix = '.positions' if self.positions else ''
+        return os.path.join(self.directory, '{}.v{}{}.tokens'.format(
+            key, self.version, suffix))
+
+    def _load(self, key):
+        """Reads a token stream from the directory.
+
+        Returns
+        -------
+        tuple or None
+            The tokens and their size, or None if they are not stored or
+            cannot be read.
+        """
+
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), 'rb') as stored:
+                tokens = deque(css_serialization.loads(stored.read()))
+        except (IOError, ValueError, IndexError, struct.error):
+            return None
+        return tokens, _token_bytes(tokens)
+
+    def _store(self, key, tokens):
+        """Writes a token stream to the directory, atomically.
+
+        If it cannot be written the write is skipped, just as `_load` treats
+        a stream it cannot read as a miss.
+        """
+
+        if self.directory is None:
+            return
+        try:
+            handle, temporary = tempfile.mkstemp(dir=self.directory)
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(handle, 'wb') as stored:
+                css_serialization.dump(tokens, stored)
+            os.rename(temporary, self._path(key))
+        except (IOError, OSError):
+            pass
+        finally:
+            if os.path.exists(temporary):
+                try:
+                    os.remove(temporary)
+                except OSError:
+                    pass
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+A compact, versioned binary format for token streams, and a reader that
+decodes them lazily, straight out of a memory map.
+
+Layout (all integers little-endian):
+
+    header      magic, version, flags, counts and the offset of each section
+    types       one byte per token, an index into `TokenColumns.kinds`
+    records     varints per token: the gap since the end of the previous token
+                and the length of the token (only if positions are stored),
+                the index of its string (unless it is a valueless token), and
+                the index of its unit (only for dimensions)
+    numbers     one packed double per number, percentage and dimension token
+    blocks      for every `block_size` tokens: where their records start, where
+                the token before them ended and how many numbers came before
+    strings     the offset of every string in the string data, then one more
+    string data the UTF-8 encoded strings, one after another
+
+Reading token `i` seeks to its block and decodes at most `block_size` records.
+"""
+
+from array import array
+import mmap
+import struct
+import sys
+
+from Quasar.parser.tokens.css_tokens import TokenColumns, CSSTokenizer, \
+    DimensionToken, HashToken, LiteralToken, NumberToken, PercentageToken, \
+    _is_integer, _shared_tokens
+
+
+magic = b'QCST'
+version = 1
+_header = struct.Struct('<4sHHIIII6I')
+_block = struct.Struct('<III')
+_double = struct.Struct('<d')
+_positions_flag = 1
+block_size = 64
+
+_valueless_codes = frozenset(code for code, (cls, _) in
+                             enumerate(TokenColumns.kinds)
+                             if cls in _shared_tokens)
+_numeric_codes = frozenset(code for code, (cls, _) in
+                           enumerate(TokenColumns.kinds)
+                           if issubclass(cls, NumberToken))
+_dimension_codes = frozenset(code for code, (cls, _) in
+                             enumerate(TokenColumns.kinds)
+                             if cls is DimensionToken)
+
+
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, position):
+    """Reads the varint at `position` of a bytearray.
+
+    Returns
+    -------
+    tuple of int
+        The value and the position just after it.
+    """
+
+    byte = data[position]
+    if byte < 0x80:
+        return byte, position + 1
+    value = byte & 0x7F
+    shift = 7
+    while True:
+        position += 1
+        byte = data[position]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position + 1
+        shift += 7
+
+
+def _columns(tokens):
+    """Encodes a token stream as columns, noting whether every token has a
+    position.
+    """
+
+    if isinstance(tokens, TokenColumns):
+        return tokens, True
+    columns = TokenColumns(None)
+    append = columns._appender()
+    positions = True
+    for token in tokens:
+        start = getattr(token, 'start', None)
+        if start is None:
+            positions = False
+            append(token, 0, 0)
+        else:
+            append(token, start, token.end)
+    return columns, positions
+
+
+def dumps(tokens):
+    """Serializes a token stream.
+
+    Parameters
+    ----------
+    tokens : iterable of CSSToken or TokenColumns
+        The tokens to serialize.  Offsets are stored if every token has them,
+        which is always the case for `TokenColumns`.
+
+    Returns
+    -------
+    str
+        The serialized tokens.
+    """
+
+    columns, positions = _columns(tokens)
+    types = columns.types
+    starts, ends = columns.starts, columns.ends
+    strings, units = columns.strings, columns.units
+    records = bytearray()
+    blocks = array('I')
+    previous_end = 0
+    numbers = 0
+    for index, code in enumerate(types):
+        if not index % block_size:
+            blocks.extend((len(records), previous_end, numbers))
+        if positions:
+            _write_varint(records, starts[index] - previous_end)
+            _write_varint(records, ends[index] - starts[index])
+            previous_end = ends[index]
+        if code not in _valueless_codes:
+            _write_varint(records, strings[index])
+        if code in _dimension_codes:
+            _write_varint(records, units[index])
+        if code in _numeric_codes:
+            numbers += 1
+    values = array('d', (columns.numbers[index]
+                         for index, code in enumerate(types)
+                         if code in _numeric_codes))
+
+    encoded = [string.encode('UTF-8') for string in columns.string_table]
+    string_offsets = array('I', [0])
+    for string in encoded:
+        string_offsets.append(string_offsets[-1] + len(string))
+
+    if sys.byteorder != 'little':
+        for column in (blocks, values, string_offsets):
+            column.byteswap()
+    sections = [types.tostring(), bytes(records), values.tostring(),
+                blocks.tostring(), string_offsets.tostring(),
+                b''.join(encoded)]
+    offsets = []
+    position = _header.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+    header = _header.pack(magic, version,
+                          _positions_flag if positions else 0, len(types),
+                          len(encoded), numbers, block_size, *offsets)
+    return header + b''.join(sections)
+
+
+def dump(tokens, stored):
+    """Serializes a token stream to a file.
+
+    Parameters
+    ----------
+    tokens : iterable of CSSToken or TokenColumns
+        The tokens to serialize.
+    stored : file
+        A file opened for writing in binary mode.
+    """
+
+    stored.write(dumps(tokens))
+
+
+def loads(data):
+    """Reads serialized tokens from a string or any other buffer.
+
+    Parameters
+    ----------
+    data : str, buffer or mmap.mmap
+        The serialized tokens.
+
+    Returns
+    -------
+    TokenReader
+        Decodes the tokens on demand.
+    """
+
+    return TokenReader(data)
+
+
+def load(stored):
+    """Memory maps a file of serialized tokens.
+
+    Parameters
+    ----------
+    stored : file
+        A file opened for reading in binary mode.  It may be closed once this
+        returns.
+
+    Returns
+    -------
+    TokenReader
+        Decodes the tokens on demand.  Close it to unmap the file.
+    """
+
+    return TokenReader(mmap.mmap(stored.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class TokenReader(object):
+    """Decodes serialized tokens on demand.
+
+    Only the header is read up front; a token is decoded when it is indexed or
+    iterated over, and each string is decoded once.
+
+    Parameters
+    ----------
+    data : str, buffer or mmap.mmap
+        The serialized tokens.
+
+    Attributes
+    ----------
+    positions : bool
+        Whether the tokens have their `start` and `end` offsets.
+
+    Raises
+    ------
+    ValueError
+        If the data is not serialized tokens, or is in a version of the format
+        this reader does not understand.
+    """
+
+    def __init__(self, data):
+        if len(data) < _header.size:
+            raise ValueError('Not serialized CSS tokens')
+        fields = _header.unpack_from(data, 0)
+        if fields[0] != magic:
+            raise ValueError('Not serialized CSS tokens')
+        if fields[1] != version:
+            raise ValueError(
+                'Unsupported serialized CSS tokens version {}'.format(
+                    fields[1]))
+        self._data = data
+        (_, _, flags, self._length, string_count, _, self._block_size,
+         self._types, self._records, self._numbers, self._blocks,
+         self._string_offsets, self._string_data) = fields
+        self.positions = bool(flags & _positions_flag)
+        self._strings = [None] * string_count
+
+    def close(self):
+        """Unmaps the serialized tokens, if they were loaded from a file."""
+
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._length
+
+    def _string(self, index):
+        string = self._strings[index]
+        if string is None:
+            start, end = struct.unpack_from(
+                '<II', self._data, self._string_offsets + 4 * index)
+            string = self._strings[index] = self._data[
+                self._string_data + start:self._string_data + end].decode(
+                'UTF-8')
+        return string
+
+    def _decode(self, first, stop):
+        """Decodes the tokens from `first` up to `stop`.
+
+        Yields
+        ------
+        CSSToken
+            The tokens, in order.
+        """
+
+        if first >= stop:
+            return
+        data = self._data
+        size = self._block_size
+        block, skip = divmod(first, size)
+        position, end, number = _block.unpack_from(
+            data, self._blocks + block * _block.size)
+        last_block = (stop - 1) // size + 1
+        if last_block * size < self._length:
+            records_end, _, _ = _block.unpack_from(
+                data, self._blocks + last_block * _block.size)
+        else:
+            records_end = self._numbers - self._records
+        records = bytearray(data[self._records + position:
+                                 self._records + records_end])
+        types = bytearray(data[self._types + first - skip:self._types + stop])
+        position = 0
+        positions = self.positions
+        kinds = TokenColumns.kinds
+        literals = CSSTokenizer._literals
+        for offset, code in enumerate(types):
+            cls, flag = kinds[code]
+            if positions:
+                gap, position = _read_varint(records, position)
+                length, position = _read_varint(records, position)
+                start = end + gap
+                end = start + length
+            if code in _valueless_codes:
+                string = None
+            else:
+                string, position = _read_varint(records, position)
+            if code in _dimension_codes:
+                unit, position = _read_varint(records, position)
+            if code in _numeric_codes:
+                number += 1
+            if offset < skip:
+                continue
+
+            if string is None:
+                token = cls() if positions else _shared_tokens[cls]
+            else:
+                string = self._string(string)
+                if cls is LiteralToken:
+                    if positions:
+                        token = LiteralToken(string)
+                    else:
+                        token = literals[string]
+                elif cls is HashToken:
+                    token = HashToken(string, flag)
+                elif code not in _numeric_codes:
+                    token = cls(string)
+                else:
+                    if _is_integer(string):
+                        value = int(string)
+                    else:
+                        value, = _double.unpack_from(
+                            data, self._numbers + (number - 1) * _double.size)
+                    if cls is PercentageToken:
+                        token = PercentageToken(string, value)
+                    elif cls is DimensionToken:
+                        token = DimensionToken(string, value, flag,
+                                               self._string(unit))
+                    else:
+                        token = NumberToken(string, value, flag)
+            if positions:
+                token.start = start
+                token.end = end
+            yield token
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step == 1:
+                return list(self._decode(start, stop))
+            return [self[i] for i in xrange(start, stop, step)]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('token index out of range')
+        return next(self._decode(index, index + 1))
+
+    def __iter__(self):
+        return self._decode(0, self._length)
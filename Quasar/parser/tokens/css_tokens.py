@@ -42,14 +42,19 @@ Details on those tokens:
         - <dimension-token> additionally have a unit composed of one or more
           code points.
 """
-from collections import OrderedDict, deque
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque, namedtuple
+import codecs
+import itertools
 import logging
+import multiprocessing
 import re
 
-from Quasar import parse_log_file
 
-
-logging.basicConfig(filename=parse_log_file, level=logging.INFO)
+# Diagnostics go nowhere unless a handler is attached, for example with
+# `Quasar.log_to_file`; importing the tokenizer does no I/O.
+_logger = logging.getLogger(__name__)
 
 replace_characters = OrderedDict()
 line_feed = u'\u000A'   # (\n)
@@ -58,9 +63,121 @@ replace_characters[u'\u000D\u000A'] = line_feed   # Carriage Return + New Line
 replace_characters[u'\u000D'] = line_feed   # Carriage Return (CR)
 replace_characters[u'\u000C'] = line_feed   # Form Feed (FF)
 replace_characters[u'\u0000'] = replacement_character
+decode_errors = 'replace'   # Codec error handler for invalid UTF-8
+_replaced = re.compile(u'[%s]' % u''.join(
+    set(re.escape(replaced[0]) for replaced in replace_characters)))
+
+# Code point classes used by the tokenizer.  Input has already been through
+# `preprocessing` so U+000D and U+000C never reach these checks.
+_whitespace = u'\u0009\u000A\u0020'
+_digits = u'0123456789'
+_hex_digits = u'0123456789abcdefABCDEF'
+_name_start = u'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_'
+_name = _name_start + _digits + u'-'
+_non_printable = u''.join(
+    unichr(i) for i in range(0x20) if i not in (0x09, 0x0A, 0x0C, 0x0D)
+) + u'\u007F'
+_max_code_point = 0x10FFFF
+
+# Names that turn up over and over in real stylesheets: properties, keywords,
+# units, at-rules, functions and pseudo-classes.  Every tokenizer looks names
+# up in one shared table of these before its own, so their tokens share one
+# string.
+vocabulary = frozenset(u'''
+    align-content align-items align-self all animation animation-delay
+    animation-direction animation-duration animation-fill-mode
+    animation-iteration-count animation-name animation-play-state
+    animation-timing-function backface-visibility background
+    background-attachment background-clip background-color background-image
+    background-origin background-position background-repeat background-size
+    border border-bottom border-bottom-color border-bottom-left-radius
+    border-bottom-right-radius border-bottom-style border-bottom-width
+    border-collapse border-color border-image border-left border-left-color
+    border-left-style border-left-width border-radius border-right
+    border-right-color border-right-style border-right-width border-spacing
+    border-style border-top border-top-color border-top-left-radius
+    border-top-right-radius border-top-style border-top-width border-width
+    bottom box-shadow box-sizing caption-side clear clip color columns
+    content counter-increment counter-reset cursor direction display
+    empty-cells filter flex flex-basis flex-direction flex-flow flex-grow
+    flex-shrink flex-wrap float font font-family font-size font-style
+    font-variant font-weight height justify-content left letter-spacing
+    line-height list-style list-style-image list-style-position
+    list-style-type margin margin-bottom margin-left margin-right margin-top
+    max-height max-width min-height min-width opacity order outline
+    outline-color outline-offset outline-style outline-width overflow
+    overflow-x overflow-y padding padding-bottom padding-left padding-right
+    padding-top page-break-after page-break-before page-break-inside
+    perspective pointer-events position quotes resize right src table-layout
+    text-align text-decoration text-indent text-overflow text-shadow
+    text-transform top transform transform-origin transition
+    transition-delay transition-duration transition-property
+    transition-timing-function unicode-bidi unicode-range user-select
+    vertical-align visibility white-space width word-break word-spacing
+    word-wrap z-index zoom
+    absolute auto baseline block bold bolder both bottom capitalize center
+    circle collapse contain cover dashed decimal default disc dotted double
+    ease ease-in ease-in-out ease-out fixed forwards groove hidden important
+    inherit initial inline inline-block inline-flex infinite inset italic
+    justify left lighter linear list-item lowercase middle monospace no-repeat
+    none normal nowrap oblique outset pointer pre pre-line pre-wrap relative
+    repeat repeat-x repeat-y ridge right sans-serif scroll serif solid square
+    static sticky sub super table table-cell table-row text-bottom text-top
+    top transparent underline uppercase visible wrap
+    black blue gray green grey orange purple red silver white yellow
+    px em ex ch rem vw vh vmin vmax cm mm in pt pc Q deg grad rad turn s ms
+    Hz kHz dpi dpcm dppx fr
+    charset font-face import keyframes media namespace page supports
+    -webkit-keyframes -moz-keyframes -o-keyframes -ms-keyframes
+    attr calc cubic-bezier format linear-gradient local matrix not nth-child
+    nth-last-child nth-of-type nth-last-of-type radial-gradient rgb rgba
+    rotate scale translate translatex translatey hsl hsla url var
+    active after before checked disabled empty enabled first-child
+    first-letter first-line first-of-type focus hover last-child
+    last-of-type link only-child only-of-type root selection target visited
+    all print screen and only or
+'''.split())
+_vocabulary_names = dict((name, name) for name in vocabulary)
+
+try:
+    unichr(_max_code_point)
+except ValueError:   # Narrow build; astral code points need a surrogate pair
+    def _unichr(code_point):
+        return (u'\\U%08x' % code_point).decode('unicode-escape')
+else:
+    _unichr = unichr
+
+# Codes of the parse errors a tokenizer records.  Offsets point into the token
+# or comment in error, or at the invalid UTF-8.
+invalid_utf8 = 0
+newline_in_string = 1
+eof_in_string = 2
+bad_url = 3
+eof_in_url = 4
+eof_in_comment = 5
+eof_in_escape = 6
+invalid_escape = 7
+parse_error_messages = (
+    u'CSS contains invalid characters for UTF-8',
+    u'Newline in a string',
+    u'End of input in a string',
+    u'Invalid code point in a url',
+    u'End of input in a url',
+    u'End of input in a comment',
+    u'End of input after a backslash',
+    u'Backslash before a newline outside a string',
+)
+
+ParseError = namedtuple('ParseError', 'code offset message')
+
+
+def _ignore_error(code, offset):
+    """Stands in for `CSSTokenizer._record_error` when errors are not
+    collected.
+    """
 
 
-def preprocessing(unicode_string_input):
+def preprocessing(unicode_string_input, report=None):
     """Preprocesses the CSS to handle invalid or undesirable code points.
 
     Parameters
@@ -68,6 +185,9 @@ def preprocessing(unicode_string_input):
     unicode_string_input : unicode
         A string that holds a CSS document or CSS information, encoded using
         UTF-8.
+    report : callable
+        Called with the offset into the output and a message if the input is
+        not valid UTF-8.  By default that is logged as a warning instead.
 
     Returns
     -------
@@ -77,7 +197,10 @@ def preprocessing(unicode_string_input):
     Notes
     -----
     - Invalid code points are defined by the current UTF-8 standard; any value
-      greater than U+10FFFF is invalid and is skipped by the algorithm.
+      greater than U+10FFFF is invalid.  Invalid byte sequences are replaced
+      with U+FFFD Replacement Character (�), as the UTF-8 decoder of the
+      Encoding Standard does; valid sequences around them are kept.
+    - Input that is already unicode is not decoded again.
     - Undesirable code points and their replacements are:
          | U+000D U+000A Carriage Return + Line Feed -> U+000A Line Feed
          | U+000D Carriage Return -> U+000A Line Feed
@@ -85,22 +208,94 @@ def preprocessing(unicode_string_input):
          | U+0000 Null -> U+FFFD Replacement Character (�)
     """
 
-    try:
-        unicode_string_output = unicode_string_input.decode('UTF-8')
-    except UnicodeDecodeError:
-        logging.warn("CSS contains invalid characters for UTF-8")
-        acc_unicode_string = ''
-        for code_point in unicode_string_input:
-            try:
-                acc_unicode_string += code_point.decode('UTF-8')
-            except UnicodeDecodeError:
-                # Skip invalid characters
-                pass
-        unicode_string_output = acc_unicode_string
+    if isinstance(unicode_string_input, unicode):
+        unicode_string_output = unicode_string_input
+    else:
+        try:
+            unicode_string_output = unicode_string_input.decode('UTF-8')
+        except UnicodeDecodeError as error:
+            message = parse_error_messages[invalid_utf8]
+            offset = len(_replace_characters(
+                unicode_string_input[:error.start].decode('UTF-8')))
+            if report is None:
+                _logger.warning(u'%s at offset %d', message, offset)
+            else:
+                report(offset, message)
+            unicode_string_output = unicode_string_input.decode(
+                'UTF-8', decode_errors)
+    return _replace_characters(unicode_string_output)
+
+
+def _replace_characters(unicode_string):
+    """Replaces the undesirable code points listed in `replace_characters`.
+
+    Each replacement is one C-level `unicode.replace` pass, and is skipped when
+    the code point it starts with does not occur at all; a single search
+    skips them all for the usual input that needs none.  In CPython this beats
+    both a single regular expression substitution and `unicode.translate`,
+    which call back into Python for every match or every code point.
+    """
+
+    if _replaced.search(unicode_string) is None:
+        return unicode_string
     for replaced, replacer in replace_characters.iteritems():
-        unicode_string_output = unicode_string_output.replace(replaced,
-                                                              replacer)
-    return unicode_string_output
+        if replaced[0] in unicode_string:
+            unicode_string = unicode_string.replace(replaced, replacer)
+    return unicode_string
+
+
+def _newline_offsets(unicode_string, base=0):
+    """Finds the offset of every line feed in a preprocessed string.
+
+    Parameters
+    ----------
+    unicode_string : unicode
+        The preprocessed code points.  Preprocessing has already turned every
+        other kind of newline into U+000A LINE FEED.
+    base : int
+        Added to every offset, for strings that continue an earlier one.
+
+    Returns
+    -------
+    array.array
+        The offsets, in ascending order.
+    """
+
+    offsets = array('I')
+    find = unicode_string.find
+    index = find(line_feed)
+    while index != -1:
+        offsets.append(base + index)
+        index = find(line_feed, index + 1)
+    return offsets
+
+
+def _read_chunks(source, chunk_size):
+    """Yields successive chunks of `source`.
+
+    Parameters
+    ----------
+    source : file, mmap.mmap, str, unicode or iterable
+        Anything with a `read` method is read `chunk_size` bytes at a time; a
+        string is a single chunk; any other iterable is taken to already yield
+        chunks.
+    chunk_size : int
+        The size of each read.
+    """
+
+    if isinstance(source, basestring):
+        yield source
+        return
+    read = getattr(source, 'read', None)
+    if read is None:
+        for chunk in source:
+            yield chunk
+        return
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
 
 
 class CSSToken(object):
@@ -110,11 +305,57 @@ class CSSToken(object):
     ----------
     string : str
         The string value of the token.
+
+    Attributes
+    ----------
+    start, end : int
+        The offsets of the first code point of the token and of the code point
+        just after it in the preprocessed input.  Only set on tokens that
+        carry their own position, such as those `iter_tokens` hands out when
+        the tokenizer tracks positions.
     """
 
+    __slots__ = ('value', 'start', 'end')
+
     def __init__(self, string):
         self.value = string
 
+    @classmethod
+    def _fields(cls):
+        """The names of every slot on this token type, base class first."""
+        return tuple(name for klass in reversed(cls.__mro__)
+                     for name in klass.__dict__.get('__slots__', ()))
+
+    @property
+    def __dict__(self):
+        # Tokens are slotted, but `vars(token)` is still handy for debugging.
+        return OrderedDict((name, getattr(self, name))
+                           for name in self._fields() if hasattr(self, name))
+
+    def _args(self):
+        """The arguments that rebuild this token when passed to its class."""
+        return (self.value,)
+
+    def __reduce__(self):
+        cls = type(self)
+        if cls in _shared_tokens:
+            if self is _shared_tokens[cls]:
+                return _shared_token, (cls, self.value)
+            args = ()
+        elif (cls is LiteralToken and
+                CSSTokenizer._literals.get(self.value) is self):
+            return _shared_token, (cls, self.value)
+        else:
+            args = self._args()
+        start = getattr(self, 'start', None)
+        if start is None:
+            return cls, args
+        return cls, args, {'start': start, 'end': self.end}
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            setattr(self, name, value)
+
     def __str__(self):
         return self.value
 
@@ -122,11 +363,20 @@ class CSSToken(object):
         return repr(str(self))
 
     def __eq__(self, other):
+        if not isinstance(other, CSSToken):
+            return NotImplemented
         values_equal = (self.value == other.value)
         classes_equal = (type(self) == type(other))
-        subclass_of = (issubclass(self, other) or issubclass(other, self))
+        subclass_of = (isinstance(self, type(other)) or
+                       isinstance(other, type(self)))
         return values_equal and (classes_equal or subclass_of)
 
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = object.__hash__
+
 
 class WhitespaceToken(CSSToken):
     """A CSS Token representing an arbitrary amount of whitespace.
@@ -134,8 +384,10 @@ class WhitespaceToken(CSSToken):
     Whitespace of any length or type is arbitrarily reduced to a single space.
     """
 
+    __slots__ = ()
+
     def __init__(self):
-        super(WhitespaceToken, self).__init__(' ')
+        self.value = ' '
 
 
 class NumberToken(CSSToken):
@@ -152,11 +404,16 @@ class NumberToken(CSSToken):
         The type of number this NumberToken instance holds.
     """
 
+    __slots__ = ('string', 'type_')
+
     def __init__(self, string_repr, numeric_value, type_flag):
         self.string = string_repr
         self.value = numeric_value
         self.type_ = type_flag
 
+    def _args(self):
+        return self.string, self.value, self.type_
+
     def __str__(self):
         return self.string
 
@@ -180,13 +437,19 @@ class DimensionToken(NumberToken):
         unit is `px` or pixels.
     """
 
+    __slots__ = ('unit',)
+
     def __init__(self, string_repr, numeric_value, type_flag, unit):
-        super(DimensionToken, self).__init__(
-            string_repr, numeric_value, type_flag)
+        self.string = string_repr
+        self.value = numeric_value
+        self.type_ = type_flag
         self.unit = unit
 
+    def _args(self):
+        return self.string, self.value, self.type_, self.unit
+
     def __str__(self):
-        return "{} {}".format(super(DimensionToken, self).__str__(), self.unit)
+        return "{} {}".format(self.string, self.unit)
 
 
 class PercentageToken(NumberToken):
@@ -201,12 +464,18 @@ class PercentageToken(NumberToken):
         number depending on the type_flag.
     """
 
+    __slots__ = ()
+
     def __init__(self, string_repr, numeric_value):
-        super(PercentageToken, self).__init__(
-            string_repr, numeric_value, 'number')
+        self.string = string_repr
+        self.value = numeric_value
+        self.type_ = 'number'
+
+    def _args(self):
+        return self.string, self.value
 
     def __str__(self):
-        return "{} %".format(super(PercentageToken, self).__str__())
+        return "{} %".format(self.string)
 
 
 class IdentToken(CSSToken):
@@ -218,8 +487,7 @@ class IdentToken(CSSToken):
         The name of the identifier.
     """
 
-    def __init__(self, name):
-        super(IdentToken, self).__init__(name)
+    __slots__ = ()
 
 
 class FunctionToken(IdentToken):
@@ -231,8 +499,7 @@ class FunctionToken(IdentToken):
         The name of the function.
     """
 
-    def __init__(self, name):
-        super(FunctionToken, self).__init__(name)
+    __slots__ = ()
 
 
 class URLToken(FunctionToken):
@@ -244,8 +511,7 @@ class URLToken(FunctionToken):
         The value of the url function
     """
 
-    def __init__(self, value):
-        super(URLToken, self).__init__(value)
+    __slots__ = ()
 
 
 class LiteralToken(CSSToken):
@@ -260,8 +526,7 @@ class LiteralToken(CSSToken):
         The value of the string literal.
     """
 
-    def __init__(self, value):
-        super(LiteralToken, self).__init__(value)
+    __slots__ = ()
 
 
 class StringToken(CSSToken):
@@ -273,8 +538,7 @@ class StringToken(CSSToken):
         The string held by the token.
     """
 
-    def __init__(self, value):
-        super(StringToken, self).__init__(value)
+    __slots__ = ()
 
 
 class BadStringToken(StringToken):
@@ -284,8 +548,24 @@ class BadStringToken(StringToken):
     `BadStringToken`s have a value of '', the empty string.
     """
 
+    __slots__ = ()
+
     def __init__(self):
-        super(BadStringToken, self).__init__('')
+        self.value = ''
+
+
+class BadURLToken(URLToken):
+    """Token representing an invalid url.
+
+    A url is invalid if it contains quotes, parentheses, non-printable code
+    points or whitespace before its closing parenthesis.  All `BadURLToken`s
+    have a value of '', the empty string.
+    """
+
+    __slots__ = ()
+
+    def __init__(self):
+        self.value = ''
 
 
 class HashToken(CSSToken):
@@ -301,10 +581,15 @@ class HashToken(CSSToken):
         The type of the HashToken (what is being selected).
     """
 
+    __slots__ = ('type_flag',)
+
     def __init__(self, value, type_):
-        super(HashToken, self).__init__(value)
+        self.value = value
         self.type_flag = type_
 
+    def _args(self):
+        return self.value, self.type_flag
+
 
 class DelimToken(CSSToken):
     """Token used as a delimiter.
@@ -315,66 +600,81 @@ class DelimToken(CSSToken):
         The value of the delimiter.
     """
 
-    def __init__(self, value):
-        super(DelimToken, self).__init__(value)
+    __slots__ = ()
 
 
 class SuffixMatchToken(CSSToken):
     """Indicates a suffix match.  I don't actually know what this is yet..."""
 
+    __slots__ = ()
+
     def __init__(self):
-        super(SuffixMatchToken, self).__init__('')
+        self.value = ''
 
 
 class SubstringMatchToken(CSSToken):
     """Indicates a substring match.  I don't actually know what this is yet...
     """
 
+    __slots__ = ()
+
     def __init__(self):
-        super(SubstringMatchToken, self).__init__('')
+        self.value = ''
 
 
 class PrefixMatchToken(CSSToken):
     """Indicates a prefix match.  I don't actually know what this is yet..."""
 
+    __slots__ = ()
+
     def __init__(self):
-        super(PrefixMatchToken, self).__init__('')
+        self.value = ''
 
 
 class CDOToken(CSSToken):
     """Indicates a CDO Token.  Don't know what this is yet..."""
 
+    __slots__ = ()
+
     def __init__(self):
-        super(CDOToken, self).__init__('')
+        self.value = ''
 
 
 class CDCToken(CSSToken):
     """Indicates a CDC Token.  I don't actually know what this is yet..."""
 
+    __slots__ = ()
+
     def __init__(self):
-        super(CDCToken, self).__init__('')
+        self.value = ''
 
 
 class DashMatchToken(CSSToken):
     """Indicates a dash match.  I don't actually know what this is yet..."""
 
+    __slots__ = ()
+
     def __init__(self):
-        super(DashMatchToken, self).__init__('')
+        self.value = ''
 
 
 class IncludeMatchToken(CSSToken):
     """Indicates an include match.  I don't actually know what this is yet...
     """
 
+    __slots__ = ()
+
     def __init__(self):
-        super(IncludeMatchToken, self).__init__('')
+        self.value = ''
 
 
 class ColumnToken(CSSToken):
     """Indicates a column.  I don't actually know what this is yet..."""
 
+    __slots__ = ()
+
     def __init__(self):
-        super(ColumnToken, self).__init__('')
+        self.value = ''
 
 
 class AtKeywordToken(IdentToken):
@@ -386,8 +686,83 @@ class AtKeywordToken(IdentToken):
         The name of the at rule.
     """
 
-    def __init__(self, value):
-        super(AtKeywordToken, self).__init__(value)
+    __slots__ = ()
+
+
+# Tokens that carry no value of their own (or, for literals, only ever one of
+# a handful of code points) are handed out as shared instances rather than
+# being rebuilt for every occurrence.  Treat them as immutable.
+_whitespace_token = WhitespaceToken()
+_bad_string_token = BadStringToken()
+_bad_url_token = BadURLToken()
+_suffix_match_token = SuffixMatchToken()
+_substring_match_token = SubstringMatchToken()
+_prefix_match_token = PrefixMatchToken()
+_CDO_token = CDOToken()
+_CDC_token = CDCToken()
+_dash_match_token = DashMatchToken()
+_include_match_token = IncludeMatchToken()
+_column_token = ColumnToken()
+_shared_tokens = dict((type(token), token) for token in (
+    _whitespace_token, _bad_string_token, _bad_url_token, _suffix_match_token,
+    _substring_match_token, _prefix_match_token, _CDO_token, _CDC_token,
+    _dash_match_token, _include_match_token, _column_token))
+_shared_types = frozenset(_shared_tokens) | frozenset([LiteralToken])
+
+
+def _token_offsets(source, bounds, count):
+    """Works out the offsets of the tokens from where each step of the
+    tokenizer's loop started.
+
+    Every step consumes exactly one token, except one that skips a comment.
+    A step that starts with `/*` is always a comment, and a `/*` where no
+    step started is inside a string, url or comment, so only the steps found
+    at a `/*` need dropping.
+
+    Parameters
+    ----------
+    source : unicode
+        The preprocessed code points.
+    bounds : array.array
+        The offset each step started at, then the offset the last one ended.
+    count : int
+        How many tokens the steps consumed.
+
+    Returns
+    -------
+    tuple of array.array
+        The start and end offset of each token.
+    """
+
+    steps = len(bounds) - 1
+    if count == steps:
+        return bounds[:-1], bounds[1:]
+    starts = array('I')
+    ends = array('I')
+    last = 0
+    stop = bounds[-1]
+    position = source.find(u'/*', bounds[0], stop)
+    while position != -1:
+        index = bisect_left(bounds, position, last)
+        if bounds[index] == position:
+            starts.extend(bounds[last:index])
+            ends.extend(bounds[last + 1:index + 1])
+            last = index + 1
+            position = bounds[last]
+        else:
+            position += 1
+        position = source.find(u'/*', position, stop)
+    starts.extend(bounds[last:steps])
+    ends.extend(bounds[last + 1:])
+    return starts, ends
+
+
+def _shared_token(cls, value):
+    """Looks up the shared instance of a token when unpickling."""
+
+    if cls is LiteralToken:
+        return CSSTokenizer._literals[value]
+    return _shared_tokens[cls]
 
 
 class CSSTokenizer(object):
@@ -403,11 +778,47 @@ class CSSTokenizer(object):
     ----------
     input_string : str
         The string containing the CSS to be tokenized.
+    positions : bool
+        Whether to record the offsets of every token.  `tokenize_stream`
+        records them in `starts` and `ends`, leaving the tokens untouched;
+        `iter_tokens` sets the `start` and `end` of every token it hands out,
+        copying shared instances to do so.
+    names : dict
+        The table names outside `vocabulary` are interned in, mapping each
+        name to itself.  By default every tokenizer starts an empty table of
+        its own; pass the same dict to several tokenizers to share one
+        between them.
+    on_error : callable
+        Called with a `ParseError` for every parse error as it is found.
+    collect_errors : bool
+        Whether to record parse errors at all.  If not, an error costs nothing
+        more than the branch that notices it.
 
     Attributes
     ----------
     stream
     tokens
+    positions : bool
+        Whether the offsets of every token are recorded.
+    starts, ends : array.array
+        With positions, the offsets of the first code point of each token
+        `tokenize_stream` collected in `tokens` and of the code point just
+        after it, index for index.  Otherwise None.
+    names
+    errors
+    error_count : int
+        How many parse errors were found in the current input, including any
+        beyond `max_errors`.
+    error_codes : array.array
+        The code of each recorded parse error, one byte each.  Only the first
+        `error_count` (at most `max_errors`) entries are in use.
+    error_offsets : array.array
+        The offset of each recorded parse error.
+    max_errors : int
+        How many parse errors the preallocated buffers hold.  Later errors
+        are counted but not recorded.
+    on_error : callable
+        Called with a `ParseError` for every parse error, or None.
     current_code_point
     next_code_point
     digit : _sre.SRE_Pattern
@@ -449,6 +860,23 @@ class CSSTokenizer(object):
     url : _sre.SRE_Pattern
         Regular expression that matches the word 'url' in a non-case sensitive
         manner.
+    whitespace_run : _sre.SRE_Pattern
+        Regular expression that matches a (possibly empty) run of whitespace.
+    digit_run : _sre.SRE_Pattern
+        Regular expression that matches a (possibly empty) run of digits.
+    name_run : _sre.SRE_Pattern
+        Regular expression that matches a (possibly empty) run of "name" code
+        points.  Escapes interrupt the run and are handled separately.
+    number : _sre.SRE_Pattern
+        Regular expression that matches a whole number: an optional sign, the
+        integer digits, an optional fractional part and an optional exponent.
+    string_runs : dict
+        Maps each quotation code point to a regular expression that matches a
+        run of code points that may appear unescaped in a string delimited by
+        that quotation.
+    url_run : _sre.SRE_Pattern
+        Regular expression that matches a run of code points that may appear
+        unescaped in an unquoted url.
     literal_tokens : list
         A list of the literal tokens used by CSS. This includes the values
         \u0028, \u0029, \u002C, \u003A, \u003B, \u005B, \u005D, \u007B, \u007D
@@ -493,19 +921,22 @@ class CSSTokenizer(object):
     single_quote : unicode
         The ' code point U+0027.
     exclamation_point : unicode
-        The ! code point U+002D.
+        The ! code point U+0021.
     EOF : types.NoneType
         Conceptual end of file.
+    lookahead_margin : int
+        How many code points past the end of a token the consumers may look at
+        before deciding where it ends.
     """
 
     digit = re.compile(u'[\u0030-\u0039]')
     hex_digit = re.compile(u'[\u0030-\u0039\u0041-\u0046\u0061-\u0066]')
-    letter = re.compile(u'[\u0041-\u0051\u0061-\u007A]')
+    letter = re.compile(u'[\u0041-\u005A\u0061-\u007A]')
     non_ascii = re.compile(u'[^\u0000-\u007F]')
-    name_start = re.compile(u'''[\u0041-\u0051\u0061-\u007A\u005F]|
+    name_start = re.compile(u'''[\u0041-\u005A\u0061-\u007A\u005F]|
                                 [^\u0000-\u007F]
                              ''', re.VERBOSE)
-    name = re.compile(u'''[\u0041-\u0051\u0061-\u007A\u005F]|
+    name = re.compile(u'''[\u0041-\u005A\u0061-\u007A\u005F]|
                           [^\u0000-\u007F]|[\u0030-\u0039]|\u002D
                        ''', re.VERBOSE)
     non_printable = re.compile(u'[\u0000-\u0008\u000B\u000E-\u001F\u007F]')
@@ -514,6 +945,19 @@ class CSSTokenizer(object):
     surrogate = re.compile(u'[\uD800-\uDFFF]')
     quotations = re.compile(u'[\u0022\u0027]')
     url = re.compile(u'url', re.IGNORECASE)
+    whitespace_run = re.compile(u'[\u0009\u000A\u0020]*')
+    digit_run = re.compile(u'[\u0030-\u0039]*')
+    name_run = re.compile(
+        u'[^\u0000-\u002C\u002E\u002F\u003A-\u0040\u005B-\u005E\u0060'
+        u'\u007B-\u007F]*')
+    number = re.compile(u'''[\u002B\u002D]?([\u0030-\u0039]*)
+                            ([\u002E][\u0030-\u0039]+)?
+                            ([eE][\u002B\u002D]?[\u0030-\u0039]+)?
+                         ''', re.VERBOSE)
+    string_runs = {u'\u0022': re.compile(u'[^\u0022\\\\\u000A]*'),
+                   u'\u0027': re.compile(u'[^\u0027\\\\\u000A]*')}
+    url_run = re.compile(u'[^\u0000-\u0020\u0022\u0027\u0028\u0029\\\\'
+                         u'\u007F]*')
     literal_tokens = [u'\u0028', u'\u0029', u'\u002C', u'\u003A', u'\u003B',
                       u'\u005B', u'\u005D', u'\u007B', u'\u007D']
     octothorpe = u'\u0023'
@@ -536,13 +980,18 @@ class CSSTokenizer(object):
     rparen = u'\u0029'
     double_quote = u'\u0022'
     single_quote = u'\u0027'
-    exclamation_point = u'\u002D'
+    exclamation_point = u'\u0021'
     EOF = None
+    lookahead_margin = 3
 
-    _stream = None
+    _source = u''
+    _length = 0
+    _pos = 0
+    _base = 0
+    _newlines = None
     _tokens = None
-    _current = None
-    _next = ''
+    _names = None
+    max_errors = 1024
 
     @staticmethod
     def _valid_escape(first, second):
@@ -565,10 +1014,7 @@ class CSSTokenizer(object):
         not be a newline for this  method to return True.
 
         """
-        if first == CSSTokenizer.backslash:
-            if not CSSTokenizer.newline.match(second):
-                return True
-        return False
+        return first == CSSTokenizer.backslash and second != line_feed
 
     @classmethod
     def _string_to_number(cls, string):
@@ -586,213 +1032,112 @@ class CSSTokenizer(object):
 
         Notes
         -----
-        Divide the string into seven components, in order from left to right:
-            Sign, integer part, decimal, fractional part, exponent indicator,
-            exponent sign, exponent value.
-        These are explained in the docstrings of the helper methods.
-
-        Return a value s·(i + f·10-d)·10te.
+        The string is divided into a sign, an integer part, a fractional part
+        and an exponent by a single match of `number`.  A string with only an
+        integer part is converted exactly with `int`; anything else with
+        `float`, which rounds correctly rather than accumulating the error of
+        computing s·(i + f·10-d)·10te piece by piece.
         """
 
-        sign, sign_removed = cls._get_sign(string)
-        integer, int_removed = cls._get_integer(sign_removed)
-        integer *= sign
-        if int_removed:
-            dec_removed = cls._get_decimal(int_removed)
-            if dec_removed:
-                fractional, frac_removed = cls._get_fractional(dec_removed)
-                decimal_places = pow(10, -1*len(fractional))
-                fractional = int(fractional) * sign
-                if frac_removed:
-                    exponent = pow(10, cls._get_exponent(frac_removed))
-                    return (integer + fractional*decimal_places) * exponent
-                else:
-                    return float(integer + (fractional * decimal_places))
-            else:
-                return float(integer)
-        else:
-            return integer
+        match = cls.number.match(string)
+        if match.group(2) is None and match.group(3) is None:
+            return int(string)
+        return float(string)
 
-    @classmethod
-    def _get_sign(cls, string):
-        """Determines the sign of a string number.
-
-        Sign is determined by a single U+002B PLUS SIGN (+) or U+002D
-        HYPHEN-MINUS (-) or the empty string. Let s be the number -1 if the
-        sign is U+002D HYPHEN-MINUS (-); otherwise, let s be the number 1.
-
-        Parameters
-        ----------
-        string : unicode
-            The number whose sign needs to be determined.
-
-        Returns
-        -------
-        tuple
-            Returns a tuple, the first value is the sign (-1 or 1) and the
-            second value is the optionally truncated string that needs further
-            parsing.
-        """
-
-        if string[0] == cls.minus:
-            return -1, string[1:]
-        elif string[0] == cls.plus:
-            return 1, string[1:]
+    def __init__(self, input_string, positions=False, names=None,
+                 on_error=None, collect_errors=True):
+        self.tokens = deque()
+        self.on_error = on_error
+        self.error_codes = array('B', [0]) * self.max_errors
+        self.error_offsets = array('I', [0]) * self.max_errors
+        if collect_errors:
+            self._parse_error = self._record_error
         else:
-            return 1, string
-
-    @classmethod
-    def _get_integer(cls, string):
-        """Determines the integer part of a number in string form.
-
-        The integer part consists of zero or more digits. If there is at least
-        one digit, let i be the number formed by interpreting the digits as a
-        base-10 integer; otherwise, let i be the number 0.
+            self._parse_error = _ignore_error
+        self.stream = input_string
+        self.positions = positions
+        if positions:
+            self.starts = array('I')
+            self.ends = array('I')
+        else:
+            self.starts = self.ends = None
+        if names is None:
+            names = {}
+        self.names = names
 
-        Parameters
-        ----------
-        string : unicode
-            The string whose integer part is to be determined
+    @property
+    def stream(self):
+        """The code points that have not yet been consumed by the tokenizer.
 
-        Returns
-        -------
-        tuple
-            A tuple of form (number, string) where the number is the integer
-            part and the string is the remaining string to be parsed.
+        The tokenizer walks the preprocessed string with an integer cursor, so
+        this is a snapshot of the remaining input rather than a live buffer.
         """
 
-        integer = ''
-        while string:
-            char = string[0]
-            if cls.digit.match(char):
-                integer += char
-                string = string[1:]
-            else:
-                break
-        try:
-            return int(integer), string
-        except ValueError:
-            return 0, string
+        return deque(self._source[self._pos:])
 
-    @classmethod
-    def _get_decimal(cls, string):
-        """Determines whether or not a decimal point (and thus fractional
-        portion) is present in the number.
-
-        Determined by a single U+002E FULL STOP (.), or the empty string.
-
-        Parameters
-        ----------
-        string : unicode
-            The string to be parsed
+    @stream.setter
+    def stream(self, value):
+        self.error_count = 0
+        self._source = preprocessing(value, self._report_invalid_utf8)
+        self._length = len(self._source)
+        self._pos = 0
+        self._newlines = None
 
-        Returns
-        -------
-        unicode
-            The remaining string to be parsed.
+    @property
+    def errors(self):
+        """The recorded parse errors in the current input, as `ParseError`s,
+        in the order they were found.
         """
 
-        if string:
-            if string[0] == cls.full_stop:
-                return string[1:]
-            else:
-                return string
-
-    @classmethod
-    def _get_fractional(cls, string):
-        """Gets the fractional portion of a number.
-
-        A fractional part: zero or more digits. If there is at least one digit,
-        let f be the number formed by interpreting the digits as a base-10
-        integer and d be the number of digits; otherwise, let f and d be the
-        number 0.  The number of digits is calculated by whatever calls this
-        function.
+        return [ParseError(code, offset, parse_error_messages[code])
+                for code, offset in itertools.izip(
+                    self.error_codes[:self.error_count],
+                    self.error_offsets[:self.error_count])]
 
-        Parameters
-        ----------
-        string : unicode
-            The string to be parsed.
+    def _record_error(self, code, offset):
+        """Records a parse error at an offset into the current input.
 
-        Returns
-        -------
-        tuple
-            Returns a tuple of form (string, string).  The first string is the
-            fractional portion in string form, and the second is the remaining
-            string to be parsed.
+        Consumers only call this from the branches that find an error, through
+        `_parse_error`, which is a no-op when errors are not collected.
         """
 
-        fractional = '0'
-        leftover_string = ''
-        i = 0
-        for i in range(len(string)):
-            char = string[i]
-            if cls.digit.match(char):
-                fractional = fractional.lstrip('0')
-                fractional += char
-            else:
-                break
-        if i < len(string)-1:
-            leftover_string = string[i:]
-        return fractional, leftover_string
+        self._add_error(code, self._base + offset)
 
-    @classmethod
-    def _get_exponent(cls, string):
-        """Calculates the exponential portion of a string.
+    def _add_error(self, code, offset):
+        """Stores a parse error, and reports it to `on_error` and the log."""
 
-        Consists of an exponent indicator, an exponent sign, and the exponent
-        value.
+        count = self.error_count
+        if count < self.max_errors:
+            self.error_codes[count] = code
+            self.error_offsets[count] = offset
+        self.error_count = count + 1
+        message = parse_error_messages[code]
+        if self.on_error is not None:
+            self.on_error(ParseError(code, offset, message))
+        _logger.warning(u'%s at offset %d', message, offset)
 
-        Parameters
-        ----------
-        string : unicode
-            The string to be parsed
-
-        Returns
-        -------
-        int
-            The value of the exponential portion.
-
-        Notes
-        -----
-        An exponent indicator: a single U+0045 LATIN CAPITAL LETTER E (E) or
-        U+0065 LATIN SMALL LETTER E (e), or the empty string.
-
-        An exponent sign: a single U+002B PLUS SIGN (+) or U+002D HYPHEN-MINUS
-        (-), or the empty string. Let t be the number -1 if the sign is U+002D
-        HYPHEN-MINUS (-); otherwise, let t be the number 1.
-
-        An exponent: zero or more digits. If there is at least one digit let e
-        be the number formed by interpreting the digits as a base-10 integer;
-        otherwise, let e be the number 0.
-        """
-
-        if string[0] in ['e', 'E']:
-            try:
-                if string[1] == cls.minus:
-                    return -1 * int(string[2:])
-                elif string[1] == cls.plus:
-                    return int(string[2:])
-                else:
-                    return int(string[1:])
-            except IndexError:
-                return 0
-        return 0
-
-    def __init__(self, input_string):
-        self.tokens = deque()
-        self.stream = input_string
-        self.current_code_point = ''
-        self.next_code_point = self.stream
+    def _report_invalid_utf8(self, offset, message):
+        self._parse_error(invalid_utf8, offset)
 
     @property
-    def stream(self):
-        """The byte stream of unicode code points that is to be tokenized"""
+    def names(self):
+        """The table names outside `vocabulary` are interned in, mapping
+        each name to itself.
+
+        Equal identifiers, function names, at-keywords and units from
+        tokenizers that share a table are the same string, so later stages
+        may compare them with `is`; so are equal names from `vocabulary`,
+        whatever the table.  Hash names, such as ids and colors, are too
+        varied to be worth keeping, and are only shared when they are in
+        `vocabulary`.
+        """
 
-        return self._stream
+        return self._names
 
-    @stream.setter
-    def stream(self, value):
-        self._stream = deque(preprocessing(value))
+    @names.setter
+    def names(self, table):
+        self._names = table
+        self._intern = table.setdefault
 
     @property
     def tokens(self):
@@ -810,72 +1155,370 @@ class CSSTokenizer(object):
     def current_code_point(self):
         """The current code point that is being considered by the tokenizer"""
 
-        return self._current
-
-    @current_code_point.setter
-    def current_code_point(self, new_code_point):
-        self._current = new_code_point
+        if self._pos:
+            return self._source[self._pos - 1]
+        return u''
 
     @property
     def next_code_point(self):
         """The next code point to be considered by the tokenizer"""
 
-        return self._next
+        if self._pos < self._length:
+            return self._source[self._pos]
+        return CSSTokenizer.EOF
 
-    @next_code_point.setter
-    def next_code_point(self, stream):
-        try:
-            self._next = stream[0]
-        except IndexError:
-            self._next = CSSTokenizer.EOF
+    @classmethod
+    def _build_dispatch_table(cls):
+        """Builds the table that maps the first code point of a token to the
+        method that consumes it.
+
+        Every ASCII code point has an entry; anything missing from the table is
+        a non-ASCII, and therefore name-start, code point.
+
+        Returns
+        -------
+        dict
+            Maps code points to `(advance, consumer)` pairs.  `consumer` is the
+            plain function behind the consumer method and `advance` is 1 if it
+            expects the code point to have been consumed already, or 0 if it
+            starts at the next code point (ident-like and numeric tokens).
+        """
+
+        consumers = dict((unichr(i), 'consume_delim_token')
+                         for i in range(0x80))
+        for code_point in _whitespace:
+            consumers[code_point] = 'consume_whitespace_token'
+        for code_point in _name_start:
+            consumers[code_point] = 'consume_ident_like_token'
+        for code_point in _digits:
+            consumers[code_point] = 'consume_numeric_token'
+        for code_point in cls.literal_tokens:
+            consumers[code_point] = 'consume_literal_token'
+        consumers[cls.double_quote] = 'consume_string_token'
+        consumers[cls.single_quote] = 'consume_string_token'
+        consumers.update({
+            cls.forward_slash: 'consume_comment',
+            cls.octothorpe: 'consume_hash_token',
+            cls.dollar_sign: 'consume_suffix_match_token',
+            cls.asterisk: 'consume_substring_match_token',
+            cls.plus: 'handle_plus_sign',
+            cls.minus: 'handle_minus_sign',
+            cls.full_stop: 'handle_period',
+            cls.less_than: 'consume_CDO_token',
+            cls.at_sign: 'consume_commercial_at_token',
+            cls.backslash: 'handle_backslash',
+            cls.circumflex: 'consume_prefix_match_token',
+            cls.vertical: 'consume_dash_match_token',
+            cls.tilde: 'consume_include_match_token',
+        })
+        reconsumed = ('consume_ident_like_token', 'consume_numeric_token')
+        table = {}
+        for code_point, method_name in consumers.items():
+            method = getattr(cls, method_name)
+            advance = 0 if method_name in reconsumed else 1
+            table[code_point] = (advance, getattr(method, '__func__', method))
+        return table
 
     def tokenize_stream(self):
         """Tokenizes the code points within the byte stream.  Calls utility
         methods to handle the various different tokenization algorithms
         """
 
-        while self.stream:
-            if self.next_code_point is None:
+        source = self._source
+        length = self._length
+        dispatch = self._dispatch
+        name_start = dispatch[u'a']
+        if not self.positions:
+            while self._pos < length:
+                advance, consumer = dispatch.get(source[self._pos],
+                                                 name_start)
+                self._pos += advance
+                consumer(self)
+            return
+        # The loop only notes where each step starts; which steps produced
+        # tokens is worked out in one go afterwards.
+        tokens = self._tokens
+        queued = len(tokens)
+        bounds = array('I')
+        mark = bounds.append
+        position = self._pos
+        while position < length:
+            mark(position)
+            advance, consumer = dispatch.get(source[position], name_start)
+            self._pos = position + advance
+            consumer(self)
+            position = self._pos
+        mark(position)
+        starts, ends = _token_offsets(source, bounds, len(tokens) - queued)
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+
+    def iter_tokens(self):
+        """Tokenizes the code points within the byte stream on demand.
+
+        Tokens are handed out as they are consumed rather than collected, so
+        memory does not grow with the document and stopping early costs only
+        what was consumed.  Any tokens already waiting in `tokens` are handed
+        out first, as they are.
+
+        Yields
+        ------
+        CSSToken
+            The next token in the stream.
+        """
+
+        return self._iter_tokens(False)
+
+    def _iter_tokens(self, record):
+        """Consumes tokens one at a time, handing each out as it is consumed.
+
+        Parameters
+        ----------
+        record : bool
+            With positions, whether to append the offsets of each token to
+            `starts` and `ends` rather than set them on the token.
+        """
+
+        tokens = self._tokens
+        while tokens:
+            yield tokens.popleft()
+        source = self._source
+        length = self._length
+        dispatch = self._dispatch
+        name_start = dispatch[u'a']
+        positions = self.positions
+        starts, ends = self.starts, self.ends
+        while self._pos < length:
+            start = self._pos
+            advance, consumer = dispatch.get(source[start], name_start)
+            self._pos += advance
+            consumer(self)
+            if tokens:
+                if record:
+                    starts.append(start)
+                    ends.append(self._pos)
+                elif positions:
+                    token = tokens[-1]
+                    cls = token.__class__
+                    if cls in _shared_types:
+                        # A shared instance cannot carry a position.
+                        value = token.value
+                        token = tokens[-1] = cls.__new__(cls)
+                        token.value = value
+                    token.start = start
+                    token.end = self._pos
+                yield tokens.popleft()
+
+    def line_column(self, offset):
+        """Finds the line and column of an offset into the preprocessed input,
+        such as the `start` or `end` of a token.
+
+        The offsets of the line feeds are indexed the first time this is
+        called, so each lookup is a binary search.
+
+        Parameters
+        ----------
+        offset : int
+            The offset to look up.
+
+        Returns
+        -------
+        tuple of int
+            The line and column, both counted from 1.
+        """
+
+        newlines = self._newlines
+        if newlines is None:
+            newlines = self._newlines = _newline_offsets(self._source)
+        line = bisect_left(newlines, offset)
+        if line:
+            return line + 1, offset - newlines[line - 1]
+        return 1, offset + 1
+
+    def tokenize_columns(self):
+        """Tokenizes the code points within the byte stream into parallel
+        arrays rather than a stream of token objects.
+
+        Each token is encoded as soon as it is consumed, so only one token
+        object is alive at a time.  Any tokens already waiting in `tokens` are
+        left there.
+
+        Returns
+        -------
+        TokenColumns
+            The tokens, one row per token.
+        """
+
+        columns = TokenColumns(self._source)
+        add = columns._appender()
+        tokens = self._tokens
+        queued = len(tokens)
+        source = self._source
+        length = self._length
+        dispatch = self._dispatch
+        name_start = dispatch[u'a']
+        base = self._base
+        while self._pos < length:
+            start = self._pos
+            advance, consumer = dispatch.get(source[start], name_start)
+            self._pos += advance
+            consumer(self)
+            # No consumer produces more than one token.
+            if len(tokens) != queued:
+                add(tokens.pop(), base + start, base + self._pos)
+        return columns
+
+    def apply_edit(self, start, end, replacement):
+        """Replaces part of the input and re-tokenizes only what the edit can
+        have changed.
+
+        Tokenizing restarts after the last token that ends more than
+        `lookahead_margin` code points before the edit, and stops as soon as a
+        new token ends where an old one did after the edit.  From there on the
+        input is unchanged, and so are the tokens; they are kept, with their
+        offsets shifted.  Any input not yet tokenized is tokenized first.
+
+        Parameters
+        ----------
+        start, end : int
+            The range of the preprocessed input to replace, in the same terms
+            as the `start` and `end` of tokens.
+        replacement : str or unicode
+            The text to put in its place.  It is preprocessed on its own.
+
+        Returns
+        -------
+        tuple of int
+            The index in `tokens` of the first token that changed, how many
+            old tokens were removed and how many new tokens replaced them.
+        """
+
+        if not self.positions:
+            raise ValueError('Editing needs a tokenizer that tracks positions')
+        if not 0 <= start <= end <= self._length:
+            raise IndexError('edit range out of range')
+        self.tokenize_stream()
+        old = list(self._tokens)
+        old_starts, old_ends = self.starts, self.ends
+        stored = min(self.error_count, self.max_errors)
+        old_errors = zip(self.error_codes[:stored],
+                         self.error_offsets[:stored])
+        unstored = self.error_count - stored
+        self.error_count = 0
+        replacement = preprocessing(
+            replacement, lambda offset, message: self._parse_error(
+                invalid_utf8, start + offset))
+        delta = len(replacement) - (end - start)
+
+        # Keep every token that ends clear of the edit, including the
+        # lookahead that decided where it ends.
+        limit = start - self.lookahead_margin
+        kept = bisect_right(old_ends, limit)
+        restart = old_ends[kept - 1] if kept else 0
+
+        source = self._source
+        self._source = source[:start] + replacement + source[end:]
+        self._length = len(self._source)
+        self._pos = restart
+        self._newlines = None
+        self._tokens = deque()
+        new_starts = self.starts = array('I')
+        new_ends = self.ends = array('I')
+
+        unchanged = start + len(replacement)
+        resync = next_old = kept
+        new = []
+        for token in self._iter_tokens(True):
+            new.append(token)
+            token_end = new_ends[-1]
+            if token_end < unchanged:
+                continue
+            old_end = token_end - delta
+            while next_old < len(old) and old_ends[next_old] < old_end:
+                next_old += 1
+            if next_old < len(old) and old_ends[next_old] == old_end:
+                resync = next_old + 1
                 break
-            self.consume_next_code_point()
-            if self.current_code_point == CSSTokenizer.forward_slash:
-                self.consume_comment()
-            elif CSSTokenizer.whitespace.match(self.current_code_point):
-                self.consume_whitespace_token()
-            elif CSSTokenizer.digit.match(self.current_code_point):
-                self.consume_numeric_token()
-            elif self.current_code_point == CSSTokenizer.plus:
-                self.handle_plus_sign()
-            elif self.current_code_point == CSSTokenizer.minus:
-                self.handle_minus_sign()
-            elif self.current_code_point == CSSTokenizer.full_stop:
-                self.handle_period()
-            elif CSSTokenizer.name_start.match(self.current_code_point):
-                self.consume_ident_like_token()
-            elif self.current_code_point in CSSTokenizer.literal_tokens:
-                self.consume_literal_token()
-            elif CSSTokenizer.quotations.match(self.current_code_point):
-                self.consume_string_token()
-            elif self.current_code_point == CSSTokenizer.octothorpe:
-                self.consume_hash_token()
-            elif self.current_code_point == CSSTokenizer.dollar_sign:
-                self.consume_suffix_match_token()
-            elif self.current_code_point == CSSTokenizer.asterisk:
-                self.consume_substring_match_token()
-            elif self.current_code_point == CSSTokenizer.less_than:
-                self.consume_CDO_token()
-            elif self.current_code_point == CSSTokenizer.backslash:
-                self.consume_escape_token()
-            elif self.current_code_point == CSSTokenizer.circumflex:
-                self.consume_prefix_match_token()
-            elif self.current_code_point == CSSTokenizer.vertical:
-                self.consume_dash_match_token()
-            elif self.current_code_point == CSSTokenizer.at_sign:
-                self.consume_commercial_at_token()
-            elif self.current_code_point == CSSTokenizer.tilde:
-                self.consume_include_match_token()
-            else:
-                self.consume_delim_token()
+        else:
+            resync = len(old)
+            old_end = None
+        self._pos = self._length
+        self._splice_errors(old_errors, unstored, start, end, delta,
+                            restart, old_end)
+
+        tail_starts = old_starts[resync:]
+        tail_ends = old_ends[resync:]
+        if delta:
+            tail_starts = array('I', [offset + delta
+                                      for offset in tail_starts])
+            tail_ends = array('I', [offset + delta for offset in tail_ends])
+        self._tokens = deque(old[:kept] + new + old[resync:])
+        self.starts = old_starts[:kept] + new_starts + tail_starts
+        self.ends = old_ends[:kept] + new_ends + tail_ends
+        return kept, resync - kept, len(new)
+
+    def _splice_errors(self, old_errors, unstored, start, end, delta,
+                       restart, old_end):
+        """Merges the parse errors found while re-tokenizing an edit with the
+        old errors outside the part that was re-tokenized.
+
+        Parameters
+        ----------
+        old_errors : list of tuple
+            The code and offset of every error recorded before the edit.
+        unstored : int
+            How many errors there were before the edit beyond `max_errors`.
+        start, end : int
+            The range of the old input that was replaced.
+        delta : int
+            How much longer the input became.
+        restart : int
+            Where re-tokenizing started.
+        old_end : int
+            Where in the old input re-tokenizing stopped, or None if it went on
+            to the end.
+        """
+
+        # Errors are kept in the order a fresh tokenizer would find them:
+        # every decoding error comes before the tokenizer's own errors, and
+        # each kind is found from the start of the input to its end.
+        stored = min(self.error_count, self.max_errors)
+        new_errors = zip(self.error_codes[:stored],
+                         self.error_offsets[:stored])
+        decoded_before, decoded_after = [], []
+        found_before, found_after = [], []
+        for code, offset in old_errors:
+            if code == invalid_utf8:
+                # Only the replacement was decoded again.
+                if offset < start:
+                    decoded_before.append((code, offset))
+                elif offset >= end:
+                    decoded_after.append((code, offset + delta))
+            elif offset < restart:
+                found_before.append((code, offset))
+            elif old_end is not None and offset >= old_end:
+                found_after.append((code, offset + delta))
+        merged = (decoded_before +
+                  [error for error in new_errors if error[0] == invalid_utf8] +
+                  decoded_after + found_before +
+                  [error for error in new_errors if error[0] != invalid_utf8] +
+                  found_after)
+        for index, (code, offset) in enumerate(merged[:self.max_errors]):
+            self.error_codes[index] = code
+            self.error_offsets[index] = offset
+        self.error_count = (len(merged) + unstored +
+                            self.error_count - stored)
+
+    def _consume_token(self):
+        """Consumes the next code point and dispatches to the consumer for the
+        token it begins.
+        """
+
+        dispatch = self._dispatch
+        advance, consumer = dispatch.get(self._source[self._pos],
+                                         dispatch[u'a'])
+        self._pos += advance
+        consumer(self)
 
     def lookahead(self, distance):
         """Peeks along the byte stream to check what the next several code
@@ -893,12 +1536,8 @@ class CSSTokenizer(object):
             placeholder if there are no more values to look at.
         """
 
-        peek = []
-        for i in range(distance):
-            try:
-                peek.append(self.stream[i])
-            except IndexError:
-                peek.append(None)
+        peek = list(self._source[self._pos:self._pos + distance])
+        peek.extend([CSSTokenizer.EOF] * (distance - len(peek)))
         return peek
 
     def consume_next_code_point(self):
@@ -906,30 +1545,23 @@ class CSSTokenizer(object):
         code point.
         """
 
-        self._consume_n_code_points(1)
-        # self.current_code_point = self.stream.popleft()
-        # self.next_code_point = self.stream
+        if self._pos < self._length:
+            self._pos += 1
 
     def _consume_n_code_points(self, n):
         """Consumes an arbitrary number of code points, if possible."""
 
-        for _ in range(n):
-            try:
-                self.current_code_point = self.stream.popleft()
-                self.next_code_point = self.stream
-            except IndexError:
-                break
+        self._pos = min(self._pos + n, self._length)
 
     def reconsume_current_code_point(self):
         """Pushes the current code point onto the front of the stream."""
 
-        self.stream.appendleft(self.current_code_point)
-        self.current_code_point = None
-        self.next_code_point = self.stream
+        if self._pos:
+            self._pos -= 1
 
-    def _starts_identifier(self):
-        """Determines whether or not the current code point and the next two
-        code points start an identifier.
+    def _starts_identifier(self, position=None):
+        """Determines whether or not the three code points starting at
+        `position` (by default the next code point) start an identifier.
 
         Notes
         -----
@@ -948,24 +1580,59 @@ class CSSTokenizer(object):
            |     Return false.
         """
 
-        first, second, third = self.lookahead(3)
-        if first is CSSTokenizer.EOF:
+        source = self._source
+        length = self._length
+        if position is None:
+            position = self._pos
+        if position >= length:
             return False
-        elif first == CSSTokenizer.minus:
-            if second is CSSTokenizer.EOF:
+        first = source[position]
+        if first == CSSTokenizer.minus:
+            position += 1
+            if position >= length:
                 return False
-            elif CSSTokenizer.name_start.match(second):
-                return True
-            elif second == CSSTokenizer.minus:
+            first = source[position]
+            if first == CSSTokenizer.minus:
                 return True
-            elif self._valid_escape(second, third):
-                return True
-        elif CSSTokenizer.name_start.match(first):
-            return True
-        elif self._valid_escape(first, second):
+        if first in _name_start or first >= u'\u0080':
             return True
+        elif first == CSSTokenizer.backslash:
+            return (position + 1 >= length or
+                    source[position + 1] != line_feed)
         return False
 
+    def _starts_number(self, position):
+        """Determines whether or not the three code points starting at
+        `position` start a number.
+
+        Notes
+        -----
+        Look at the first code point:
+
+           | - U+002B PLUS SIGN (+) or U+002D HYPHEN-MINUS (-)
+           |     If the second code point is a digit, return true.  Otherwise,
+           |     if the second code point is a U+002E FULL STOP (.) and the
+           |     third code point is a digit, return true.  Otherwise, return
+           |     false.
+           | - U+002E FULL STOP (.)
+           |     If the second code point is a digit, return true. Otherwise,
+           |     return false.
+           | - digit
+           |     Return true.
+           | - anything else
+           |     Return false.
+        """
+
+        source = self._source
+        first = source[position:position + 1]
+        if first and first in u'+-':
+            position += 1
+            first = source[position:position + 1]
+        if first == CSSTokenizer.full_stop:
+            position += 1
+            first = source[position:position + 1]
+        return bool(first) and first in _digits
+
     def consume_comment(self):
         """Consumes comments within a CSS document but does not store the
         information within them anywhere.
@@ -978,17 +1645,15 @@ class CSSTokenizer(object):
         SOLIDUS (/), or up to an EOF code point. Return to the start of this
         step.
         """
-        ending_asterisk = False
-        if self.next_code_point == CSSTokenizer.asterisk:
-            while self.next_code_point is not None:
-                self.consume_next_code_point()
-                if ending_asterisk:
-                    if self.current_code_point == CSSTokenizer.forward_slash:
-                        return
-                    else:
-                        ending_asterisk = False
-                if self.current_code_point == CSSTokenizer.asterisk:
-                    ending_asterisk = True
+
+        source = self._source
+        if source.startswith(CSSTokenizer.asterisk, self._pos):
+            end = source.find(u'*/', self._pos + 1)
+            if end == -1:
+                self._parse_error(eof_in_comment, self._pos - 1)
+                self._pos = self._length
+            else:
+                self._pos = end + 2
         else:
             self.consume_delim_token()
 
@@ -997,30 +1662,31 @@ class CSSTokenizer(object):
         a WhitespaceToken to the end of the list of tokens.
         """
 
-        self.tokens.append(WhitespaceToken())
-        while (self.next_code_point is not None and
-                CSSTokenizer.whitespace.match(self.next_code_point)):
-            self.consume_next_code_point()
+        self._pos = CSSTokenizer.whitespace_run.match(
+            self._source, self._pos).end()
+        self._tokens.append(_whitespace_token)
+
+    def _scan_digits(self, position):
+        """Returns the offset of the first non-digit at or after `position`."""
+
+        return CSSTokenizer.digit_run.match(self._source, position).end()
 
     def _consume_digits(self):
         """Consumes numeric strings and returns them for further parsing.
 
+        The run starts at the current code point if it is a digit.
+
         Returns
         -------
         digit_string : unicode
             String representing a series of numbers.
         """
 
-        digit_string = u''
-        if CSSTokenizer.digit.match(self.current_code_point):
-            digit_string += self.current_code_point
-        if self.next_code_point is not None:
-            while CSSTokenizer.digit.match(self.next_code_point):
-                self.consume_next_code_point()
-                digit_string += self.current_code_point
-                if self.next_code_point is None:
-                    break
-        return digit_string
+        start = self._pos
+        if start and self._source[start - 1] in _digits:
+            start -= 1
+        self._pos = self._scan_digits(self._pos)
+        return self._source[start:self._pos]
 
     def _consume_number(self):
         """Consumes a number.
@@ -1033,42 +1699,23 @@ class CSSTokenizer(object):
             type (integer or not) of the number.
         """
 
-        string_representation = ''
-        type_flag = 'integer'
-
-        # Optional sign of the number
-        if self.current_code_point in [CSSTokenizer.plus, CSSTokenizer.minus]:
-            string_representation += self.current_code_point
-
-        # Value before the decimal point
-        string_representation += self._consume_digits()
-
-        # Values after the decimal point
-        if CSSTokenizer.full_stop == self.next_code_point:
-            self.consume_next_code_point()
-            if CSSTokenizer.digit.match(self.next_code_point):
-                type_flag = 'number'
-                string_representation += self.current_code_point
-                string_representation += self._consume_digits()
-
-        # Scientific notation
-        if self.next_code_point in ['e', 'E']:
-            possible_scientific_notation = ''
-            self.consume_next_code_point()
-            possible_scientific_notation += self.current_code_point
-
-            # Optional sign of the number
-            if self.next_code_point in [CSSTokenizer.plus, CSSTokenizer.minus]:
-                self.consume_next_code_point()
-                possible_scientific_notation += self.current_code_point
-
-            # Values after the (optional) sign
-            if CSSTokenizer.digit.match(self.next_code_point):
-                type_flag = 'number'
-                possible_scientific_notation += self._consume_digits()
-                string_representation += possible_scientific_notation
-
-        numeric_value = CSSTokenizer._string_to_number(string_representation)
+        match = CSSTokenizer.number.match(self._source, self._pos)
+        integer, fractional, exponent = match.groups()
+        is_integer = fractional is None and exponent is None
+        type_flag = 'integer' if is_integer else 'number'
+        self._pos = match.end()
+        if integer:
+            string_representation = match.group()
+        else:
+            # A leading decimal point is normalised to `0.`
+            integer_start = match.start(1)
+            string_representation = (
+                self._source[match.start():integer_start] + u'0' +
+                self._source[integer_start:self._pos])
+        if is_integer:
+            numeric_value = int(string_representation)
+        else:
+            numeric_value = float(string_representation)
 
         return string_representation, numeric_value, type_flag
 
@@ -1078,19 +1725,16 @@ class CSSTokenizer(object):
         """
 
         string_repr, numeric_value, type_flag = self._consume_number()
-        if self.next_code_point == CSSTokenizer.percent:
-            self.consume_next_code_point()
-            self.tokens.append(PercentageToken(string_repr, numeric_value))
+        if self._starts_identifier():
+            name = self._consume_name()
+            self._tokens.append(DimensionToken(
+                string_repr, numeric_value, type_flag, name))
+        elif self._source.startswith(CSSTokenizer.percent, self._pos):
+            self._pos += 1
+            self._tokens.append(PercentageToken(string_repr, numeric_value))
         else:
-            if self.next_code_point is not None:
-                self.consume_next_code_point()
-                if self._starts_identifier():
-                    name = self._consume_name()
-                    self.tokens.append(DimensionToken(
-                        string_repr, numeric_value, type_flag, name))
-            else:
-                self.tokens.append(
-                    NumberToken(string_repr, numeric_value, type_flag))
+            self._tokens.append(
+                NumberToken(string_repr, numeric_value, type_flag))
 
     def handle_plus_sign(self):
         """Handles the case where the current code point is U+002B PLUS SIGN.
@@ -1100,11 +1744,11 @@ class CSSTokenizer(object):
         <delim-token> with its value set to the current input code point.
         """
 
-        if self.next_code_point is not CSSTokenizer.EOF:
-            if CSSTokenizer.digit.match(self.next_code_point):
-                self.consume_numeric_token()
-                return
-        self.consume_delim_token()
+        if self._starts_number(self._pos - 1):
+            self._pos -= 1
+            self.consume_numeric_token()
+        else:
+            self.consume_delim_token()
 
     def handle_minus_sign(self):
         """Handles the case where the current code point is U+002D HYPHEN-MINUS
@@ -1123,23 +1767,17 @@ class CSSTokenizer(object):
         input code point.
         """
 
-        if self.next_code_point is not CSSTokenizer.EOF:
-            if CSSTokenizer.digit.match(self.next_code_point):
-                self.consume_numeric_token()
-                return
-            elif self.lookahead(2) == [CSSTokenizer.minus,
-                                       CSSTokenizer.greater_than]:
-                self.consume_CDC_token()
-                return
-            self.consume_next_code_point()
-            if self._starts_identifier():
-                self.reconsume_current_code_point()
-                self.stream.appendleft(u'\u002D')
-                self.consume_ident_like_token()
-                return
-        self.reconsume_current_code_point()
-        self.current_code_point = u'\u002D'
-        self.consume_delim_token()
+        start = self._pos - 1
+        if self._starts_number(start):
+            self._pos = start
+            self.consume_numeric_token()
+        elif self._source.startswith(u'->', self._pos):
+            self.consume_CDC_token()
+        elif self._starts_identifier(start):
+            self._pos = start
+            self.consume_ident_like_token()
+        else:
+            self.consume_delim_token()
 
     def handle_period(self):
         """Handles the case where the current code point is a U+002E FULL STOP.
@@ -1151,241 +1789,1040 @@ class CSSTokenizer(object):
         input code point.
         """
 
-        if self.next_code_point is not CSSTokenizer.EOF:
-            if CSSTokenizer.digit.match(self.next_code_point):
-                self.stream.extendleft('.0')   # extendleft reverses the order
-                self.consume_numeric_token()
-                return
-        self.consume_delim_token()
-
-    def _consume_name(self):
-        result = ''
-        if self.current_code_point is not CSSTokenizer.EOF:
-            if CSSTokenizer.name.match(self.current_code_point):
-                result += self.current_code_point
-        while self.stream:
-            self.consume_next_code_point()
-            if CSSTokenizer.name.match(self.current_code_point):
-                result += self.current_code_point
-            elif self._valid_escape(self.current_code_point,
-                                    self.next_code_point):
-                result += self.consume_escape_token()
-            else:
-                self.reconsume_current_code_point()
-                break
-        return result
+        if self._starts_number(self._pos - 1):
+            self._pos -= 1
+            self.consume_numeric_token()
+        else:
+            self.consume_delim_token()
+
+    def handle_backslash(self):
+        """Handles the case where the current code point is a U+005C REVERSE
+        SOLIDUS (\).
+
+        If the input stream starts with a valid escape, reconsume the current
+        input code point, consume an ident-like token, and return it.
+
+        Otherwise, this is a parse error. Return a <delim-token> with its value
+        set to the current input code point.
+        """
+
+        if self._starts_identifier(self._pos - 1):
+            self._pos -= 1
+            self.consume_ident_like_token()
+        else:
+            self._parse_error(invalid_escape, self._pos - 1)
+            self.consume_delim_token()
+
+    def _consume_name(self, intern=True):
+        """Consumes the name that starts at the next code point.
+
+        Parameters
+        ----------
+        intern : bool
+            Whether to intern the name in `names` if it is not in
+            `vocabulary`.
+
+        Returns
+        -------
+        unicode
+            The name, with any escapes replaced by the code points they stand
+            for.
+        """
+
+        source = self._source
+        match = CSSTokenizer.name_run.match(source, self._pos)
+        position = match.end()
+        if not source.startswith(CSSTokenizer.backslash, position):
+            name = match.group()
+        else:
+            result = [match.group()]
+            while (source.startswith(CSSTokenizer.backslash, position) and
+                   source[position + 1:position + 2] != line_feed):
+                self._pos = position + 1
+                result.append(self.consume_escape_token())
+                match = CSSTokenizer.name_run.match(source, self._pos)
+                result.append(match.group())
+                position = match.end()
+            name = u''.join(result)
+        self._pos = position
+        interned = _vocabulary_names.get(name)
+        if interned is not None:
+            return interned
+        if intern:
+            return self._intern(name, name)
+        return name
 
     def consume_ident_like_token(self):
+        """Consumes an ident-like token: IdentToken, FunctionToken, URLToken
+        or BadURLToken.
+        """
+
         name = self._consume_name()
-        next_is_lparen = (self.next_code_point == CSSTokenizer.lparen)
-        if CSSTokenizer.url.match(name) and next_is_lparen:
-            self.consume_next_code_point()
-            first, second = self.lookahead(2)
-            if first is None:
-                self.consume_url_token()
-                return
-            elif second is None:
-                if CSSTokenizer.quotations.match(first):
-                    self.tokens.append(FunctionToken(name))
-                    return
+        source = self._source
+        if source.startswith(CSSTokenizer.lparen, self._pos):
+            self._pos += 1
+            if len(name) == 3 and name.lower() == u'url':
+                length = self._length
+                position = self._pos
+                while (position + 1 < length and
+                       source[position] in _whitespace and
+                       source[position + 1] in _whitespace):
+                    position += 1
+                self._pos = position
+                first = source[position:position + 1]
+                if first in _whitespace:
+                    first = source[position + 1:position + 2]
+                if first and first in u'\u0022\u0027':
+                    self._tokens.append(FunctionToken(name))
                 else:
                     self.consume_url_token()
-            while (CSSTokenizer.whitespace.match(first) and
-                   CSSTokenizer.whitespace.match(second)):
-                self.consume_next_code_point()
-
-            if ((CSSTokenizer.whitespace.match(first) and
-                    CSSTokenizer.quotations.match(second)) or
-                    (CSSTokenizer.quotations.match(first))):
-                self.tokens.append(FunctionToken(name))
             else:
-                self.consume_url_token()
-        elif next_is_lparen:
-            self.consume_next_code_point()
-            self.tokens.append(FunctionToken(name))
-        self.tokens.append(IdentToken(name))
+                self._tokens.append(FunctionToken(name))
+        else:
+            self._tokens.append(IdentToken(name))
 
     def consume_url_token(self):
-        result = ''
-        while CSSTokenizer.whitespace.match(self.next_code_point):
-            self.consume_next_code_point()
-        if self.next_code_point is None:
-            self.tokens.append(URLToken(result))
-        else:
-            while self.stream:
-                self.consume_next_code_point()
-                if (self.current_code_point == CSSTokenizer.rparen or
-                        self.next_code_point is None):
+        """Consumes the body of a url, up to and including the closing
+        parenthesis.  The `url(` prefix has already been consumed.
+        """
+
+        source = self._source
+        length = self._length
+        url_run = CSSTokenizer.url_run
+        whitespace_run = CSSTokenizer.whitespace_run
+        lparen = self._pos - 1
+        position = whitespace_run.match(source, self._pos).end()
+        result = []
+        while position < length:
+            match = url_run.match(source, position)
+            result.append(match.group())
+            position = match.end()
+            if position >= length:
+                self._parse_error(eof_in_url, lparen)
+                break
+            code_point = source[position]
+            position += 1
+            if code_point == CSSTokenizer.rparen:
+                break
+            elif code_point in _whitespace:
+                position = whitespace_run.match(source, position).end()
+                if position < length:
+                    if source[position] != CSSTokenizer.rparen:
+                        self._parse_error(bad_url, position)
+                        self._pos = position
+                        self.consume_bad_url_token()
+                        return
+                    position += 1
                     break
-                elif (self.current_code_point == CSSTokenizer.lparen or
-                      CSSTokenizer.quotations.match(self.current_code_point) or
-                      CSSTokenizer.non_printable.match(
-                        self.current_code_point)):
-                    # This is a parse error
+                self._parse_error(eof_in_url, lparen)
+                break
+            elif (code_point in u'\u0022\u0027\u0028' or
+                  code_point in _non_printable):
+                self._parse_error(bad_url, position - 1)
+                self._pos = position
+                self.consume_bad_url_token()
+                return
+            elif code_point == CSSTokenizer.backslash:
+                if source[position:position + 1] == line_feed:
+                    self._parse_error(bad_url, position - 1)
+                    self._pos = position
                     self.consume_bad_url_token()
                     return
-                elif self.current_code_point == CSSTokenizer.backslash:
-                    if self._valid_escape(self.current_code_point,
-                                          self.next_code_point):
-                        result += self.consume_escape_token()
-                    else:
-                        # This is a parse error
-                        self.consume_bad_url_token()
-                        return
-                else:
-                    result += self.current_code_point
-            self.tokens.append(URLToken(result))
+                self._pos = position
+                result.append(self.consume_escape_token())
+                position = self._pos
+            else:
+                result.append(code_point)
+        else:
+            self._parse_error(eof_in_url, lparen)
+        self._pos = position
+        self._tokens.append(URLToken(u''.join(result)))
 
     def consume_bad_url_token(self):
-        while self.stream:
-            try:
-                self.consume_next_code_point()
-            except IndexError:
+        """Consumes the remnants of a bad url, up to and including the closing
+        parenthesis, and adds a BadURLToken.
+        """
+
+        source = self._source
+        length = self._length
+        position = self._pos
+        while position < length:
+            code_point = source[position]
+            position += 1
+            if code_point == CSSTokenizer.rparen:
                 break
-            else:
-                if self.current_code_point == ')':
-                    break
-                elif self._valid_escape(self.current_code_point,
-                                        self.next_code_point):
-                    self.consume_escape_token()
-                else:
-                    pass
-        return
+            elif (code_point == CSSTokenizer.backslash and
+                  source[position:position + 1] != line_feed):
+                self._pos = position
+                self.consume_escape_token()
+                position = self._pos
+        self._pos = position
+        self._tokens.append(_bad_url_token)
 
     def consume_literal_token(self):
-        self.tokens.append(LiteralToken(self.current_code_point))
+        self._tokens.append(self._literals[self._source[self._pos - 1]])
 
     def consume_string_token(self):
-        result = ''
-        if self.current_code_point == CSSTokenizer.double_quote:
-            end_code_point = CSSTokenizer.double_quote
-        else:
-            end_code_point = CSSTokenizer.single_quote
-
-        try:
-            self.consume_next_code_point()
-        except IndexError:   # EOF
-            self.tokens.append(StringToken(result))
+        """Consumes a string delimited by the current code point."""
+
+        source = self._source
+        length = self._length
+        end_code_point = source[self._pos - 1]
+        run = CSSTokenizer.string_runs[end_code_point]
+        match = run.match(source, self._pos)
+        position = match.end()
+        if source.startswith(end_code_point, position):
+            self._pos = position + 1
+            self._tokens.append(StringToken(match.group()))
+            return
+        quote = self._pos - 1
+        result = [match.group()]
+        while position < length:
+            code_point = source[position]
+            position += 1
+            if code_point == end_code_point:
+                break
+            elif code_point == line_feed:
+                self._parse_error(newline_in_string, quote)
+                self._pos = position - 1
+                self._tokens.append(_bad_string_token)
+                return
+            # Otherwise this is a backslash
+            elif position >= length:
+                self._parse_error(eof_in_string, quote)
+                break
+            elif source[position] == line_feed:
+                position += 1
+            else:
+                self._pos = position
+                result.append(self.consume_escape_token())
+                position = self._pos
+            match = run.match(source, position)
+            result.append(match.group())
+            position = match.end()
         else:
-            while self.stream:
-                self.consume_next_code_point()
-                if self.current_code_point == end_code_point:
-                    break
-                elif CSSTokenizer.newline.match(self.current_code_point):
-                    # This is a parse error
-                    self.reconsume_current_code_point()
-                    self.tokens.append(BadStringToken())
-                    return
-                elif self.current_code_point == CSSTokenizer.backslash:
-                    if self.next_code_point is None:
-                        break
-                    elif CSSTokenizer.newline.match(self.next_code_point):
-                        self.consume_next_code_point()
-                    else:
-                        result += self.consume_escape_token()
-                else:
-                    result += self.current_code_point
-            self.tokens.append(StringToken(result))
+            self._parse_error(eof_in_string, quote)
+        self._pos = position
+        self._tokens.append(StringToken(u''.join(result)))
 
     def consume_hash_token(self):
-        type_flag = 'unrestricted'
-        peek = self.lookahead(2)
-        valid_escape = self._valid_escape(*peek)
-        if CSSTokenizer.name.match(self.next_code_point) or valid_escape:
+        source = self._source
+        position = self._pos
+        next_code_point = source[position:position + 1]
+        if next_code_point and (
+                next_code_point in _name or next_code_point >= u'\u0080' or
+                self._valid_escape(next_code_point,
+                                   source[position + 1:position + 2])):
             if self._starts_identifier():
                 type_flag = 'id'
-            name = self._consume_name()
-            self.tokens.append(HashToken(name, type_flag))
+            else:
+                type_flag = 'unrestricted'
+            name = self._consume_name(False)
+            self._tokens.append(HashToken(name, type_flag))
         else:
             self.consume_delim_token()
 
     def consume_prefix_match_token(self):
-        if self.next_code_point == CSSTokenizer.equals_sign:
-            self.consume_next_code_point()
-            self.tokens.append(PrefixMatchToken())
+        if self._source.startswith(CSSTokenizer.equals_sign, self._pos):
+            self._pos += 1
+            self._tokens.append(_prefix_match_token)
         else:
             self.consume_delim_token()
 
     def consume_suffix_match_token(self):
-        if self.next_code_point == CSSTokenizer.equals_sign:
-            self.consume_next_code_point()
-            self.tokens.append(SuffixMatchToken())
+        if self._source.startswith(CSSTokenizer.equals_sign, self._pos):
+            self._pos += 1
+            self._tokens.append(_suffix_match_token)
         else:
             self.consume_delim_token()
 
     def consume_substring_match_token(self):
-        if self.next_code_point == CSSTokenizer.equals_sign:
-            self.consume_next_code_point()
-            self.tokens.append(SubstringMatchToken())
+        if self._source.startswith(CSSTokenizer.equals_sign, self._pos):
+            self._pos += 1
+            self._tokens.append(_substring_match_token)
+        else:
+            self.consume_delim_token()
 
     def consume_CDO_token(self):
-        if self.lookahead(3) == [CSSTokenizer.exclamation_point,
-                                 CSSTokenizer.minus,
-                                 CSSTokenizer.minus]:
-            self.consume_next_code_point()
-            self.consume_next_code_point()
-            self.consume_next_code_point()
-            self.tokens.append(CDOToken())
+        if self._source.startswith(u'!--', self._pos):
+            self._pos += 3
+            self._tokens.append(_CDO_token)
         else:
             self.consume_delim_token()
 
     def consume_CDC_token(self):
-        self.consume_next_code_point()
-        self.consume_next_code_point()
-        self.tokens.append(CDCToken())
+        self._pos += 2
+        self._tokens.append(_CDC_token)
 
     def consume_escape_token(self):
-        try:
-            self.consume_next_code_point()
-        except IndexError:   # EOF
+        """Consumes an escaped code point.  The U+005C REVERSE SOLIDUS (\) has
+        already been consumed.
+
+        Returns
+        -------
+        unicode
+            The code point represented by the escape.
+        """
+
+        source = self._source
+        length = self._length
+        position = self._pos
+        if position >= length:   # EOF
+            self._parse_error(eof_in_escape, position - 1)
             return replacement_character
-        else:
-            if CSSTokenizer.hex_digit.match(self.current_code_point):
-                hex_string = self.current_code_point
-                while (CSSTokenizer.hex_digit.match(self.current_code_point)and
-                       len(hex_string) <= 6):
-                    try:
-                        self.consume_next_code_point()
-                    except IndexError:   # empty deque
-                        break
-                    else:
-                        hex_string += self.current_code_point
-                hex_number = int(hex_string, 16)
-                surrogate = CSSTokenizer.surrogate.match(unichr(hex_number))
-                invalid_code_point = hex_number > int("10FFFF", 16)
-                if hex_number == 0 or surrogate or invalid_code_point:
-                    return replacement_character
-                else:
-                    return str(hex_number)
-            else:
-                if self.current_code_point is not CSSTokenizer.EOF:
-                    return self.current_code_point
-                else:
-                    return replacement_character
+        code_point = source[position]
+        if code_point not in _hex_digits:
+            self._pos = position + 1
+            return code_point
+        end = position + 1
+        limit = min(position + 6, length)
+        while end < limit and source[end] in _hex_digits:
+            end += 1
+        hex_number = int(source[position:end], 16)
+        if end < length and source[end] in _whitespace:
+            end += 1
+        self._pos = end
+        surrogate = 0xD800 <= hex_number <= 0xDFFF
+        if hex_number == 0 or surrogate or hex_number > _max_code_point:
+            return replacement_character
+        return _unichr(hex_number)
 
     def consume_dash_match_token(self):
-        if self.next_code_point == CSSTokenizer.equals_sign:
-            self.consume_next_code_point()
-            self.tokens.append(DashMatchToken())
-        elif self.next_code_point == CSSTokenizer.vertical:
-            self.consume_next_code_point()
-            self.tokens.append(ColumnToken())
+        source = self._source
+        if source.startswith(CSSTokenizer.equals_sign, self._pos):
+            self._pos += 1
+            self._tokens.append(_dash_match_token)
+        elif source.startswith(CSSTokenizer.vertical, self._pos):
+            self._pos += 1
+            self._tokens.append(_column_token)
         else:
             self.consume_delim_token()
 
     def consume_include_match_token(self):
-        if self.next_code_point == CSSTokenizer.equals_sign:
-            self.consume_next_code_point()
-            self.tokens.append(IncludeMatchToken())
+        if self._source.startswith(CSSTokenizer.equals_sign, self._pos):
+            self._pos += 1
+            self._tokens.append(_include_match_token)
         else:
             self.consume_delim_token()
 
     def consume_delim_token(self):
-        self.tokens.append(DelimToken(self.current_code_point))
+        self._tokens.append(DelimToken(self._source[self._pos - 1]))
 
     def consume_commercial_at_token(self):
         if self._starts_identifier():
             name = self._consume_name()
-            self.tokens.append(AtKeywordToken(name))
+            self._tokens.append(AtKeywordToken(name))
         else:
             self.consume_delim_token()
+
+
+CSSTokenizer._dispatch = CSSTokenizer._build_dispatch_table()
+CSSTokenizer._literals = dict((code_point, LiteralToken(code_point))
+                              for code_point in CSSTokenizer.literal_tokens)
+
+
+class ChunkedCSSTokenizer(CSSTokenizer):
+    """Tokenizes CSS that is read and preprocessed a chunk at a time.
+
+    Only the unconsumed tail of the input is kept in memory, so peak memory is
+    bounded by the chunk size plus the longest token rather than by the size
+    of the document.  State that straddles a chunk boundary is carried over:
+    a UTF-8 sequence split across chunks is decoded once it is complete, a
+    U+000D CARRIAGE RETURN at the end of a chunk waits to see whether a U+000A
+    LINE FEED follows it, and a token that runs up to the end of the buffer is
+    re-consumed once more input has arrived.
+
+    Parameters
+    ----------
+    source : file, mmap.mmap or iterable
+        A file object or `mmap` to read from, or an iterable of chunks.  Chunks
+        may be UTF-8 encoded bytes or unicode.
+    chunk_size : int
+        How many bytes to read at a time from a file object or `mmap`.
+    positions : bool
+        Whether to record the offsets of every token, as for `CSSTokenizer`.
+        The offsets count from the start of the whole input, not of the
+        buffer.
+    names : dict
+        The table names are interned in, as for `CSSTokenizer`.
+    on_error : callable
+        Called with a `ParseError` for every parse error.
+    collect_errors : bool
+        Whether to record parse errors at all.
+
+    Notes
+    -----
+    A token that ends closer than `lookahead_margin` to the end of the buffer
+    is only emitted once more input has arrived.  Before it is consumed again
+    the buffer is at least doubled, so a token spanning many chunks, such as a
+    large `data:` URL, still takes time linear in its length.
+    """
+
+    def __init__(self, source, chunk_size=65536, positions=False,
+                 names=None, on_error=None, collect_errors=True):
+        super(ChunkedCSSTokenizer, self).__init__(u'', positions, names,
+                                                  on_error, collect_errors)
+        self._pending_errors = []
+        self._comment_start = None
+        self._newlines = array('I')
+        self._chunks = _read_chunks(source, chunk_size)
+        self._undecoded = b''
+        self._invalid_utf8 = False
+        if collect_errors:
+            self._decode_error = self._add_error
+        else:
+            self._decode_error = _ignore_error
+        self._carriage_return = u''
+        self._exhausted = False
+
+    def apply_edit(self, start, end, replacement):
+        """Not supported: the input before the buffer has been discarded.
+
+        Raises
+        ------
+        ValueError
+            Always.
+        """
+
+        raise ValueError('Editing needs the whole input, which a chunked '
+                         'tokenizer does not keep; use CSSTokenizer')
+
+    def _record_error(self, code, offset):
+        """Holds on to a parse error until the token it was found in is
+        emitted; a token that runs into the end of the buffer is consumed
+        again, and may turn out fine, once more input has arrived.
+        """
+
+        offset += self._base
+        if code == eof_in_comment and self._comment_start is not None:
+            # The start of the comment has been dropped from the buffer.
+            offset = self._comment_start
+        self._pending_errors.append((code, offset))
+
+    def _report_invalid_utf8(self, offset, message):
+        # Chunks are never read again, so unlike the tokenizer's own errors
+        # this one is recorded at once.
+        self._decode_error(invalid_utf8, offset)
+
+    def _decode(self, chunk, offset, final=False):
+        """Decodes a chunk of UTF-8, holding back a sequence that is split
+        across the end of it.
+
+        Like `preprocessing`, the first invalid sequence in the input is
+        reported, at `offset` plus the code points preprocessed before it.
+        """
+
+        data = self._undecoded + chunk
+        try:
+            text, consumed = codecs.utf_8_decode(data, 'strict', final)
+        except UnicodeDecodeError as error:
+            text, consumed = codecs.utf_8_decode(data, decode_errors, final)
+            if not self._invalid_utf8:
+                self._invalid_utf8 = True
+                before = self._carriage_return + data[:error.start].decode(
+                    'UTF-8')
+                self._report_invalid_utf8(
+                    offset + len(_replace_characters(before)),
+                    parse_error_messages[invalid_utf8])
+        self._undecoded = data[consumed:]
+        return text
+
+    def _read_chunk(self, minimum=1):
+        """Reads, decodes and preprocesses chunks onto the end of the
+        unconsumed input, until at least `minimum` code points have been
+        added or the input runs out.  The unconsumed input is copied once
+        however many chunks are read.
+        """
+
+        self._base += self._pos
+        end = self._base + self._length - self._pos
+        texts = []
+        added = 0
+        while added < minimum and not self._exhausted:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._exhausted = True
+                text = self._decode(b'', end + added, True)
+            elif isinstance(chunk, unicode):
+                text = chunk
+            else:
+                text = self._decode(chunk, end + added)
+            text = self._carriage_return + text
+            if not self._exhausted and text.endswith(u'\u000D'):
+                self._carriage_return = u'\u000D'
+                text = text[:-1]
+            else:
+                self._carriage_return = u''
+            text = _replace_characters(text)
+            self._newlines.extend(_newline_offsets(text, end + added))
+            texts.append(text)
+            added += len(text)
+        self._source = self._source[self._pos:] + u''.join(texts)
+        self._length = len(self._source)
+        self._pos = 0
+
+    def tokenize_stream(self):
+        """Tokenizes the whole input, collecting every token in `tokens` and,
+        with positions, their offsets in `starts` and `ends`.
+        """
+
+        self._tokens.extend(list(self._iter_tokens(self.positions)))
+
+    def _iter_tokens(self, record):
+        """Reads and tokenizes the input on demand, as `iter_tokens` does.
+
+        Parameters
+        ----------
+        record : bool
+            With positions, whether to append the offsets of each token to
+            `starts` and `ends` rather than set them on the token.
+        """
+
+        tokens = self._tokens
+        while tokens:
+            yield tokens.popleft()
+        dispatch = self._dispatch
+        name_start = dispatch[u'a']
+        margin = self.lookahead_margin
+        positions = self.positions
+        starts, ends = self.starts, self.ends
+        pending_errors = self._pending_errors
+        comment_start = self._comment_start
+        while True:
+            source = self._source
+            length = self._length
+            if self._exhausted:
+                safe = length
+            else:
+                safe = length - margin
+            minimum = 1
+            while self._pos < safe:
+                start = self._pos
+                if (source.startswith(u'/*', start) and
+                        source.find(u'*/', start + 2) == -1 and
+                        not self._exhausted):
+                    # Keep only what is needed to see the comment close.
+                    if comment_start is None:
+                        comment_start = self._comment_start = (
+                            self._base + start)
+                    keep = max(start + 2, length - 1)
+                    self._source = u'/*' + source[keep:]
+                    self._base += keep - 2
+                    self._length = len(self._source)
+                    self._pos = 0
+                    break
+                advance, consumer = dispatch.get(source[start], name_start)
+                self._pos += advance
+                consumer(self)
+                if self._pos > safe:
+                    # The token may carry on into the next chunk.  Double
+                    # what is buffered before trying again, so that a token
+                    # spanning many chunks is only rescanned a few times.
+                    tokens.clear()
+                    del pending_errors[:]
+                    self._pos = start
+                    minimum = length - start
+                    break
+                if comment_start is not None:
+                    comment_start = self._comment_start = None
+                if pending_errors:
+                    for error in pending_errors:
+                        self._add_error(*error)
+                    del pending_errors[:]
+                if tokens:
+                    if record:
+                        starts.append(self._base + start)
+                        ends.append(self._base + self._pos)
+                    elif positions:
+                        token = tokens[-1]
+                        cls = token.__class__
+                        if cls in _shared_types:
+                            value = token.value
+                            token = tokens[-1] = cls.__new__(cls)
+                            token.value = value
+                        token.start = self._base + start
+                        token.end = self._base + self._pos
+                    yield tokens.popleft()
+            if self._exhausted:
+                return
+            self._read_chunk(minimum)
+
+
+class TokenColumns(object):
+    """Tokens stored column-wise in compact arrays.
+
+    Row `i` of every column describes the `i`th token.  Token objects are only
+    built when a row is accessed, by indexing or iterating.  The arrays
+    support the buffer protocol, so they can be handed to NumPy as they are,
+    e.g. `numpy.frombuffer(columns.types, numpy.uint8)`.
+
+    Parameters
+    ----------
+    source : unicode
+        The preprocessed code points the offsets refer to.
+
+    Attributes
+    ----------
+    kinds : tuple
+        The `(token class, flag)` pair each type code stands for.  The flag is
+        the `type_` of numeric tokens, the `type_flag` of hash tokens and None
+        for everything else.
+    source : unicode
+        The preprocessed code points the offsets refer to.
+    types : array.array
+        The type code of each token, an index into `kinds`.
+    starts, ends : array.array
+        The offsets of the first code point of each token and of the code point
+        just after it.
+    numbers : array.array
+        The numeric value of number, percentage and dimension tokens, 0.0 for
+        everything else.  Integers are rebuilt exactly from their string
+        representation, so one too large for a double is stored as an
+        infinity.
+    strings : array.array
+        The index into `string_table` of each token's value, or of its string
+        representation for numeric tokens.
+    units : array.array
+        The index into `string_table` of the unit of dimension tokens, 0 (the
+        empty string) for everything else.
+    string_table : list
+        Every distinct string value and unit, each stored once.
+    """
+
+    kinds = (
+        (WhitespaceToken, None),
+        (NumberToken, 'integer'),
+        (NumberToken, 'number'),
+        (DimensionToken, 'integer'),
+        (DimensionToken, 'number'),
+        (PercentageToken, 'number'),
+        (IdentToken, None),
+        (FunctionToken, None),
+        (URLToken, None),
+        (BadURLToken, None),
+        (LiteralToken, None),
+        (StringToken, None),
+        (BadStringToken, None),
+        (HashToken, 'id'),
+        (HashToken, 'unrestricted'),
+        (DelimToken, None),
+        (SuffixMatchToken, None),
+        (SubstringMatchToken, None),
+        (PrefixMatchToken, None),
+        (CDOToken, None),
+        (CDCToken, None),
+        (DashMatchToken, None),
+        (IncludeMatchToken, None),
+        (ColumnToken, None),
+        (AtKeywordToken, None),
+    )
+    _codes = dict((kind, code) for code, kind in enumerate(kinds))
+    _plain_codes = dict((cls, code) for (cls, flag), code in _codes.items()
+                        if flag is None)
+
+    def __init__(self, source):
+        self.source = source
+        self.types = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.numbers = array('d')
+        self.strings = array('I')
+        self.units = array('I')
+        self.string_table = [u'']
+        self._string_index = {u'': 0}
+
+    def _appender(self):
+        """Builds a function that encodes a token as a new row, with every
+        column bound locally.
+        """
+
+        types = self.types.append
+        starts = self.starts.append
+        ends = self.ends.append
+        numbers = self.numbers.append
+        strings = self.strings.append
+        units = self.units.append
+        string_table = self.string_table
+        string_index = self._string_index
+        get_index = string_index.get
+        codes = self._codes
+        plain_codes = self._plain_codes
+
+        def intern(string):
+            index = get_index(string)
+            if index is None:
+                index = string_index[string] = len(string_table)
+                string_table.append(string)
+            return index
+
+        def append(token, start, end):
+            cls = type(token)
+            code = plain_codes.get(cls)
+            if code is not None:
+                types(code)
+                numbers(0.0)
+                strings(intern(token.value))
+                units(0)
+            elif cls is HashToken:
+                types(codes[cls, token.type_flag])
+                numbers(0.0)
+                strings(intern(token.value))
+                units(0)
+            else:
+                types(codes[cls, token.type_])
+                try:
+                    numbers(token.value)
+                except OverflowError:
+                    # An integer beyond the range of a double.
+                    numbers(float('inf') if token.value > 0 else -float('inf'))
+                strings(intern(token.string))
+                units(intern(token.unit) if cls is DimensionToken else 0)
+            starts(start)
+            ends(end)
+
+        return append
+
+    def append(self, token, start, end):
+        """Encodes a token as a new row.
+
+        Parameters
+        ----------
+        token : CSSToken
+            The token to store.
+        start, end : int
+            The offsets of the token in `source`.
+        """
+
+        self._appender()(token, start, end)
+
+    def token(self, index, positions=False):
+        """Builds the token object for a row.
+
+        Parameters
+        ----------
+        index : int
+            The row to build.
+        positions : bool
+            Whether to set the `start` and `end` of the token.  The token is
+            then always a new object, never a shared instance.
+
+        Returns
+        -------
+        CSSToken
+            The token stored in that row.
+        """
+
+        cls, flag = self.kinds[self.types[index]]
+        string = self.string_table[self.strings[index]]
+        if cls in _shared_tokens:
+            token = cls() if positions else _shared_tokens[cls]
+        elif cls is LiteralToken:
+            if positions:
+                token = LiteralToken(string)
+            else:
+                token = CSSTokenizer._literals[string]
+        elif cls is HashToken:
+            token = HashToken(string, flag)
+        elif not issubclass(cls, NumberToken):
+            token = cls(string)
+        else:
+            if _is_integer(string):
+                number = int(string)
+            else:
+                number = self.numbers[index]
+            if cls is PercentageToken:
+                token = PercentageToken(string, number)
+            elif cls is DimensionToken:
+                token = DimensionToken(string, number, flag,
+                                       self.string_table[self.units[index]])
+            else:
+                token = NumberToken(string, number, flag)
+        if positions:
+            token.start = self.starts[index]
+            token.end = self.ends[index]
+        return token
+
+    def _extend(self, types, starts, ends, numbers, strings, units,
+                string_table):
+        """Appends the rows of other columns, which index their own string
+        table.
+        """
+
+        string_index = self._string_index
+        for string in string_table:
+            if string not in string_index:
+                string_index[string] = len(self.string_table)
+                self.string_table.append(string)
+        remap = [string_index[string] for string in string_table]
+        if remap != range(len(remap)):
+            strings = array('I', map(remap.__getitem__, strings))
+            units = array('I', map(remap.__getitem__, units))
+        self.types.extend(types)
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+        self.numbers.extend(numbers)
+        self.strings.extend(strings)
+        self.units.extend(units)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.token(i) for i in xrange(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('token index out of range')
+        return self.token(index)
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self.token(index)
+
+
+# Integer values are rebuilt from their string representation, exactly.
+_is_integer = re.compile(u'[+-]?[0-9]+$').match
+
+
+def _tokenize_part(part):
+    """Tokenizes one part of a document for `tokenize_parallel`.
+
+    Parameters
+    ----------
+    part : tuple
+        The preprocessed code points of the part and the offset of the part
+        within the document.
+
+    Returns
+    -------
+    tuple
+        The columns of the part's `TokenColumns`, in the order `_extend` takes
+        them.
+    """
+
+    text, base = part
+    tokenizer = CSSTokenizer(text)
+    tokenizer._base = base
+    columns = tokenizer.tokenize_columns()
+    return (columns.types, columns.starts, columns.ends, columns.numbers,
+            columns.strings, columns.units, columns.string_table)
+
+
+# The typecodes of the arrays `_tokenize_part` returns, in order.
+_part_typecodes = 'BIIdII'
+
+
+def _try_tokenize_part(part):
+    """Tokenizes one part of a document in a worker process.
+
+    A part that was not split on a token boundary may start in the middle of
+    anything, so any error it raises only means the split was wrong.  The part
+    is then reported as None; if the split was in fact right, tokenizing it
+    again in the parent raises the error the serial tokenizer would.
+
+    Returns
+    -------
+    tuple
+        The arrays of `_tokenize_part` as byte strings, which pickle in a
+        single copy where an array pickles as a list of numbers, and the
+        string table; or None.
+    """
+
+    try:
+        columns = _tokenize_part(part)
+    except Exception:
+        return None
+    return tuple(column.tostring() for column in columns[:-1]) + (
+        columns[-1],)
+
+
+def _unpack_part(packed):
+    """Rebuilds the arrays of a part sent back by `_try_tokenize_part`."""
+
+    if packed is None:
+        return None
+    columns = []
+    for typecode, data in zip(_part_typecodes, packed):
+        column = array(typecode)
+        column.fromstring(data)
+        columns.append(column)
+    columns.append(packed[-1])
+    return tuple(columns)
+
+
+def _ends_at_boundary(part, end):
+    """Whether a tokenized part ends with a `;` or `}` literal token that
+    finishes exactly at `end`.
+    """
+
+    if part is None:
+        return False
+    types, ends = part[0], part[2]
+    if not types or ends[-1] != end:
+        return False
+    cls, _ = TokenColumns.kinds[types[-1]]
+    return cls is LiteralToken and part[6][part[4][-1]] in u';}'
+
+
+def tokenize_parallel(input_string, processes=None, chunk_size=1 << 20):
+    """Tokenizes a large document in parts across a pool of processes.
+
+    The preprocessed document is split after a `}` roughly every
+    `chunk_size` code points.  Such a split is only kept once it has been
+    proven to be a token boundary: the part before it must have begun on a
+    boundary and tokenized to a `;` or `}` literal token ending exactly there.
+    Neither code point can take part in a lookahead that runs past it, so the
+    tokens are the same as the serial tokenizer's.  A split inside a string,
+    comment or url is caught this way and the part is re-tokenized together
+    with the next one.
+
+    Parameters
+    ----------
+    input_string : str
+        The string containing the CSS to be tokenized.
+    processes : int
+        How many worker processes to use.  Defaults to the number of CPUs.
+    chunk_size : int
+        Roughly how many code points each part should have.
+
+    Returns
+    -------
+    TokenColumns
+        The same tokens, with the same offsets, as
+        `CSSTokenizer(input_string).tokenize_columns()`.  Token objects are
+        only built when they are indexed or iterated over.
+
+    Notes
+    -----
+    The workers send their columns back as bytes, and the parent only splices
+    them together, so all it does serially is split the document and copy
+    the columns.  Building the columns costs more than collecting token
+    objects, so it takes a few processes to beat `tokenize_stream`; run
+    `bench_tokenizer --parallel` to see how many on a given machine.
+    """
+
+    source = preprocessing(input_string)
+    bounds = [0]
+    while bounds[-1] + chunk_size < len(source):
+        split = source.find(u'}', bounds[-1] + chunk_size)
+        if split == -1:
+            break
+        bounds.append(split + 1)
+    if bounds[-1] != len(source):
+        bounds.append(len(source))
+    spans = zip(bounds, bounds[1:])
+
+    result = TokenColumns(source)
+    if len(spans) > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            parts = pool.imap(_try_tokenize_part, ((source[start:end], start)
+                                                   for start, end in spans))
+            pending = None
+            for (start, end), part in itertools.izip(spans, parts):
+                part = _unpack_part(part)
+                if pending is not None or part is None:
+                    if pending is not None:
+                        start = pending
+                    part = _tokenize_part((source[start:end], start))
+                if end == len(source) or _ends_at_boundary(part, end):
+                    result._extend(*part)
+                    pending = None
+                else:
+                    pending = start
+        finally:
+            pool.terminate()
+            pool.join()
+    elif spans:
+        result._extend(*_tokenize_part((source, 0)))
+    return result
+
+
+# The tokenizer each `tokenize_many` worker process reuses for every input.
+_batch_tokenizer = None
+
+
+def _start_batch_worker(positions):
+    global _batch_tokenizer
+    _batch_tokenizer = CSSTokenizer(u'', positions)
+
+
+def _reuse_tokenizer(tokenizer, input_string):
+    """Tokenizes one input of `tokenize_many` with a reused tokenizer."""
+
+    # Names are only shared within an input, so that the table does not
+    # grow without bound over a long batch.
+    tokenizer.names.clear()
+    tokenizer.stream = input_string
+    if tokenizer.positions:
+        return deque(tokenizer.iter_tokens())
+    tokenizer.tokenize_stream()
+    tokens = tokenizer._tokens
+    tokenizer._tokens = deque()
+    return tokens
+
+
+def _tokenize_one(indexed_input):
+    """Tokenizes one input of `tokenize_many` in a worker process."""
+
+    index, input_string = indexed_input
+    return index, _reuse_tokenizer(_batch_tokenizer, input_string)
+
+
+def tokenize_many(input_strings, processes=None, chunk_size=256,
+                  ordered=True, positions=False):
+    """Tokenizes many small stylesheets, such as `style` attributes, across a
+    pool of processes.
+
+    Each worker reuses one tokenizer for all of its inputs, and inputs are
+    handed to the workers `chunk_size` at a time so that the cost of passing
+    them between processes is spread over many inputs.
+
+    Parameters
+    ----------
+    input_strings : iterable of str
+        The strings containing the CSS to be tokenized.
+    processes : int
+        How many worker processes to use.  Defaults to the number of CPUs.
+        With 1, the inputs are tokenized in this process, with no pool.
+    chunk_size : int
+        How many inputs to send to a worker at a time.
+    ordered : bool
+        Whether to hand out the results in the order of the inputs.  If not,
+        they are handed out as they are completed, with the position of their
+        input.
+    positions : bool
+        Whether to record the `start` and `end` offset of every token.
+
+    Yields
+    ------
+    collections.deque or tuple
+        For each input, the tokens that
+        `CSSTokenizer(input_string).tokenize_stream()` would collect in
+        `tokens`.  Unless `ordered`, each comes as an
+        `(index, tokens)` pair.
+    """
+
+    if processes == 1:
+        # A tokenizer of its own, so that generators consumed in turns do
+        # not share one.
+        tokenizer = CSSTokenizer(u'', positions)
+        for index, input_string in enumerate(input_strings):
+            tokens = _reuse_tokenizer(tokenizer, input_string)
+            yield tokens if ordered else (index, tokens)
+        return
+    indexed_inputs = enumerate(input_strings)
+    pool = multiprocessing.Pool(processes, _start_batch_worker, (positions,))
+    try:
+        if ordered:
+            for _, tokens in pool.imap(_tokenize_one, indexed_inputs,
+                                       chunk_size):
+                yield tokens
+        else:
+            for result in pool.imap_unordered(_tokenize_one, indexed_inputs,
+                                              chunk_size):
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()